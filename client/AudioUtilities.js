@@ -197,7 +197,8 @@ document.addEventListener("DOMContentLoaded", function() {
         const audioConfig = {
             type: 'config',
             data: {
-                sampleRate: context.sampleRate,
+                // processAudio() sends 16 kHz audio whatever the context rate
+                sampleRate: 16000,
                 channels: 1,
                 language: language,
                 processing_strategy: selectedStrategy.value,
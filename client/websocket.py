@@ -97,37 +97,5 @@ def on_receive(response):
 def on_end():
     print("Recording and streaming ended")
 
-def process_audio(sample_data):
-    output_sample_rate = 16000
-    decrease_result_buffer = decrease_sample_rate(sample_data, RATE, output_sample_rate)
-    audio_data = convert_float32_to_int16(decrease_result_buffer)
-    print("audio received")
-    return audio_data
-
-def decrease_sample_rate(buffer, input_sample_rate, output_sample_rate):
-    if input_sample_rate < output_sample_rate:
-        print("Sample rate too small.")
-        return buffer
-    elif input_sample_rate == output_sample_rate:
-        return buffer
-
-    sample_rate_ratio = input_sample_rate / output_sample_rate
-    new_length = int(len(buffer) / sample_rate_ratio)
-    result = [0]* new_length
-    offset_result = 0
-    offset_buffer = 0
-    while offset_result < new_length:
-        next_offset_buffer = round((offset_result + 1) * sample_rate_ratio)
-        accum = sum(buffer[offset_buffer:next_offset_buffer])
-        count = next_offset_buffer - offset_buffer
-        result[offset_result] = accum / count
-        offset_result += 1
-        offset_buffer = next_offset_buffer
-    return result
-
-def convert_float32_to_int16(buffer):
-    buf = [int(max(-1.0, min(1.0, x)) * 32767) for x in buffer]
-    return bytearray(buf)
-
 if __name__ == '__main__':
     asyncio.run(connect())
\ No newline at end of file
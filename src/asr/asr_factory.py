@@ -1,13 +1,53 @@
-from .faster_whisper_asr import FasterWhisperASR
-from .whisper_asr import WhisperASR
+from src.asr.asr_interface import ASRInterface
+from src.backend_registry import BackendRegistry
+from src.inference.replica_pool import ReplicaPool, ReplicaPoolASR
+
+# Backends are only imported when selected, see BackendRegistry
+ASR_BACKENDS = BackendRegistry(
+    "ASR pipeline",
+    "voicestreamai.asr",
+    {
+        "whisper": "src.asr.whisper_asr:WhisperASR",
+        "faster_whisper": "src.asr.faster_whisper_asr:FasterWhisperASR",
+        "wav2vec2_hindi": "src.asr.wav2vec2_hindi_asr:Wav2Vec2HindiASR",
+    },
+)
 
 
 class ASRFactory:
+    @staticmethod
+    def register_asr_pipeline(asr_type, target):
+        """
+        Registers an ASR backend, either a class or a "module:Class" string
+        imported when the backend is first used.
+        """
+        ASR_BACKENDS.register(asr_type, target)
+
+    @staticmethod
+    def supports_batching(asr_type):
+        """
+        Returns whether the backend overrides `transcribe_batch_sync` with a
+        batched inference, rather than transcribing the waveforms one by
+        one. Imports the backend.
+        """
+        batch_call = ASR_BACKENDS.load(asr_type).transcribe_batch_sync
+        return batch_call is not ASRInterface.transcribe_batch_sync
+
     @staticmethod
     def create_asr_pipeline(asr_type, **kwargs):
-        if asr_type == "whisper":
-            return WhisperASR(**kwargs)
-        if asr_type == "faster_whisper":
-            return FasterWhisperASR(**kwargs)
-        else:
-            raise ValueError(f"Unknown ASR pipeline type: {asr_type}")
+        # "replicas" loads several copies of the model behind a ReplicaPool,
+        # each one is told its "replica_index" to pick a device.
+        replicas = int(kwargs.pop("replicas", 1))
+        if replicas > 1:
+            return ReplicaPoolASR(
+                ReplicaPool(
+                    [
+                        ASRFactory.create_asr_pipeline(
+                            asr_type, replica_index=index, **kwargs
+                        )
+                        for index in range(replicas)
+                    ]
+                )
+            )
+
+        return ASR_BACKENDS.load(asr_type)(**kwargs)
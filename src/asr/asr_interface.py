@@ -1,13 +1,130 @@
 class ASRInterface:
+    @property
+    def pending(self):
+        """
+        Number of transcriptions submitted to the pipeline and not finished
+        yet, across all sessions. Pipelines running the model on the event
+        loop have none.
+        """
+        return 0
+
     async def transcribe(self, client):
         """
         Transcribe the given audio data.
 
+        By default this runs `transcribe_sync` on the client's scratch
+        waveform in the calling thread. Wrap the pipeline in an
+        `src.inference.inference_executor.ExecutorASR` to keep the model
+        off the event loop.
+
         :param client: The client object with all the member variables
                        including the buffer
         :return: The transcription structure, see for example the
                  faster_whisper_asr.py file.
         """
+        return self.transcribe_sync(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+        )
+
+    async def transcribe_streaming(self, client, on_segment):
+        """
+        Transcribe the given audio data, reporting the segments as they are
+        decoded.
+
+        By default this runs `transcribe_streaming_sync` on the client's
+        scratch waveform in the calling thread, like `transcribe`. Pipelines
+        that only override `transcribe` keep it, and never call
+        `on_segment`.
+
+        :param client: The client object with all the member variables
+                       including the buffer
+        :param on_segment: Called on the event loop with every segment
+                           dict ("text", "start", "end" and "words") as soon
+                           as it is decoded.
+        :return: The transcription structure of the whole chunk.
+        """
+        if type(self).transcribe is not ASRInterface.transcribe:
+            return await self.transcribe(client)
+        return self.transcribe_streaming_sync(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+            on_segment,
+        )
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        """
+        Blocking transcription of an in-memory waveform, calling
+        `on_segment` from the calling thread with every segment as soon as
+        it is decoded.
+
+        Backends decoding incrementally should override this, the default
+        implementation returns `transcribe_sync` without calling
+        `on_segment`.
+
+        :return: The transcription structure of the whole waveform.
+        """
+        return self.transcribe_sync(waveform, sampling_rate, language)
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        """
+        Blocking transcription of an in-memory waveform.
+
+        :param waveform: Mono float32 numpy audio in [-1, 1].
+        :param sampling_rate: The sampling rate of the waveform in Hz.
+        :param language: The language configured by the client, or None to
+                         let the model detect it.
+        :return: The transcription structure, see for example the
+                 faster_whisper_asr.py file.
+        """
         raise NotImplementedError(
             "This method should be implemented by subclasses."
         )
+
+    def transcribe_batch_sync(self, waveforms, sampling_rates, languages):
+        """
+        Blocking transcription of several waveforms in one call.
+
+        Backends able to run batched inference should override this, the
+        default implementation transcribes the waveforms one by one.
+
+        :param waveforms: List of mono float32 numpy waveforms.
+        :param sampling_rates: The sampling rate of each waveform in Hz.
+        :param languages: The configured language of each waveform, or None.
+        :return: A list with one transcription structure per waveform.
+        """
+        return [
+            self.transcribe_sync(waveform, sampling_rate, language)
+            for waveform, sampling_rate, language in zip(
+                waveforms, sampling_rates, languages
+            )
+        ]
+
+    def transcribe_batch_streaming_sync(
+        self, waveforms, sampling_rates, languages, on_segment
+    ):
+        """
+        Blocking transcription of several waveforms in one call, calling
+        `on_segment(index, segment)` from the calling thread with every
+        segment of the waveform at `index` as soon as it is decoded.
+
+        The default implementation streams the waveforms one by one with
+        `transcribe_streaming_sync`.
+
+        :return: A list with one transcription structure per waveform.
+        """
+        return [
+            self.transcribe_streaming_sync(
+                waveform,
+                sampling_rate,
+                language,
+                lambda segment, index=index: on_segment(index, segment),
+            )
+            for index, (waveform, sampling_rate, language) in enumerate(
+                zip(waveforms, sampling_rates, languages)
+            )
+        ]
@@ -0,0 +1,422 @@
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from src import metrics
+
+from .asr_interface import ASRInterface
+
+
+def trim_silence(waveform, sampling_rate, threshold_db=40.0):
+    """
+    Returns the [start, end) sample range of a waveform without its leading
+    and trailing silence.
+
+    Silence is every 10 ms frame quieter than the loudest one by more than
+    `threshold_db`, or quieter than -60 dBFS.
+    """
+    frame_length = max(int(0.01 * sampling_rate), 1)
+    num_frames = len(waveform) // frame_length
+    if num_frames == 0:
+        return 0, 0
+    frames = waveform[: num_frames * frame_length].reshape(
+        num_frames, frame_length
+    )
+    energy_db = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+    loud = np.flatnonzero(
+        energy_db > max(energy_db.max() - threshold_db, -60.0)
+    )
+    if len(loud) == 0:
+        return 0, 0
+    return loud[0] * frame_length, (loud[-1] + 1) * frame_length
+
+
+def spectral_fingerprint(waveform, sampling_rate, frame_seconds=0.064):
+    """
+    Computes a binary fingerprint robust to small level and noise changes.
+
+    The energies of 17 logarithmic bands between 300 Hz and 4 kHz are
+    computed on non-overlapping frames, and every bit tells whether the
+    energy difference between two neighbouring bands grew from one frame
+    to the next.
+
+    Returns:
+        numpy.ndarray: A (frames - 1, 16) boolean array.
+    """
+    frame_length = int(frame_seconds * sampling_rate)
+    num_frames = len(waveform) // frame_length
+    if num_frames < 2:
+        return np.zeros((0, 16), dtype=bool)
+    frames = waveform[: num_frames * frame_length].reshape(
+        num_frames, frame_length
+    )
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_length))) ** 2
+
+    edges = np.geomspace(300, min(4000, sampling_rate / 2), 18)
+    bins = np.round(edges * frame_length / sampling_rate).astype(int)
+    cumulative = np.concatenate(
+        [np.zeros((num_frames, 1)), np.cumsum(power, axis=1)], axis=1
+    )
+    band_energy = np.log(
+        cumulative[:, bins[1:]] - cumulative[:, bins[:-1]] + 1e-10
+    )
+    band_difference = np.diff(band_energy, axis=1)
+    return np.diff(band_difference, axis=0) > 0
+
+
+class CachedASR(ASRInterface):
+    """
+    Wraps an ASR pipeline and reuses the transcriptions of repeated audio.
+
+    Calls get repeated audio (IVR prompts, hold messages, recorded
+    disclaimers) in many sessions. The leading and trailing silence of each
+    chunk is trimmed, then the chunk is looked up by the hash of its samples
+    and, for near-duplicates (re-encoded or slightly noisier copies), by a
+    spectral fingerprint: a cached chunk of about the same duration whose
+    fingerprint differs by at most `max_bit_error_rate` of its bits is a
+    hit. The language configured by the client is part of the key.
+
+    Cached transcriptions are returned as copies, with the word timestamps
+    shifted by the difference of leading silence. The segments streamed on
+    a miss are cached too, and replayed to `transcribe_streaming` callers
+    on a hit (a single segment of the whole transcription when it was not
+    streamed). Entries are evicted in
+    least recently used order beyond `max_entries` or `max_bytes` (estimated
+    from the JSON size of the transcriptions). With a `path`, the cache is
+    loaded from that JSON file, and a background thread saves it every
+    `save_interval_seconds` when it has new entries, off the event loop.
+    `close()` stops the thread and saves a last time.
+
+    Attributes:
+        asr_pipeline (ASRInterface): The wrapped pipeline.
+        hits (int): Number of exact and near-duplicate hits.
+        misses (int): Number of transcriptions computed.
+    """
+
+    def __init__(self, asr_pipeline, **kwargs):
+        """
+        Initializes the cache.
+
+        Args:
+            asr_pipeline (ASRInterface): The pipeline transcribing misses.
+            max_entries (int): Maximum number of cached transcriptions.
+            max_bytes (int): Size budget of the cached transcriptions.
+            min_seconds (float): Shorter chunks are neither cached nor
+                                 looked up.
+            max_bit_error_rate (float): Fraction of differing fingerprint
+                                       bits tolerated for near-duplicates,
+                                       0 disables them.
+            path (str): JSON file the cache is persisted to.
+            save_interval_seconds (float): Time between two saves of new
+                                           entries.
+        """
+        self.asr_pipeline = asr_pipeline
+        self.max_entries = int(kwargs.get("max_entries", 10000))
+        self.max_bytes = int(kwargs.get("max_bytes", 64 * 1024 * 1024))
+        self.min_seconds = float(kwargs.get("min_seconds", 0.5))
+        self.max_bit_error_rate = float(kwargs.get("max_bit_error_rate", 0.15))
+        self.path = kwargs.get("path")
+        self.save_interval_seconds = float(
+            kwargs.get("save_interval_seconds", 60)
+        )
+
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        # (sampling rate, language, fingerprint rows) -> keys of the entries,
+        # for the near-duplicate search
+        self._buckets = collections.defaultdict(set)
+        self._bytes = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        # Serializes the saves of the saver thread and of close()
+        self._save_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._saver = None
+
+        if self.path and os.path.exists(self.path):
+            self._load()
+        if self.path:
+            self._saver = threading.Thread(
+                target=self._save_periodically,
+                name="asr-cache-saver",
+                daemon=True,
+            )
+            self._saver.start()
+
+    @property
+    def pending(self):
+        return self.asr_pipeline.pending
+
+    async def transcribe(self, client):
+        return await self.transcribe_streaming(client, None)
+
+    async def transcribe_streaming(self, client, on_segment):
+        lookup = self._lookup(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+        )
+        if lookup.transcription is not None:
+            client.inference_timings["asr"] = {
+                "queue_time": 0.0,
+                "compute_time": 0.0,
+                "cache_hit": lookup.result,
+            }
+            if on_segment is not None:
+                for segment in lookup.segments or [
+                    _whole_segment(lookup.transcription)
+                ]:
+                    on_segment(segment)
+            return lookup.transcription
+
+        if on_segment is None:
+            transcription = await self.asr_pipeline.transcribe(client)
+            self._store(lookup, transcription)
+            return transcription
+
+        segments = []
+
+        def on_miss_segment(segment):
+            segments.append(copy.deepcopy(segment))
+            on_segment(segment)
+
+        transcription = await self.asr_pipeline.transcribe_streaming(
+            client, on_miss_segment
+        )
+        self._store(lookup, transcription, segments)
+        return transcription
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        lookup = self._lookup(waveform, sampling_rate, language)
+        if lookup.transcription is not None:
+            return lookup.transcription
+
+        transcription = self.asr_pipeline.transcribe_sync(
+            waveform, sampling_rate, language
+        )
+        self._store(lookup, transcription)
+        return transcription
+
+    def _lookup(self, waveform, sampling_rate, language):
+        start, end = trim_silence(waveform, sampling_rate)
+        if (end - start) / sampling_rate < self.min_seconds:
+            return _Lookup(None, None, None, 0.0, None, None, "skipped", None)
+
+        trimmed = waveform[start:end]
+        offset = start / sampling_rate
+        key = hashlib.blake2b(
+            np.round(trimmed * 32767).astype("<i2").tobytes()
+            + f"|{sampling_rate}|{language}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        fingerprint = spectral_fingerprint(trimmed, sampling_rate)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            result = "exact"
+            if entry is None and self.max_bit_error_rate > 0:
+                entry = self._find_near_duplicate(
+                    fingerprint, sampling_rate, language
+                )
+                result = "near"
+            if entry is None:
+                self.misses += 1
+                metrics.asr_cache_lookups.inc("miss")
+                return _Lookup(
+                    None,
+                    key,
+                    fingerprint,
+                    offset,
+                    sampling_rate,
+                    language,
+                    "miss",
+                    None,
+                )
+
+            self._entries.move_to_end(entry["key"])
+            self.hits += 1
+            metrics.asr_cache_lookups.inc(result)
+            transcription = copy.deepcopy(entry["transcription"])
+            segments = copy.deepcopy(entry.get("segments"))
+
+        shift = offset - entry["offset"]
+        _shift_words(transcription, shift)
+        for segment in segments or []:
+            _shift_words(segment, shift)
+            segment["start"] += shift
+            segment["end"] += shift
+        return _Lookup(
+            transcription, key, None, offset, None, None, result, segments
+        )
+
+    def _find_near_duplicate(self, fingerprint, sampling_rate, language):
+        rows = len(fingerprint)
+        best, best_error_rate = None, self.max_bit_error_rate
+        # Trimming can differ by a frame between two copies
+        for candidate_rows in (rows, rows - 1, rows + 1):
+            bucket = (sampling_rate, language, candidate_rows)
+            for key in self._buckets.get(bucket, ()):
+                entry = self._entries[key]
+                other = np.unpackbits(entry["fingerprint"])[
+                    : candidate_rows * 16
+                ].reshape(candidate_rows, 16)
+                common = min(rows, candidate_rows)
+                if common == 0:
+                    continue
+                error_rate = np.mean(fingerprint[:common] != other[:common])
+                if error_rate <= best_error_rate:
+                    best, best_error_rate = entry, error_rate
+        return best
+
+    def _store(self, lookup, transcription, segments=None):
+        if lookup.key is None:
+            return
+        entry = {
+            "key": lookup.key,
+            "bucket": (
+                lookup.sampling_rate,
+                lookup.language,
+                len(lookup.fingerprint),
+            ),
+            "fingerprint": np.packbits(lookup.fingerprint),
+            "offset": lookup.offset,
+            "transcription": copy.deepcopy(transcription),
+            "segments": segments or None,
+        }
+        with self._lock:
+            self._insert(entry)
+            self._unsaved += 1
+
+    def _insert(self, entry):
+        entry["size"] = (
+            len(json.dumps(entry["transcription"]))
+            + len(json.dumps(entry.get("segments")))
+            + len(entry["fingerprint"])
+        )
+        previous = self._entries.pop(entry["key"], None)
+        if previous is not None:
+            self._remove(previous)
+        self._entries[entry["key"]] = entry
+        self._buckets[entry["bucket"]].add(entry["key"])
+        self._bytes += entry["size"]
+
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._remove(evicted)
+            metrics.asr_cache_lookups.inc("evicted")
+
+    def _remove(self, entry):
+        self._bytes -= entry["size"]
+        bucket = self._buckets[entry["bucket"]]
+        bucket.discard(entry["key"])
+        if not bucket:
+            del self._buckets[entry["bucket"]]
+
+    def save(self):
+        """
+        Writes the cache to `path`, replacing the file atomically. Blocking,
+        the lookups only wait for the snapshot of the entries.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                # Entries are never modified once inserted
+                snapshot = list(self._entries.values())
+                self._unsaved = 0
+
+            entries = [
+                {
+                    "key": entry["key"],
+                    "bucket": list(entry["bucket"]),
+                    "fingerprint": entry["fingerprint"].tobytes().hex(),
+                    "offset": entry["offset"],
+                    "transcription": entry["transcription"],
+                    "segments": entry.get("segments"),
+                }
+                for entry in snapshot
+            ]
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(entries, file)
+            os.replace(temporary_path, self.path)
+
+    def close(self):
+        """Stops the saver thread and saves the new entries."""
+        self._closed.set()
+        if self._saver is not None:
+            self._saver.join()
+        if self._unsaved:
+            self.save()
+
+    def _save_periodically(self):
+        while not self._closed.wait(self.save_interval_seconds):
+            if not self._unsaved:
+                continue
+            try:
+                self.save()
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not save the ASR cache: {e}")
+
+    def _load(self):
+        try:
+            with open(self.path) as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load the ASR cache {self.path}: {e}")
+            return
+
+        with self._lock:
+            for entry in entries:
+                entry["bucket"] = tuple(entry["bucket"])
+                entry["fingerprint"] = np.frombuffer(
+                    bytes.fromhex(entry["fingerprint"]), dtype=np.uint8
+                )
+                self._insert(entry)
+        logging.info(
+            f"Loaded {len(self._entries)} cached transcriptions from "
+            f"{self.path}"
+        )
+
+
+_Lookup = collections.namedtuple(
+    "_Lookup",
+    [
+        "transcription",
+        "key",
+        "fingerprint",
+        "offset",
+        "sampling_rate",
+        "language",
+        "result",
+        "segments",
+    ],
+)
+
+
+def _shift_words(transcription, seconds):
+    if not seconds:
+        return
+    for word in transcription.get("words", []):
+        word["start"] += seconds
+        word["end"] += seconds
+
+
+def _whole_segment(transcription):
+    words = transcription.get("words", [])
+    return {
+        "text": transcription["text"],
+        "start": words[0]["start"] if words else 0.0,
+        "end": words[-1]["end"] if words else 0.0,
+        "words": copy.deepcopy(words),
+    }
@@ -1,9 +1,6 @@
-import os
-import time
+import ctranslate2
 from faster_whisper import WhisperModel
 
-from src.audio_utils import save_audio_to_file
-
 from .asr_interface import ASRInterface
 
 language_codes = {
@@ -113,46 +110,77 @@ language_codes = {
 class FasterWhisperASR(ASRInterface):
     def __init__(self, **kwargs):
         model_size = kwargs.get("model_size", "large-v3")
-        # Run on GPU with FP16
-        self.asr_pipeline = WhisperModel(
-            model_size, device="cuda", compute_type="float16"
+        device = kwargs.get("device", "cuda")
+        # Runs on GPU with FP16 by default
+        compute_type = kwargs.get(
+            "compute_type", "float16" if device == "cuda" else "int8"
         )
 
-    async def transcribe(self, client):
-        x = time.time()
-        file_path = await save_audio_to_file(
-            client.scratch_buffer, client.get_file_name()
+        # Replicas created by the ASRFactory are spread over the GPUs, on
+        # CPU each replica gets its own pinned number of threads instead.
+        replica_index = kwargs.get("replica_index", 0)
+        device_index = 0
+        if device == "cuda":
+            device_index = replica_index % max(
+                ctranslate2.get_cuda_device_count(), 1
+            )
+
+        self.asr_pipeline = WhisperModel(
+            model_size,
+            device=device,
+            device_index=device_index,
+            compute_type=compute_type,
+            cpu_threads=kwargs.get("cpu_threads", 0),
         )
-        print(str(time.time() - x) + " -- file saving time")
 
-        language = (
-            None
-            if client.config["language"] is None
-            else language_codes.get(client.config["language"].lower())
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return self.transcribe_streaming_sync(
+            waveform, sampling_rate, language, None
         )
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        if language is not None:
+            # Names configured by clients, or codes of a locked language
+            language = language.lower()
+            if language not in language_codes.values():
+                language = language_codes.get(language)
         segments, info = self.asr_pipeline.transcribe(
-            file_path, word_timestamps=True, language=language
+            waveform,
+            word_timestamps=True,
+            language=language,
         )
 
-        segments = list(segments)  # The transcription will actually run here.
-        os.remove(file_path)
-
-        flattened_words = [
-            word for segment in segments for word in segment.words
-        ]
-
-        to_return = {
-            "language": info.language,
-            "language_probability": info.language_probability,
-            "text": " ".join([s.text.strip() for s in segments]),
-            "words": [
+        # The transcription actually runs while iterating over the segments
+        texts = []
+        flattened_words = []
+        for segment in segments:
+            words = [
                 {
                     "word": w.word,
                     "start": w.start,
                     "end": w.end,
                     "probability": w.probability,
                 }
-                for w in flattened_words
-            ],
+                for w in segment.words
+            ]
+            texts.append(segment.text.strip())
+            flattened_words.extend(words)
+            if on_segment is not None:
+                on_segment(
+                    {
+                        "text": segment.text.strip(),
+                        "start": segment.start,
+                        "end": segment.end,
+                        "words": words,
+                    }
+                )
+
+        to_return = {
+            "language": info.language,
+            "language_probability": info.language_probability,
+            "text": " ".join(texts),
+            "words": flattened_words,
         }
         return to_return
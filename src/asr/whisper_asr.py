@@ -1,9 +1,6 @@
-import os
-import time
 import torch
 from transformers import pipeline
 
-from src.audio_utils import save_audio_to_file
 from .asr_interface import ASRInterface
 
 class WhisperASR(ASRInterface):
@@ -12,49 +9,52 @@ class WhisperASR(ASRInterface):
         self.device_count = torch.cuda.device_count() if torch.cuda.is_available() else 0
     
         model_name = kwargs.get("model_name", "openai/whisper-large-v3")
-        
-        # Create a list of pipelines, one for each GPU or just one for CPU
-        self.asr_pipelines = []
-        if self.device_count > 1:
-            for i in range(self.device_count):
-                self.asr_pipelines.append(
-                    pipeline(
-                        "automatic-speech-recognition",
-                        model=model_name,
-                        device=i  # Use GPU i
-                    )
-                )
-        else:
-            # Single GPU or CPU usage
-            self.asr_pipeline = pipeline(
-                "automatic-speech-recognition",
-                model=model_name,
-                device=0 if self.device_count == 1 else -1  # device 0 for GPU, -1 for CPU
-            )
-    
-    async def transcribe(self, client):
-        file_path = await save_audio_to_file(
-            client.scratch_buffer, client.get_file_name()
+
+        # Replicas created by the ASRFactory are spread over the GPUs
+        replica_index = kwargs.get("replica_index", 0)
+        self.asr_pipeline = pipeline(
+            "automatic-speech-recognition",
+            model=model_name,
+            device=replica_index % self.device_count if self.device_count > 0 else -1  # -1 for CPU
         )
 
-        if client.config["language"] is not None:
-            to_return = self._run_pipeline(file_path, {"language": client.config["language"], "task": "translate"})
-        else:
-            pip_time = time.time()
-            to_return = self._run_pipeline(file_path, {"task": "translate"})
-            print(str(time.time() - pip_time) + " seconds for pipeline")
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        # The pipeline pops the keys out of the input dict, so it must be
+        # built fresh for every call.
+        audio = {"raw": waveform, "sampling_rate": sampling_rate}
 
-        os.remove(file_path)
+        if language is not None:
+            to_return = self._run_pipeline(audio, {"language": language, "task": "translate"})["text"]
+        else:
+            to_return = self._run_pipeline(audio, {"task": "translate"})["text"]
 
         return {
             "text": to_return.strip(),
         }
 
-    def _run_pipeline(self, file_path, generate_kwargs):
-        if self.device_count > 1:
-            # If multiple GPUs are available, split the workload (this example assumes you split work outside of this method)
-            # Here, just run on the first pipeline as a simple example
-            return self.asr_pipelines[0](file_path, generate_kwargs=generate_kwargs)["text"]
-        else:
-            # Single GPU or CPU usage
-            return self.asr_pipeline(file_path, generate_kwargs=generate_kwargs)["text"]
+    def transcribe_batch_sync(self, waveforms, sampling_rates, languages):
+        # generate_kwargs apply to a whole pipeline call, so the batch is
+        # split by language and each group runs as one batched forward pass.
+        transcriptions = [None] * len(waveforms)
+        indexes_by_language = {}
+        for index, language in enumerate(languages):
+            indexes_by_language.setdefault(language, []).append(index)
+
+        for language, indexes in indexes_by_language.items():
+            generate_kwargs = {"task": "translate"}
+            if language is not None:
+                generate_kwargs["language"] = language
+            audios = [
+                {"raw": waveforms[i], "sampling_rate": sampling_rates[i]}
+                for i in indexes
+            ]
+            outputs = self._run_pipeline(
+                audios, generate_kwargs, batch_size=len(audios)
+            )
+            for index, output in zip(indexes, outputs):
+                transcriptions[index] = {"text": output["text"].strip()}
+
+        return transcriptions
+
+    def _run_pipeline(self, audio, generate_kwargs, **pipeline_kwargs):
+        return self.asr_pipeline(audio, generate_kwargs=generate_kwargs, **pipeline_kwargs)
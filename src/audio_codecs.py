@@ -0,0 +1,225 @@
+"""
+Decoding of the audio encodings clients can negotiate in their config
+message, into the 16-bit PCM at the server sampling rate stored by Client.
+"""
+
+import math
+
+import numpy as np
+
+ENCODINGS = ("linear16", "mulaw", "alaw")
+
+
+def _mulaw_table():
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _alaw_table():
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = np.where(
+        exponent == 0,
+        (mantissa << 4) + 0x08,
+        ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0),
+    )
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+# G.711 only has 256 codes, decoding is a single table lookup
+MULAW_TABLE = _mulaw_table()
+ALAW_TABLE = _alaw_table()
+
+
+def decode_mulaw(audio_data):
+    """Decodes G.711 μ-law bytes into int16 samples."""
+    return MULAW_TABLE[np.frombuffer(audio_data, dtype=np.uint8)]
+
+
+def decode_alaw(audio_data):
+    """Decodes G.711 A-law bytes into int16 samples."""
+    return ALAW_TABLE[np.frombuffer(audio_data, dtype=np.uint8)]
+
+
+def _decode_linear16(audio_data):
+    return np.frombuffer(audio_data, dtype="<i2")
+
+
+# Bytes per sample of each encoding
+SAMPLE_BYTES = {"linear16": 2, "mulaw": 1, "alaw": 1}
+
+
+def create_audio_decoder(config, sampling_rate):
+    """
+    Creates the decoder of the audio negotiated in a client config.
+
+    The "encoding" key selects one of ENCODINGS, "sampleRate" and
+    "channels" describe the audio sent by the client. G.711 audio defaults
+    to 8 kHz, linear16 audio to the server rate.
+
+    Returns:
+        AudioDecoder: The decoder, or None for mono linear16 audio at the
+                      server rate, which is stored as is.
+    """
+    encoding = config.get("encoding") or "linear16"
+    default_rate = sampling_rate if encoding == "linear16" else 8000
+    input_rate = int(config.get("sampleRate") or default_rate)
+    channels = int(config.get("channels") or 1)
+    if (
+        encoding == "linear16"
+        and input_rate == sampling_rate
+        and channels == 1
+    ):
+        return None
+    return AudioDecoder(encoding, input_rate, sampling_rate, channels)
+
+
+class StreamingResampler:
+    """
+    Resamples a stream by a rational factor with a polyphase FIR filter.
+
+    With `up / down` the reduced ratio of the output and input rates, the
+    stream is conceptually upsampled by `up`, low-pass filtered below the
+    lowest of the two Nyquist frequencies and decimated by `down`. Only the
+    kept outputs are computed: the windowed-sinc filter is split into `up`
+    phases, and every output sample is the dot product of one phase with
+    the latest input samples.
+
+    The last input samples and the output position are kept between calls,
+    so a stream cut in arbitrary frames is resampled exactly as if it came
+    in one piece, with a constant delay of about `zero_crossings` samples
+    at the lowest of the two rates.
+
+    Attributes:
+        input_rate (int): Sampling rate of the input.
+        output_rate (int): Sampling rate of the output.
+        up (int): Upsampling factor.
+        down (int): Decimation factor.
+        taps_per_phase (int): Length of each polyphase filter.
+    """
+
+    def __init__(self, input_rate, output_rate, zero_crossings=8):
+        divisor = math.gcd(input_rate, output_rate)
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+
+        # Cut-off of the filter, in cycles per upsampled sample
+        cutoff = 0.5 / max(self.up, self.down)
+        self.taps_per_phase = int(
+            np.ceil(2 * zero_crossings * max(self.up, self.down) / self.up)
+        )
+        length = self.up * self.taps_per_phase
+        n = np.arange(length) - (length - 1) / 2
+        taps = np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0)
+        # Gain `up` makes up for the inserted zeros
+        taps *= self.up / taps.sum()
+        # Phase p holds taps p, p + up, p + 2 up..., reversed to be applied
+        # as a dot product with the input samples in stream order
+        self._phases = taps.reshape(self.taps_per_phase, self.up).T[:, ::-1]
+        self._phases = np.ascontiguousarray(self._phases, dtype=np.float32)
+
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._input_samples = 0
+        self._output_samples = 0
+
+    def process(self, samples):
+        """
+        Resamples the next frame of the stream.
+
+        Returns:
+            numpy.ndarray: float32 array of the output samples that can be
+                           computed from the input received so far.
+        """
+        if self.up == self.down or len(samples) == 0:
+            return samples.astype(np.float32)
+
+        first_input = self._input_samples
+        self._input_samples += len(samples)
+        extended = np.concatenate([self._history, samples])
+        kept = len(self._history)
+        self._history = extended[len(extended) - kept :]  # noqa: E203
+
+        # Output k needs input (k * down) // up, stop at the last one we got
+        end = -(-self._input_samples * self.up // self.down)
+        positions = (
+            np.arange(self._output_samples, end, dtype=np.int64) * self.down
+        )
+        self._output_samples = end
+
+        # Row i of the windows ends with input sample first_input + i
+        windows = np.lib.stride_tricks.sliding_window_view(
+            extended, self.taps_per_phase
+        )
+        rows = positions // self.up - first_input
+        phases = positions % self.up
+        return np.einsum(
+            "ij,ij->i", windows[rows], self._phases[phases]
+        ).astype(np.float32)
+
+
+class AudioDecoder:
+    """
+    Turns the bytes sent by a client into int16 mono samples at the server
+    rate.
+
+    Frames are decoded, the channels of interleaved multi-channel audio are
+    averaged and the result is resampled with a StreamingResampler. A frame
+    does not need to hold whole samples, the remaining bytes are kept for
+    the next one.
+
+    Attributes:
+        encoding (str): One of ENCODINGS.
+        input_rate (int): Sampling rate of the client audio.
+        output_rate (int): Sampling rate of the server pipelines.
+        channels (int): Number of interleaved channels of the client audio.
+    """
+
+    def __init__(self, encoding, input_rate, output_rate, channels=1):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown audio encoding: {encoding}")
+        if input_rate <= 0 or channels <= 0:
+            raise ValueError(
+                f"Invalid audio format: {input_rate} Hz, {channels} channels"
+            )
+        self.encoding = encoding
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.channels = channels
+        self._decode = {
+            "linear16": _decode_linear16,
+            "mulaw": decode_mulaw,
+            "alaw": decode_alaw,
+        }[encoding]
+        self._frame_bytes = SAMPLE_BYTES[encoding] * channels
+        self._partial_frame = b""
+        self._resampler = StreamingResampler(input_rate, output_rate)
+
+    def decode(self, audio_data):
+        """
+        Decodes the next frame of the stream.
+
+        Returns:
+            numpy.ndarray: int16 samples at `output_rate`.
+        """
+        if self._partial_frame or len(audio_data) % self._frame_bytes:
+            audio_data = self._partial_frame + bytes(audio_data)
+            usable = len(audio_data) - len(audio_data) % self._frame_bytes
+            self._partial_frame = audio_data[usable:]
+            audio_data = audio_data[:usable]
+
+        samples = self._decode(audio_data)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(
+                axis=1, dtype=np.float32
+            )
+        elif self.input_rate == self.output_rate:
+            return samples
+
+        resampled = self._resampler.process(samples)
+        return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity audio store addressed by absolute sample positions.
+
+    Samples are written into a preallocated array and addressed by their
+    position in the stream (the first sample ever written is at 0). The
+    array holds the ring twice (every sample is written at `i % capacity`
+    and at `i % capacity + capacity`), so any range of up to `capacity`
+    samples is contiguous in memory and can be returned as a view without
+    copying. Memory use is `2 * capacity` samples, whatever the length of
+    the stream.
+
+    Views returned by `view` share memory with the ring: they are only valid
+    until `capacity` more samples have been written, consumers that keep the
+    audio longer must copy it.
+
+    Attributes:
+        capacity (int): Number of most recent samples kept.
+        end (int): Stream position one past the last written sample.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        if capacity <= 0:
+            raise ValueError("The ring buffer capacity must be positive")
+        self.capacity = int(capacity)
+        self.end = 0
+        self._first = 0
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+
+    @property
+    def start(self):
+        """Stream position of the oldest sample still in the ring."""
+        return max(self._first, self.end - self.capacity)
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def write(self, samples):
+        """
+        Appends samples to the stream, overwriting the oldest ones once the
+        ring is full.
+
+        Args:
+            samples (numpy.ndarray): 1-D array of samples.
+
+        Returns:
+            int: The stream position of the first written sample.
+        """
+        first_position = self.end
+        count = len(samples)
+        if count > self.capacity:
+            # Only the most recent samples survive anyway
+            self.end += count - self.capacity
+            samples = samples[-self.capacity :]  # noqa: E203
+            count = self.capacity
+
+        offset = self.end % self.capacity
+        head = min(count, self.capacity - offset)
+        for base in (0, self.capacity):
+            head_start = base + offset
+            self._data[head_start : head_start + head] = samples[:head]  # noqa
+            self._data[base : base + count - head] = samples[head:]  # noqa
+        self.end += count
+        return first_position
+
+    def view(self, start, end):
+        """
+        Returns the samples in [start, end) without copying them.
+
+        Raises:
+            ValueError: If the range is not entirely in the ring.
+        """
+        if start > end or start < self.start or end > self.end:
+            raise ValueError(
+                f"Samples [{start}, {end}) are not in the ring buffer "
+                f"[{self.start}, {self.end})"
+            )
+        offset = start % self.capacity
+        return self._data[offset : offset + end - start]  # noqa: E203
+
+    def reset(self, position=0):
+        """Forgets all the samples and restarts the stream at `position`."""
+        self._first = self.end = position
@@ -1,9 +1,16 @@
 import os
 import wave
 
+import numpy as np
+
 
 async def save_audio_to_file(
-    audio_data, file_name, audio_dir="audio_files", audio_format="wav"
+    audio_data,
+    file_name,
+    audio_dir="audio_files",
+    audio_format="wav",
+    sampling_rate=16000,
+    samples_width=2,
 ):
     """
     Saves the audio data to a file.
@@ -12,6 +19,8 @@ async def save_audio_to_file(
     :param file_name: The name of the file.
     :param audio_dir: Directory where audio files will be saved.
     :param audio_format: Format of the audio file.
+    :param sampling_rate: The sampling rate of the audio in Hz.
+    :param samples_width: The width of each sample in bytes.
     :return: Path to the saved audio file.
     """
 
@@ -21,8 +30,40 @@ async def save_audio_to_file(
 
     with wave.open(file_path, "wb") as wav_file:
         wav_file.setnchannels(1)  # Assuming mono audio
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(16000)
+        wav_file.setsampwidth(samples_width)
+        wav_file.setframerate(sampling_rate)
         wav_file.writeframes(audio_data)
 
     return file_path
+
+
+def pcm_to_float32(audio_data, samples_width=2):
+    """
+    Converts raw little-endian signed PCM audio into a float32 waveform.
+
+    The bytes are reinterpreted without copying and converted in a single
+    vectorized pass, so the result can be handed directly to the VAD and ASR
+    models instead of going through a temporary WAV file.
+
+    :param audio_data: The PCM audio (bytes, bytearray, memoryview or an
+                       integer numpy array of samples).
+    :param samples_width: The width of each sample in bytes (2 or 4).
+    :return: A 1-D float32 numpy array with values in [-1.0, 1.0).
+    """
+    if samples_width == 2:
+        dtype, scale = np.dtype("<i2"), 32768.0
+    elif samples_width == 4:
+        dtype, scale = np.dtype("<i4"), 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {samples_width}")
+
+    if isinstance(audio_data, np.ndarray):
+        samples = audio_data
+    else:
+        usable = len(audio_data) - len(audio_data) % samples_width
+        samples = np.frombuffer(
+            audio_data, dtype=dtype, count=usable // dtype.itemsize
+        )
+    waveform = samples.astype(np.float32)
+    waveform *= 1.0 / scale
+    return waveform
@@ -0,0 +1,93 @@
+import importlib
+import logging
+from importlib import metadata
+
+
+class BackendRegistry:
+    """
+    Maps backend names to the classes implementing them, imported lazily.
+
+    Backends are registered as "module:attribute" strings and only imported
+    when they are selected, so a deployment only pays for the dependencies
+    (torch, transformers, CTranslate2...) of the backends it uses.
+
+    Third-party packages can add backends without editing the factories by
+    declaring entry points in `entry_point_group`, for instance in their
+    pyproject.toml:
+
+        [project.entry-points."voicestreamai.asr"]
+        my_asr = "my_package.my_asr:MyASR"
+
+    Built-in and explicitly registered backends take precedence over entry
+    points with the same name.
+
+    Attributes:
+        kind (str): What the backends are, used in error messages.
+        entry_point_group (str): Entry point group searched for backends
+                                 that are not registered.
+    """
+
+    def __init__(self, kind, entry_point_group, backends=None):
+        self.kind = kind
+        self.entry_point_group = entry_point_group
+        self._targets = dict(backends or {})
+        self._loaded = {}
+        self._entry_points = None
+
+    def register(self, name, target):
+        """
+        Registers a backend.
+
+        Args:
+            name (str): The name the backend is selected with.
+            target: The backend class, or a "module:attribute" string
+                    imported when the backend is first selected.
+        """
+        self._targets[name] = target
+        self._loaded.pop(name, None)
+
+    def _discover_entry_points(self):
+        if self._entry_points is None:
+            self._entry_points = {}
+            try:
+                entry_points = metadata.entry_points(
+                    group=self.entry_point_group
+                )
+            except Exception as e:
+                logging.warning(
+                    f"Could not read the {self.entry_point_group} entry "
+                    f"points: {e}"
+                )
+                entry_points = ()
+            for entry_point in entry_points:
+                self._entry_points[entry_point.name] = entry_point
+        return self._entry_points
+
+    def names(self):
+        """Returns the names of all the known backends, sorted."""
+        return sorted(set(self._targets) | set(self._discover_entry_points()))
+
+    def load(self, name):
+        """
+        Returns the class of the backend `name`, importing it if needed.
+
+        Raises:
+            ValueError: If no backend is registered under this name.
+        """
+        if name in self._loaded:
+            return self._loaded[name]
+
+        if name in self._targets:
+            target = self._targets[name]
+            if isinstance(target, str):
+                module_name, _, attribute = target.partition(":")
+                target = getattr(
+                    importlib.import_module(module_name), attribute
+                )
+        elif name in self._discover_entry_points():
+            target = self._entry_points[name].load()
+        else:
+            raise ValueError(f"Unknown {self.kind} type: {name}")
+
+        self._loaded[name] = target
+        return target
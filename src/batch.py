@@ -0,0 +1,491 @@
+"""
+Batch transcription of recorded audio files.
+
+Transcribes directories of WAV files, or manifests listing them, with the
+VAD and ASR backends of the server and writes one JSON line per file.
+Example:
+
+    python -m src.batch recordings/ --output transcripts.jsonl \\
+        --vad-type pyannote --vad-args '{"auth_token": "huggingface_token"}' \\
+        --asr-type faster_whisper --asr-args '{"model_size": "large-v3"}' \\
+        --inference-executor process --asr-workers 2
+
+It is tuned for throughput rather than latency: the VAD runs once over
+every file, the speech segments are packed into ASR units of up to
+`--max-unit-seconds` of concatenated speech, and the units of all the files
+in flight share the batched ASR pipeline. Silence never reaches the ASR.
+
+The output is appended to as files complete, so a crashed run resumes where
+it stopped when started again with the same `--output`.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+import wave
+
+import numpy as np
+
+from src.audio_codecs import AudioDecoder
+from src.audio_utils import pcm_to_float32
+from src.inference.inference_executor import EXECUTOR_KINDS
+from src.pipelines import create_pipelines
+from src.speech_trim import SpeechTrim
+
+SAMPLING_RATE = 16000
+AUDIO_EXTENSIONS = (".wav",)
+# Audio read and resampled at once, which bounds the memory used by the
+# resampler on long recordings
+DECODE_BLOCK_SECONDS = 10
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="VoiceStreamAI batch transcription: transcribes audio "
+        "files with the server pipelines and writes JSON lines."
+    )
+    parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="+",
+        help="WAV files, directories searched recursively for WAV files, "
+        "or manifests listing one file per line (a path, or a JSON object "
+        'with a "path" or "audio_filepath" key)',
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="JSONL file the transcriptions are appended to. Files already "
+        "transcribed in it are skipped",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Start over instead of resuming from the existing output",
+    )
+    parser.add_argument(
+        "--language",
+        type=str,
+        default=None,
+        help="Language of the audio, detected for every unit by default",
+    )
+    parser.add_argument(
+        "--vad-type",
+        type=str,
+        default="pyannote",
+        help="Type of VAD pipeline to use (e.g., 'pyannote', 'energy' or "
+        "'stub')",
+    )
+    parser.add_argument(
+        "--vad-args",
+        type=str,
+        default='{"auth_token": "huggingface_token"}',
+        help="JSON string of additional arguments for VAD pipeline",
+    )
+    parser.add_argument(
+        "--asr-type",
+        type=str,
+        default="faster_whisper",
+        help="Type of ASR pipeline to use (e.g., 'faster_whisper', "
+        "'whisper' or 'stub')",
+    )
+    parser.add_argument(
+        "--asr-args",
+        type=str,
+        default='{"model_size": "large-v3"}',
+        help="JSON string of additional arguments for ASR pipeline",
+    )
+    parser.add_argument(
+        "--inference-executor",
+        type=str,
+        default="thread",
+        choices=EXECUTOR_KINDS,
+        help="Where VAD and ASR inference runs. default: thread",
+    )
+    parser.add_argument(
+        "--vad-workers",
+        type=int,
+        default=1,
+        help="Number of inference workers for the VAD pipeline",
+    )
+    parser.add_argument(
+        "--asr-workers",
+        type=int,
+        default=1,
+        help="Number of inference workers for the ASR pipeline",
+    )
+    parser.add_argument(
+        "--asr-max-batch-size",
+        type=int,
+        default=8,
+        help="Maximum number of units transcribed in one batched ASR call, "
+        "1 disables batching. default: 8",
+    )
+    parser.add_argument(
+        "--asr-max-batch-wait-ms",
+        type=float,
+        default=500,
+        help="Maximum time in milliseconds a unit waits for its ASR batch "
+        "to fill up. default: 500",
+    )
+    parser.add_argument(
+        "--files-in-flight",
+        type=int,
+        default=16,
+        help="Number of files loaded and transcribed at the same time. "
+        "default: 16",
+    )
+    parser.add_argument(
+        "--max-unit-seconds",
+        type=float,
+        default=30,
+        help="Maximum seconds of speech in one ASR call, longer speech "
+        "segments are split. default: 30",
+    )
+    parser.add_argument(
+        "--speech-padding-seconds",
+        type=float,
+        default=0.2,
+        help="Audio kept around every speech segment. default: 0.2",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="error",
+        choices=["debug", "info", "warning", "error"],
+        help="Logging level: debug, info, warning, error. default: error",
+    )
+    return parser.parse_args(argv)
+
+
+def _read_manifest(path):
+    base_dir = os.path.dirname(path)
+    audio_files = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                line = entry.get("path") or entry["audio_filepath"]
+            audio_files.append(os.path.join(base_dir, line))
+    return audio_files
+
+
+def list_audio_files(inputs):
+    """
+    Returns the audio files of the given files, directories and manifests,
+    in order and without duplicates.
+    """
+    audio_files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            audio_files.extend(
+                sorted(
+                    found
+                    for found in glob.glob(
+                        os.path.join(path, "**", "*"), recursive=True
+                    )
+                    if found.lower().endswith(AUDIO_EXTENSIONS)
+                )
+            )
+        elif path.lower().endswith(AUDIO_EXTENSIONS):
+            audio_files.append(path)
+        else:
+            audio_files.extend(_read_manifest(path))
+    return list(dict.fromkeys(os.path.normpath(path) for path in audio_files))
+
+
+def load_waveform(path):
+    """
+    Reads a 16-bit PCM WAV file as a mono float32 waveform at 16 kHz.
+
+    The file is decoded in blocks of DECODE_BLOCK_SECONDS, the decoder
+    carries its resampling state from one block to the next.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit audio")
+        decoder = AudioDecoder(
+            "linear16",
+            wav.getframerate(),
+            SAMPLING_RATE,
+            wav.getnchannels(),
+        )
+        block_frames = int(DECODE_BLOCK_SECONDS * wav.getframerate())
+        blocks = []
+        while True:
+            frames = wav.readframes(block_frames)
+            if not frames:
+                break
+            blocks.append(decoder.decode(frames))
+    if not blocks:
+        return np.zeros(0, dtype=np.float32)
+    return pcm_to_float32(np.concatenate(blocks))
+
+
+def plan_units(vad_segments, num_samples, max_unit_seconds, padding_seconds):
+    """
+    Packs the speech segments of a file into ASR units.
+
+    Consecutive segments go in the same unit as long as their padded
+    speech fits in `max_unit_seconds`, longer segments are split first.
+    The pieces of a split segment are not padded where they meet, so no
+    audio is transcribed twice.
+
+    Returns:
+        list: One SpeechTrim per unit, mapping the concatenated speech of
+              the unit back to the time of the file.
+    """
+    piece_seconds = max(max_unit_seconds - 2 * padding_seconds, 1.0)
+    max_samples = max_unit_seconds * SAMPLING_RATE
+    segments = []
+    for segment in vad_segments:
+        start = segment["start"]
+        while segment["end"] - start > piece_seconds:
+            # Widened back to the cut points by the padding
+            segments.append(
+                {
+                    "start": start,
+                    "end": start + piece_seconds - padding_seconds,
+                }
+            )
+            start += piece_seconds + padding_seconds
+        segments.append({"start": start, "end": segment["end"]})
+
+    def trim(unit):
+        return SpeechTrim(unit, num_samples, SAMPLING_RATE, padding_seconds)
+
+    units = []
+    current = []
+    for segment in segments:
+        if current and trim(current + [segment]).kept_samples > max_samples:
+            units.append(trim(current))
+            current = []
+        current.append(segment)
+    if current:
+        units.append(trim(current))
+    return [unit for unit in units if unit.kept_samples]
+
+
+class ResultWriter:
+    """
+    Appends the result of every file to a JSONL output.
+
+    A result is one line, flushed as soon as it is written. When the output
+    already exists, the files with a result are skipped and a line cut by a
+    crash is dropped. Files that failed are written with an "error" and
+    retried by the next run, which drops their error lines first, so every
+    file has at most one line.
+
+    Attributes:
+        path (str): The JSONL output.
+        completed (set): Paths of the files with a result.
+    """
+
+    def __init__(self, path, overwrite=False):
+        self.path = path
+        self.completed = set()
+        if overwrite or not os.path.exists(path):
+            self._file = open(path, "w")
+            return
+
+        with open(path, "rb") as file:
+            content = file.read()
+        valid_length = content.rfind(b"\n") + 1
+        if valid_length < len(content):
+            logging.warning(f"Dropping an incomplete line of {path}")
+        lines = content[:valid_length].splitlines(keepends=True)
+        kept = []
+        for line in lines:
+            result = json.loads(line)
+            if "error" not in result:
+                self.completed.add(result["path"])
+                kept.append(line)
+
+        if len(kept) < len(lines) or valid_length < len(content):
+            # Rewritten aside, a crash keeps either version
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.writelines(kept)
+            os.replace(temporary_path, path)
+        self._file = open(path, "a")
+
+    def write(self, result):
+        self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BatchTranscriber:
+    """
+    Transcribes files through the VAD and ASR pipelines.
+
+    Attributes:
+        vad_pipeline (ExecutorVAD): Finds the speech segments of the files.
+        asr_pipeline (ASRInterface): ExecutorASR or ASRBatchScheduler
+                                     transcribing the units.
+        language (str): The language of the audio, None to detect it.
+        max_unit_seconds (float): Maximum seconds of speech in a unit.
+        padding_seconds (float): Audio kept around every speech segment.
+    """
+
+    def __init__(
+        self,
+        vad_pipeline,
+        asr_pipeline,
+        language=None,
+        max_unit_seconds=30,
+        padding_seconds=0.2,
+    ):
+        self.vad_pipeline = vad_pipeline
+        self.asr_pipeline = asr_pipeline
+        self.language = language
+        self.max_unit_seconds = max_unit_seconds
+        self.padding_seconds = padding_seconds
+
+    async def transcribe_file(self, path):
+        """
+        Returns the result of a file: its duration, the seconds of speech
+        sent to the ASR, the transcribed "text" and the "units" with their
+        start, end, text and words, all timed in the file.
+        """
+        started_at = time.time()
+        waveform = await asyncio.to_thread(load_waveform, path)
+        vad_segments, _ = await self.vad_pipeline.executor.run(
+            "detect_activity_sync", waveform, SAMPLING_RATE
+        )
+        units = plan_units(
+            vad_segments,
+            len(waveform),
+            self.max_unit_seconds,
+            self.padding_seconds,
+        )
+        transcriptions = await asyncio.gather(
+            *(
+                self.asr_pipeline.submit(
+                    unit.apply(waveform), SAMPLING_RATE, self.language
+                )
+                for unit in units
+            )
+        )
+
+        results = []
+        for unit, (transcription, _) in zip(units, transcriptions):
+            unit.map_transcription(transcription)
+            results.append(
+                {
+                    "start": unit.regions[0][0] / SAMPLING_RATE,
+                    "end": unit.regions[-1][1] / SAMPLING_RATE,
+                    "text": transcription["text"],
+                    "words": transcription.get("words", []),
+                    "language": transcription.get("language"),
+                }
+            )
+        return {
+            "path": path,
+            "duration": len(waveform) / SAMPLING_RATE,
+            "speech_seconds": sum(unit.kept_samples for unit in units)
+            / SAMPLING_RATE,
+            "text": " ".join(
+                result["text"].strip()
+                for result in results
+                if result["text"].strip()
+            ),
+            "units": results,
+            "processing_time": time.time() - started_at,
+        }
+
+
+async def run_batch(args, vad_pipeline, asr_pipeline):
+    """
+    Transcribes the files of `args.inputs` not already in the output.
+
+    Returns:
+        dict: The number of "files" transcribed, "failed" and "skipped",
+              the "audio_seconds" transcribed, the "wall_seconds" and the
+              resulting "speed" (seconds of audio per second).
+    """
+    audio_files = list_audio_files(args.inputs)
+    writer = ResultWriter(args.output, args.overwrite)
+    transcriber = BatchTranscriber(
+        vad_pipeline,
+        asr_pipeline,
+        language=args.language,
+        max_unit_seconds=args.max_unit_seconds,
+        padding_seconds=args.speech_padding_seconds,
+    )
+    todo = [path for path in audio_files if path not in writer.completed]
+    in_flight = asyncio.Semaphore(args.files_in_flight)
+    summary = {
+        "files": 0,
+        "failed": 0,
+        "skipped": len(audio_files) - len(todo),
+        "audio_seconds": 0.0,
+    }
+
+    async def transcribe(path):
+        async with in_flight:
+            try:
+                result = await transcriber.transcribe_file(path)
+            except Exception as e:
+                logging.exception(f"Could not transcribe {path}")
+                writer.write({"path": path, "error": str(e)})
+                summary["failed"] += 1
+                return
+        writer.write(result)
+        summary["files"] += 1
+        summary["audio_seconds"] += result["duration"]
+        logging.info(
+            f"Transcribed {path} ({result['duration']:.1f}s) in "
+            f"{result['processing_time']:.2f}s"
+        )
+
+    started_at = time.time()
+    try:
+        await asyncio.gather(*(transcribe(path) for path in todo))
+    finally:
+        writer.close()
+    summary["wall_seconds"] = time.time() - started_at
+    summary["speed"] = (
+        summary["audio_seconds"] / summary["wall_seconds"]
+        if summary["wall_seconds"] > 0
+        else None
+    )
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    vad_pipeline, asr_pipeline = create_pipelines(args)
+    try:
+        summary = asyncio.run(run_batch(args, vad_pipeline, asr_pipeline))
+    finally:
+        vad_pipeline.executor.shutdown()
+        asr_pipeline.executor.shutdown()
+
+    speed = summary["speed"]
+    print(
+        f"Transcribed {summary['files']} files "
+        f"({summary['audio_seconds'] / 3600:.2f}h of audio) in "
+        f"{summary['wall_seconds']:.1f}s"
+        + (f", {speed:.1f}x real time" if speed else "")
+        + f", {summary['failed']} failed, {summary['skipped']} already done"
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    main()
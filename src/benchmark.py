@@ -0,0 +1,471 @@
+"""
+Load test for the VoiceStreamAI websocket server.
+
+Starts a Server in-process (or targets a running one with --url), opens N
+concurrent websocket clients to /transcription/voice and streams WAV files
+at real-time pace or faster, then reports per-session and overall latency
+figures. Example:
+
+    python -m src.benchmark --clients 8 --speed 2 \\
+        --vad-type stub --asr-type stub --asr-args '{"rtf": 0.2}'
+
+The "stub" VAD and ASR backends need no model: the VAD is the EnergyVAD
+with an optional extra delay, and the ASR sleeps in proportion to the
+audio length, so the harness can size the server plumbing alone. Any other
+type is built through the factories, exactly as `src.main` does, see
+`src.pipelines`.
+"""
+
+import argparse
+import asyncio
+import collections
+import glob
+import json
+import logging
+import os
+import time
+import wave
+
+import numpy as np
+import websockets
+
+from src import metrics
+from src.inference.inference_executor import EXECUTOR_KINDS
+from src.pipelines import create_pipelines
+from src.server import Server
+
+AUDIO_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "test", "audio_files"
+)
+PERCENTILES = (50, 90, 99)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="VoiceStreamAI load test: streams WAV files from many "
+        "concurrent websocket clients and reports latencies."
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="WebSocket URL of a running server, by default a server is "
+        "started in-process with the pipelines below",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=4,
+        help="Number of concurrent sessions. default: 4",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Streaming speed, 1 is real time. default: 1",
+    )
+    parser.add_argument(
+        "--audio-files",
+        type=str,
+        nargs="+",
+        default=None,
+        help="16 kHz mono 16-bit WAV files, assigned to the sessions in "
+        "turn. default: test/audio_files/*.wav",
+    )
+    parser.add_argument(
+        "--annotations",
+        type=str,
+        default=os.path.join(AUDIO_DIR, "annotations.json"),
+        help="JSON file with the speech segments of the audio files, used "
+        "for the end-of-utterance latency",
+    )
+    parser.add_argument(
+        "--chunk-ms",
+        type=int,
+        default=250,
+        help="Duration of the audio sent in each message. default: 250",
+    )
+    parser.add_argument(
+        "--tail-silence-seconds",
+        type=float,
+        default=3.0,
+        help="Seconds of silence streamed after each file. default: 3",
+    )
+    parser.add_argument(
+        "--drain-seconds",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for results after streaming. default: 5",
+    )
+    parser.add_argument(
+        "--client-config",
+        type=str,
+        default="{}",
+        help="JSON 'data' of the config message sent by every client, "
+        'e.g. \'{"processing_strategy": "local_agreement"}\'',
+    )
+    parser.add_argument(
+        "--vad-type",
+        type=str,
+        default="stub",
+        help="Type of VAD pipeline to use (e.g., 'stub', 'energy' or "
+        "'pyannote'). default: stub",
+    )
+    parser.add_argument(
+        "--vad-args",
+        type=str,
+        default="{}",
+        help="JSON string of additional arguments for VAD pipeline",
+    )
+    parser.add_argument(
+        "--asr-type",
+        type=str,
+        default="stub",
+        help="Type of ASR pipeline to use (e.g., 'stub' or "
+        "'faster_whisper'). default: stub",
+    )
+    parser.add_argument(
+        "--asr-args",
+        type=str,
+        default="{}",
+        help="JSON string of additional arguments for ASR pipeline",
+    )
+    parser.add_argument(
+        "--inference-executor",
+        type=str,
+        default="thread",
+        choices=EXECUTOR_KINDS,
+        help="Where VAD and ASR inference runs. default: thread",
+    )
+    parser.add_argument("--vad-workers", type=int, default=1)
+    parser.add_argument("--asr-workers", type=int, default=1)
+    parser.add_argument("--asr-max-batch-size", type=int, default=1)
+    parser.add_argument("--asr-max-batch-wait-ms", type=float, default=50)
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8799,
+        help="Port of the in-process server. default: 8799",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Also write the report as JSON to this file",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="error",
+        choices=["debug", "info", "warning", "error"],
+        help="Logging level: debug, info, warning, error. default: error",
+    )
+    return parser.parse_args(argv)
+
+
+def load_audio(path):
+    with wave.open(path, "rb") as wav:
+        if (
+            wav.getframerate() != 16000
+            or wav.getnchannels() != 1
+            or wav.getsampwidth() != 2
+        ):
+            raise ValueError(f"{path} is not 16 kHz mono 16-bit audio")
+        return wav.readframes(wav.getnframes())
+
+
+def speech_ends(annotations, path):
+    segments = annotations.get(os.path.basename(path), {}).get("segments", [])
+    return [segment["end"] for segment in segments if segment["is_speech"]]
+
+
+class Session:
+    """
+    One benchmark client streaming a file and timing the results.
+
+    Times are wall-clock seconds from the moment the first audio chunk is
+    sent.
+
+    Attributes:
+        audio_file (str): The streamed file.
+        audio_seconds (float): Duration of the streamed audio, including
+                               the tail silence.
+        results (list): (receive time, message) of every transcription.
+        late_chunks (int): Chunks sent more than a chunk duration behind
+                           schedule, because the server did not read them
+                           in time.
+        end_of_speech (list): Send times of the end of every annotated
+                              speech segment.
+    """
+
+    def __init__(self, index, audio_file, audio, speech_ends, args):
+        self.index = index
+        self.audio_file = audio_file
+        self.args = args
+        self.chunk_bytes = 16000 * 2 * args.chunk_ms // 1000
+        self.audio = audio + bytes(int(args.tail_silence_seconds * 16000) * 2)
+        self.audio_seconds = len(self.audio) / (16000 * 2)
+        self.speech_ends = speech_ends
+        self.client_id = None
+        self.results = []
+        self.late_chunks = 0
+        self.end_of_speech = []
+        self._started_at = None
+
+    def _now(self):
+        return time.time() - self._started_at
+
+    async def run(self, url):
+        async with websockets.connect(url, max_size=None) as websocket:
+            greeting = await websocket.recv()
+            self.client_id = greeting.split()[1]
+            client_config = json.loads(self.args.client_config)
+            if client_config:
+                await websocket.send(
+                    json.dumps({"type": "config", "data": client_config})
+                )
+
+            receiver = asyncio.create_task(self._receive(websocket))
+            await self._stream(websocket)
+            await asyncio.sleep(self.args.drain_seconds)
+            receiver.cancel()
+
+    async def _stream(self, websocket):
+        chunk_seconds = self.args.chunk_ms / 1000
+        self._started_at = time.time()
+        speech_ends = collections.deque(sorted(self.speech_ends))
+
+        for number, offset in enumerate(
+            range(0, len(self.audio), self.chunk_bytes)
+        ):
+            scheduled = number * chunk_seconds / self.args.speed
+            delay = scheduled - self._now()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > chunk_seconds / self.args.speed:
+                self.late_chunks += 1
+
+            await websocket.send(
+                self.audio[offset : offset + self.chunk_bytes]  # noqa: E203
+            )
+            sent_seconds = (offset + self.chunk_bytes) / (16000 * 2)
+            while speech_ends and speech_ends[0] <= sent_seconds:
+                speech_ends.popleft()
+                self.end_of_speech.append(self._now())
+
+    async def _receive(self, websocket):
+        async for message in websocket:
+            try:
+                self.results.append((self._now(), json.loads(message)))
+            except json.JSONDecodeError:
+                logging.warning(f"Unexpected message: {message}")
+
+    def compute_seconds(self):
+        """
+        Returns the VAD and ASR compute time the server reported for the
+        transcribed chunks of the session.
+
+        Every message of a chunk carries the same "inference_timings" (the
+        "partial" and "final" of a local agreement pass, for instance) and
+        segment messages carry none, so each chunk is counted once.
+        """
+        total = 0.0
+        previous = None
+        for _, message in self.results:
+            timings = message.get("inference_timings")
+            if not timings or timings == previous:
+                continue
+            previous = timings
+            total += sum(
+                stage.get("compute_time", 0.0) for stage in timings.values()
+            )
+        return total
+
+    def report(self):
+        finals = [
+            received_at
+            for received_at, message in self.results
+            if message.get("type", "final") == "final"
+        ]
+        final_latencies = []
+        for end_of_speech in self.end_of_speech:
+            later = [at for at in finals if at >= end_of_speech]
+            if later:
+                final_latencies.append(later[0] - end_of_speech)
+
+        return {
+            "session": self.index,
+            "client_id": self.client_id,
+            "audio_file": os.path.basename(self.audio_file),
+            "audio_seconds": self.audio_seconds,
+            "results": len(self.results),
+            "finals": len(finals),
+            "rtf": self.compute_seconds() / self.audio_seconds,
+            "first_result_latency": (
+                self.results[0][0] if self.results else None
+            ),
+            "final_latencies": final_latencies,
+            "missed_finals": len(self.end_of_speech) - len(final_latencies),
+            "late_chunks": self.late_chunks,
+        }
+
+
+def percentiles(values):
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+
+
+def overload_outcomes():
+    """
+    Reads `metrics.overload_outcomes`, the overload policy outcomes of all
+    the sessions of this process, as a Counter keyed by outcome.
+    """
+    return collections.Counter(
+        {
+            label_values[0]: value
+            for _, label_values, _, value in (
+                metrics.overload_outcomes.samples()
+            )
+        }
+    )
+
+
+def summarize(reports, overload):
+    final_latencies = [
+        latency for report in reports for latency in report["final_latencies"]
+    ]
+    first_result_latencies = [
+        report["first_result_latency"]
+        for report in reports
+        if report["first_result_latency"] is not None
+    ]
+    return {
+        "sessions": len(reports),
+        "rtf": percentiles([report["rtf"] for report in reports]),
+        "first_result_latency": percentiles(first_result_latencies),
+        "final_latency": percentiles(final_latencies),
+        "missed_finals": sum(report["missed_finals"] for report in reports),
+        "late_chunks": sum(report["late_chunks"] for report in reports),
+        "overload": overload,
+    }
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value:.3f}s"
+
+
+def print_report(report):
+    print(
+        f"{'session':>7} {'file':<24} {'rtf':>6} {'first':>8} "
+        f"{'final p50':>10} {'final max':>10} {'late':>5}"
+    )
+    for session in report["per_session"]:
+        latencies = session["final_latencies"]
+        print(
+            f"{session['session']:>7} {session['audio_file']:<24} "
+            f"{session['rtf']:>6.3f} "
+            f"{_format_seconds(session['first_result_latency']):>8} "
+            f"{_format_seconds(percentiles(latencies)['p50']):>10} "
+            f"{_format_seconds(max(latencies, default=None)):>10} "
+            f"{session['late_chunks']:>5}"
+        )
+
+    summary = report["summary"]
+    print(f"\n{summary['sessions']} sessions")
+    for name in ("rtf", "first_result_latency", "final_latency"):
+        values = ", ".join(
+            f"{key} {'-' if value is None else f'{value:.3f}'}"
+            for key, value in summary[name].items()
+        )
+        print(f"{name}: {values}")
+    print(
+        f"missed finals: {summary['missed_finals']}, "
+        f"late chunks: {summary['late_chunks']}"
+    )
+    if summary["overload"] is not None:
+        print(f"server overload: {summary['overload']}")
+
+
+async def run_benchmark(args, server=None):
+    """
+    Runs the benchmark sessions concurrently.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+        server (Server): The in-process server, used to read the overload
+                         counters. None when benchmarking a remote server.
+
+    Returns:
+        dict: The "summary" and the "per_session" reports.
+    """
+    audio_files = args.audio_files or sorted(
+        glob.glob(os.path.join(AUDIO_DIR, "*.wav"))
+    )
+    annotations = {}
+    if args.annotations and os.path.exists(args.annotations):
+        with open(args.annotations) as file:
+            annotations = json.load(file)
+
+    audio = {path: load_audio(path) for path in audio_files}
+    sessions = [
+        Session(
+            index,
+            path,
+            audio[path],
+            speech_ends(annotations, path),
+            args,
+        )
+        for index, path in enumerate(
+            audio_files[i % len(audio_files)] for i in range(args.clients)
+        )
+    ]
+
+    overload_before = overload_outcomes()
+    url = args.url or f"ws://127.0.0.1:{args.port}/transcription/voice"
+    await asyncio.gather(*(session.run(url) for session in sessions))
+
+    overload = None
+    if server is not None:
+        overload = dict(overload_outcomes() - overload_before)
+
+    reports = [session.report() for session in sessions]
+    return {
+        "summary": summarize(reports, overload),
+        "per_session": reports,
+    }
+
+
+async def main_async(args):
+    if args.url:
+        return await run_benchmark(args)
+
+    vad_pipeline, asr_pipeline = create_pipelines(args)
+    server = Server(
+        vad_pipeline, asr_pipeline, host="127.0.0.1", port=args.port
+    )
+    await server.warm_up(passes=max(args.vad_workers, args.asr_workers))
+    websocket_server = await server.start()
+    try:
+        return await run_benchmark(args, server)
+    finally:
+        websocket_server.close()
+        await websocket_server.wait_closed()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
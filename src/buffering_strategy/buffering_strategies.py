@@ -1,10 +1,17 @@
-import asyncio
+import collections
 import json
+import logging
 import os
+import re
 import time
 
+from src import capacity, metrics
+from src.speech_trim import SpeechTrim
+
 from .buffering_strategy_interface import BufferingStrategyInterface
 
+OVERLOAD_POLICIES = ("queue", "merge", "drop_oldest", "downgrade")
+
 
 class SilenceAtEndOfChunk(BufferingStrategyInterface):
     """
@@ -21,6 +28,36 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
         chunk_length_seconds (float): Length of each audio chunk in seconds.
         chunk_offset_seconds (float): Offset time in seconds to be considered
                                       for processing audio chunks.
+        overload_policy (str): What to do when a chunk is ready while the
+                               previous one is still being processed:
+                               "queue" it (up to `max_pending_chunks`, then
+                               merge it into the last pending chunk: audio
+                               is never refused), "merge" it into a single
+                               pending chunk, queue it and "drop_oldest"
+                               pending chunk beyond `max_pending_chunks`, or
+                               "downgrade" the session to the fallback ASR
+                               pipeline and queue it, until the pending
+                               chunks are caught up with.
+        max_pending_chunks (int): Maximum number of chunks waiting to be
+                                  processed.
+        overload_counters (collections.Counter): How many times each overload
+                                                 outcome ("queued", "merged",
+                                                 "dropped", "downgraded")
+                                                 happened for this session.
+        stream_segments (bool): Send every segment of a chunk in a
+                                "segment" message as soon as the ASR
+                                decodes it, before the "final" message of
+                                the chunk. Backends decoding incrementally
+                                (faster-whisper) stream with every
+                                inference executor, batching and workers;
+                                the others only send the final message.
+        trim_non_speech (bool): Transcribe only the speech segments found by
+                                the VAD, widened by
+                                `speech_padding_seconds`, instead of the
+                                whole chunk. Word timestamps are mapped back
+                                to the time of the chunk.
+        speech_padding_seconds (float): Audio kept around every speech
+                                        segment when trimming.
     """
 
     def __init__(self, client, **kwargs):
@@ -55,9 +92,50 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
                 "error_if_not_realtime", False
             )
 
+        self.overload_policy = os.environ.get("BUFFERING_OVERLOAD_POLICY")
+        if not self.overload_policy:
+            self.overload_policy = kwargs.get("overload_policy", "queue")
+        if self.overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(
+                f"Unknown overload policy: {self.overload_policy}"
+            )
+        self.max_pending_chunks = int(kwargs.get("max_pending_chunks", 2))
+
+        self.stream_segments = os.environ.get("BUFFERING_STREAM_SEGMENTS")
+        if not self.stream_segments:
+            self.stream_segments = kwargs.get("stream_segments", False)
+        self.stream_segments = str(self.stream_segments).lower() in (
+            "1",
+            "true",
+        )
+
+        self.trim_non_speech = os.environ.get("BUFFERING_TRIM_NON_SPEECH")
+        if not self.trim_non_speech:
+            self.trim_non_speech = kwargs.get("trim_non_speech", False)
+        self.trim_non_speech = str(self.trim_non_speech).lower() in (
+            "1",
+            "true",
+        )
+        self.speech_padding_seconds = float(
+            kwargs.get("speech_padding_seconds", 0.2)
+        )
+
         self.processing_flag = False
+        self.downgraded = False
+        self.overload_counters = collections.Counter()
+        # When the chunk being processed and the pending ones became ready
+        self.chunk_ready_at = None
+        self.pending_ready_at = collections.deque()
 
-    def process_audio(self, websocket, vad_pipeline, asr_pipeline,sessionId = "",callId = ""):
+    def process_audio(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        sessionId="",
+        callId="",
+        fallback_asr_pipeline=None,
+    ):
         """
         Process audio chunks by checking their length and scheduling
         asynchronous processing.
@@ -69,28 +147,111 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
             websocket: The WebSocket connection for sending transcriptions.
             vad_pipeline: The voice activity detection pipeline.
             asr_pipeline: The automatic speech recognition pipeline.
+            fallback_asr_pipeline: A cheaper ASR pipeline used by the
+                                   "downgrade" overload policy.
         """
-        chunk_length_in_bytes = (
-            self.chunk_length_seconds
-            * self.client.sampling_rate
-            * self.client.samples_width
+        chunk_length_in_samples = (
+            self.chunk_length_seconds * self.client.sampling_rate
         )
-        if len(self.client.buffer) > chunk_length_in_bytes:
+        if self.client.buffered_samples > chunk_length_in_samples:
             if self.processing_flag:
-                exit(
-                    "Error in realtime processing: tried processing a new "
-                    "chunk while the previous one was still being processed"
+                self.handle_overload(fallback_asr_pipeline)
+                return
+
+            self.client.move_buffer_to_scratch()
+            self.chunk_ready_at = time.time()
+            self.schedule_processing(
+                websocket,
+                vad_pipeline,
+                asr_pipeline,
+                fallback_asr_pipeline,
+                sessionId,
+                callId,
+            )
+
+    def handle_overload(self, fallback_asr_pipeline):
+        """
+        Applies the overload policy to a chunk that became ready while the
+        previous one is still being processed.
+
+        The chunk is moved from the client buffer to the client's pending
+        chunks, which are processed in order once the current chunk is done.
+        """
+        pending_chunks = self.client.pending_chunks
+        policy = self.overload_policy
+
+        if policy == "downgrade" and not self.downgraded:
+            if fallback_asr_pipeline is None:
+                logging.warning(
+                    "No fallback ASR pipeline to downgrade client "
+                    f"{self.client.client_id} to, queueing instead"
                 )
+            else:
+                self.downgraded = True
+                self._count_overload("downgraded")
+
+        if policy == "merge":
+            limit = 1
+        elif policy == "drop_oldest":
+            limit = None
+        else:
+            limit = self.max_pending_chunks
+
+        if limit is not None and len(pending_chunks) >= limit:
+            self.client.merge_buffer_into_pending()
+            self._count_overload("merged")
+        else:
+            self.client.move_buffer_to_pending()
+            self.pending_ready_at.append(time.time())
+            self._count_overload("queued")
 
-            self.client.scratch_buffer += self.client.buffer
-            self.client.buffer.clear()
-            self.processing_flag = True
-            # Schedule the processing in a separate task
-            asyncio.create_task(
-                self.process_audio_async(websocket, vad_pipeline, asr_pipeline,sessionId=sessionId,callId=callId)
+        if policy == "drop_oldest":
+            while len(pending_chunks) > self.max_pending_chunks:
+                self.client.drop_oldest_pending()
+                if self.pending_ready_at:
+                    self.pending_ready_at.popleft()
+                self._count_overload("dropped")
+
+    def _count_overload(self, outcome):
+        self.overload_counters[outcome] += 1
+        metrics.overload_outcomes.inc(outcome)
+        logging.warning(
+            f"Client {self.client.client_id} is not keeping up with real "
+            f"time: chunk {outcome} "
+            f"({len(self.client.pending_chunks)} pending)"
+        )
+
+    def schedule_processing(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        fallback_asr_pipeline,
+        sessionId,
+        callId,
+    ):
+        self.processing_flag = True
+        # Schedule the processing in a task of the session
+        self.client.create_task(
+            self.process_audio_async(
+                websocket,
+                vad_pipeline,
+                asr_pipeline,
+                sessionId=sessionId,
+                callId=callId,
+                fallback_asr_pipeline=fallback_asr_pipeline,
             )
+        )
 
-    async def process_audio_async(self, websocket, vad_pipeline, asr_pipeline,sessionId = "",callId = ""):
+    async def process_audio_async(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        sessionId="",
+        callId="",
+        fallback_asr_pipeline=None,
+    ):
         """
         Asynchronously process audio for activity detection and transcription.
 
@@ -103,33 +264,571 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
                                    transcriptions.
             vad_pipeline: The voice activity detection pipeline.
             asr_pipeline: The automatic speech recognition pipeline.
+            fallback_asr_pipeline: A cheaper ASR pipeline used by the
+                                   "downgrade" overload policy.
         """
+        if self.downgraded:
+            asr_pipeline = fallback_asr_pipeline
+        audio_seconds = self.client.scratch_samples / self.client.sampling_rate
+        started_at = time.time()
+        try:
+            await self._process_chunk(
+                websocket, vad_pipeline, asr_pipeline, sessionId, callId
+            )
+            capacity.real_time_factor.observe(
+                audio_seconds, time.time() - started_at
+            )
+        finally:
+            self.processing_flag = False
+            if self.downgraded and not self.client.pending_chunks:
+                # Caught up with, back to the primary ASR pipeline
+                self.downgraded = False
+                logging.info(
+                    f"Client {self.client.client_id} caught up, restoring "
+                    "the primary ASR pipeline"
+                )
+            if self.client.pending_chunks:
+                self.client.move_pending_to_scratch()
+                self.chunk_ready_at = (
+                    self.pending_ready_at.popleft()
+                    if self.pending_ready_at
+                    else time.time()
+                )
+                self.schedule_processing(
+                    websocket,
+                    vad_pipeline,
+                    asr_pipeline,
+                    fallback_asr_pipeline,
+                    sessionId,
+                    callId,
+                )
+
+    async def _process_chunk(
+        self, websocket, vad_pipeline, asr_pipeline, sessionId, callId
+    ):
         start = time.time()
+        if self.chunk_ready_at is not None:
+            metrics.receive_to_vad_seconds.observe(start - self.chunk_ready_at)
+        self.client.inference_timings = {}
         vad_results = await vad_pipeline.detect_activity(self.client)
-        # print("vad_time - " + str(time.time() - start))
+        vad_seconds = time.time() - start
         if len(vad_results) == 0:
-            self.client.scratch_buffer.clear()
-            self.client.buffer.clear()
-            self.processing_flag = False
+            metrics.silent_chunks.inc()
+            metrics.observe_inference_timings(
+                self.client.inference_timings, vad_seconds
+            )
+            self.client.clear_scratch_buffer()
+            self.client.clear_buffer()
             return
 
         last_segment_should_end_before = (
-            len(self.client.scratch_buffer)
-            / (self.client.sampling_rate * self.client.samples_width)
+            self.client.scratch_samples / self.client.sampling_rate
         ) - self.chunk_offset_seconds
-        if vad_results[-1]["end"] < last_segment_should_end_before:
-            transcription = await asr_pipeline.transcribe(self.client)
-            # print("transcription_time - " + str(time.time() - start))
+        # Transcribe long utterances before they outgrow the ring buffer
+        scratch_is_full = (
+            self.client.scratch_samples >= self.client.audio.capacity / 2
+        )
+        if (
+            vad_results[-1]["end"] < last_segment_should_end_before
+            or scratch_is_full
+        ):
+            if self.trim_non_speech:
+                self.client.speech_trim = SpeechTrim(
+                    vad_results,
+                    self.client.scratch_samples,
+                    self.client.sampling_rate,
+                    self.speech_padding_seconds,
+                )
+                metrics.asr_trimmed_seconds.inc(
+                    amount=self.client.speech_trim.trimmed_samples
+                    / self.client.sampling_rate
+                )
+            try:
+                if self.stream_segments:
+                    transcription = await self._transcribe_streaming(
+                        websocket, asr_pipeline, start, sessionId, callId
+                    )
+                else:
+                    transcription = await asr_pipeline.transcribe(self.client)
+                if self.client.speech_trim is not None:
+                    self.client.speech_trim.map_transcription(transcription)
+            finally:
+                self.client.speech_trim = None
+            self.client.observe_transcription(transcription)
+            metrics.observe_inference_timings(
+                self.client.inference_timings, vad_seconds
+            )
             if transcription["text"] != "":
+                transcription["type"] = "final"
                 transcription["callId"] = callId
                 transcription["sessionId"] = sessionId
                 end = time.time()
                 transcription["processing_time"] = end - start
+                transcription["inference_timings"] = dict(
+                    self.client.inference_timings
+                )
                 json_transcription = json.dumps(transcription)
-            
-                print(json_transcription)
+                logging.debug(json_transcription)
+
                 await websocket.send(json_transcription)
-            self.client.scratch_buffer.clear()
+                metrics.send_seconds.observe(time.time() - end)
+            self.client.clear_scratch_buffer()
             self.client.increment_file_counter()
+        else:
+            metrics.observe_inference_timings(
+                self.client.inference_timings, vad_seconds
+            )
+
+    async def _transcribe_streaming(
+        self, websocket, asr_pipeline, start, sessionId, callId
+    ):
+        """
+        Transcribes the scratch buffer, sending every segment as soon as it
+        is decoded. Returns once all the segments are sent, so the "final"
+        message always comes last.
+        """
+        last_send = None
+        speech_trim = self.client.speech_trim
+
+        async def send(message, previous):
+            if previous is not None:
+                await previous
+            await websocket.send(json.dumps(message))
+
+        def on_segment(segment):
+            nonlocal last_send
+            if not segment["text"]:
+                return
+            message = dict(segment)
+            if speech_trim is not None:
+                # The words are shared with the transcription, mapped later
+                message["words"] = [
+                    dict(word) for word in segment.get("words", [])
+                ]
+                speech_trim.map_transcription(message)
+            message["type"] = "segment"
+            message["callId"] = callId
+            message["sessionId"] = sessionId
+            message["processing_time"] = time.time() - start
+            # Every send waits for the previous one to keep segments in order
+            last_send = self.client.create_task(send(message, last_send))
+
+        transcription = await asr_pipeline.transcribe_streaming(
+            self.client, on_segment
+        )
+        if last_send is not None:
+            await last_send
+        return transcription
+
+
+class AdaptiveChunkLength(SilenceAtEndOfChunk):
+    """
+    SilenceAtEndOfChunk with a chunk length following the server load.
+
+    Short chunks give low latency when the server is idle, but cost one VAD
+    and ASR call each and overload it when busy. After every processed
+    chunk, the time spent on its VAD and ASR (queueing included) divided by
+    its audio duration gives a real-time factor, smoothed over the last
+    chunks.
+
+    When the real-time factor exceeds `max_rtf`, chunks of this session are
+    pending, or at least `max_pending_requests` transcriptions of all the
+    sessions are pending on the ASR pipeline, the chunk length grows by
+    `step_factor` up to `max_chunk_length_seconds`. When the real-time
+    factor is below `min_rtf` and no transcription is pending, it shrinks
+    by `step_factor` down to `min_chunk_length_seconds`. Every adjustment
+    is logged.
+
+    Attributes:
+        min_chunk_length_seconds (float): Latency floor of the chunk length.
+        max_chunk_length_seconds (float): Ceiling of the chunk length.
+        min_rtf (float): Real-time factor below which chunks shrink.
+        max_rtf (float): Real-time factor above which chunks grow.
+        max_pending_requests (int): Pending transcriptions of the ASR
+                                    pipeline from which chunks grow.
+        step_factor (float): Factor applied to the chunk length by each
+                             adjustment.
+        rtf (float): Smoothed real-time factor of the processed chunks.
+    """
+
+    # Weight of the last chunk in the smoothed real-time factor
+    RTF_SMOOTHING = 0.3
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self.min_chunk_length_seconds = float(
+            kwargs.get("min_chunk_length_seconds", 1.0)
+        )
+        self.max_chunk_length_seconds = float(
+            kwargs.get("max_chunk_length_seconds", 10.0)
+        )
+        if self.min_chunk_length_seconds > self.max_chunk_length_seconds:
+            raise ValueError(
+                "min_chunk_length_seconds must not exceed "
+                "max_chunk_length_seconds"
+            )
+        self.min_rtf = float(kwargs.get("min_rtf", 0.2))
+        self.max_rtf = float(kwargs.get("max_rtf", 0.5))
+        self.max_pending_requests = int(kwargs.get("max_pending_requests", 4))
+        self.step_factor = float(kwargs.get("step_factor", 1.25))
+        self.rtf = None
+        self.chunk_length_seconds = min(
+            max(self.chunk_length_seconds, self.min_chunk_length_seconds),
+            self.max_chunk_length_seconds,
+        )
+
+    async def _process_chunk(
+        self, websocket, vad_pipeline, asr_pipeline, sessionId, callId
+    ):
+        audio_seconds = self.client.scratch_samples / self.client.sampling_rate
+        start = time.time()
+        await super()._process_chunk(
+            websocket, vad_pipeline, asr_pipeline, sessionId, callId
+        )
+        self.adapt(time.time() - start, audio_seconds, asr_pipeline.pending)
+
+    def adapt(self, processing_seconds, audio_seconds, pending_requests):
+        """
+        Adjusts the chunk length after a chunk was processed.
+
+        Args:
+            processing_seconds (float): Time spent on the VAD and ASR of the
+                                        chunk.
+            audio_seconds (float): Duration of the chunk audio.
+            pending_requests (int): Transcriptions pending on the ASR
+                                    pipeline, for all the sessions.
+        """
+        if audio_seconds <= 0:
+            return
+        rtf = processing_seconds / audio_seconds
+        if self.rtf is None:
+            self.rtf = rtf
+        else:
+            self.rtf += self.RTF_SMOOTHING * (rtf - self.rtf)
+
+        pending_chunks = len(self.client.pending_chunks)
+        if (
+            self.rtf > self.max_rtf
+            or pending_chunks
+            or pending_requests >= self.max_pending_requests
+        ):
+            chunk_length_seconds = min(
+                self.chunk_length_seconds * self.step_factor,
+                self.max_chunk_length_seconds,
+            )
+        elif self.rtf < self.min_rtf and not pending_requests:
+            chunk_length_seconds = max(
+                self.chunk_length_seconds / self.step_factor,
+                self.min_chunk_length_seconds,
+            )
+        else:
+            return
+
+        if chunk_length_seconds != self.chunk_length_seconds:
+            logging.info(
+                f"Client {self.client.client_id}: chunk length "
+                f"{self.chunk_length_seconds:.2f}s -> "
+                f"{chunk_length_seconds:.2f}s (real-time factor "
+                f"{self.rtf:.2f}, {pending_chunks} chunks and "
+                f"{pending_requests} transcriptions pending)"
+            )
+            self.chunk_length_seconds = chunk_length_seconds
+
+
+class LocalAgreement(BufferingStrategyInterface):
+    """
+    A low-latency buffering strategy emitting partial and final results.
+
+    Every `step_seconds` of new audio, the whole window of not yet committed
+    audio (the client's scratch buffer) is transcribed again and the
+    hypothesis is sent as a "partial" message. Words on which the last
+    `agreement_passes` hypotheses agree, from the start of the window, are
+    committed: they are sent once as a "final" message and the window is
+    trimmed past the end of the last committed word, so later passes only
+    see the audio that is still uncertain.
+
+    The whole hypothesis is committed when the VAD finds that the speech
+    ended at least `chunk_offset_seconds` before the end of the window, or
+    when the window reaches `max_window_seconds`. A window without speech
+    is dropped.
+
+    Word timestamps of the final and partial messages are relative to the
+    start of the stream. With ASR backends that do not return words, the
+    window can only be trimmed when the whole hypothesis is committed.
+
+    Attributes:
+        client (Client): The client instance associated with this buffering
+                         strategy.
+        step_seconds (float): Seconds of new audio between two passes.
+        chunk_offset_seconds (float): Silence at the end of the window that
+                                      ends an utterance.
+        max_window_seconds (float): Longest window transcribed in one pass.
+        agreement_passes (int): Number of consecutive hypotheses that have
+                                to agree on a word to commit it.
+    """
+
+    def __init__(self, client, **kwargs):
+        """
+        Initialize the LocalAgreement buffering strategy.
+
+        Args:
+            client (Client): The client instance associated with this buffering
+                             strategy.
+            **kwargs: Additional keyword arguments, including 'step_seconds',
+                      'chunk_offset_seconds', 'max_window_seconds' and
+                      'agreement_passes'.
+        """
+        self.client = client
+        self.step_seconds = float(kwargs.get("step_seconds", 0.5))
+        self.chunk_offset_seconds = float(
+            kwargs.get("chunk_offset_seconds", 0.7)
+        )
+        self.max_window_seconds = float(kwargs.get("max_window_seconds", 15))
+        self.agreement_passes = int(kwargs.get("agreement_passes", 2))
+        if self.agreement_passes < 1:
+            raise ValueError("agreement_passes must be at least 1")
 
         self.processing_flag = False
+        self.chunk_ready_at = None
+        self.step_audio_seconds = 0.0
+        # Uncommitted words of the previous passes, oldest first. A single
+        # pass keeps none and commits every hypothesis as it comes.
+        self.hypotheses = collections.deque(maxlen=self.agreement_passes - 1)
+        # End of the last committed word, in seconds from the stream start
+        self.committed_until = 0.0
+        # Committed words still in the window, for backends without words
+        self.committed_in_window = 0
+
+    def process_audio(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        sessionId="",
+        callId="",
+        fallback_asr_pipeline=None,
+    ):
+        """
+        Schedules a pass over the window once `step_seconds` of new audio
+        were received.
+
+        While a pass is running, new audio simply stays in the client buffer
+        and the next pass covers all of it, so a slow ASR backend makes the
+        passes less frequent instead of queueing them.
+        """
+        step_in_samples = self.step_seconds * self.client.sampling_rate
+        if self.processing_flag or self.client.buffered_samples < (
+            step_in_samples
+        ):
+            return
+
+        self.step_audio_seconds = (
+            self.client.buffered_samples / self.client.sampling_rate
+        )
+        self.client.move_buffer_to_scratch()
+        self.chunk_ready_at = time.time()
+        self.processing_flag = True
+        self.client.create_task(
+            self.process_audio_async(
+                websocket, vad_pipeline, asr_pipeline, sessionId, callId
+            )
+        )
+
+    async def process_audio_async(
+        self, websocket, vad_pipeline, asr_pipeline, sessionId="", callId=""
+    ):
+        """
+        Transcribes the window and sends the partial and final results
+        through the WebSocket connection.
+        """
+        started_at = time.time()
+        try:
+            await self._process_window(
+                websocket, vad_pipeline, asr_pipeline, sessionId, callId
+            )
+            # A pass costs its processing time for its new audio only
+            capacity.real_time_factor.observe(
+                self.step_audio_seconds, time.time() - started_at
+            )
+        finally:
+            self.processing_flag = False
+
+    async def _process_window(
+        self, websocket, vad_pipeline, asr_pipeline, sessionId, callId
+    ):
+        start = time.time()
+        client = self.client
+        window_seconds = client.scratch_samples / client.sampling_rate
+
+        metrics.receive_to_vad_seconds.observe(start - self.chunk_ready_at)
+        client.inference_timings = {}
+        vad_results = await vad_pipeline.detect_activity(client)
+        vad_seconds = time.time() - start
+        if len(vad_results) == 0:
+            metrics.silent_chunks.inc()
+            metrics.observe_inference_timings(
+                client.inference_timings, vad_seconds
+            )
+            # Nothing more will confirm the last hypothesis
+            if self.hypotheses and self.hypotheses[-1]:
+                await self._send(
+                    websocket,
+                    "final",
+                    self.hypotheses[-1],
+                    {},
+                    start,
+                    sessionId,
+                    callId,
+                )
+            self._reset_window()
+            return
+
+        utterance_ended = (
+            vad_results[-1]["end"]
+            < window_seconds - self.chunk_offset_seconds
+        )
+        window_is_full = (
+            window_seconds >= self.max_window_seconds
+            or client.scratch_samples >= client.audio.capacity / 2
+        )
+
+        transcription = await asr_pipeline.transcribe(client)
+        client.observe_transcription(transcription)
+        metrics.observe_inference_timings(
+            client.inference_timings, vad_seconds
+        )
+        words = self._hypothesis_words(transcription)
+
+        if utterance_ended or window_is_full:
+            committed, uncertain = words, []
+        else:
+            committed = self._agreed_prefix(words)
+            uncertain = words[len(committed) :]  # noqa: E203
+
+        if committed:
+            await self._send(
+                websocket,
+                "final",
+                committed,
+                transcription,
+                start,
+                sessionId,
+                callId,
+            )
+        if uncertain:
+            await self._send(
+                websocket,
+                "partial",
+                uncertain,
+                transcription,
+                start,
+                sessionId,
+                callId,
+            )
+
+        if utterance_ended or window_is_full:
+            self._reset_window()
+            return
+
+        self.hypotheses = collections.deque(
+            (
+                hypothesis[len(committed) :]  # noqa: E203
+                for hypothesis in self.hypotheses
+            ),
+            maxlen=self.hypotheses.maxlen,
+        )
+        self.hypotheses.append(uncertain)
+        if committed:
+            self._commit(committed)
+
+    def _hypothesis_words(self, transcription):
+        """
+        Returns the words of a transcription that come after the committed
+        ones, with timestamps relative to the start of the stream.
+        """
+        if transcription.get("words"):
+            offset = self.client.scratch_start / self.client.sampling_rate
+            words = [
+                {
+                    "word": word["word"].strip(),
+                    "start": word["start"] + offset,
+                    "end": word["end"] + offset,
+                    "probability": word.get("probability"),
+                }
+                for word in transcription["words"]
+                if word["word"].strip()
+            ]
+            # The window starts at the end of the last committed word, a
+            # word straddling it was already committed.
+            return [
+                word
+                for word in words
+                if (word["start"] + word["end"]) / 2 >= self.committed_until
+            ]
+
+        words = [{"word": word} for word in transcription["text"].split()]
+        return words[self.committed_in_window :]  # noqa: E203
+
+    def _agreed_prefix(self, words):
+        if len(self.hypotheses) < self.agreement_passes - 1:
+            return []
+
+        agreed = 0
+        for index, word in enumerate(words):
+            key = _normalize_word(word["word"])
+            if not all(
+                index < len(hypothesis)
+                and _normalize_word(hypothesis[index]["word"]) == key
+                for hypothesis in self.hypotheses
+            ):
+                break
+            agreed = index + 1
+        return words[:agreed]
+
+    def _commit(self, committed):
+        if "end" in committed[-1]:
+            self.committed_until = committed[-1]["end"]
+            self.client.trim_scratch_buffer(
+                int(self.committed_until * self.client.sampling_rate)
+            )
+        else:
+            self.committed_in_window += len(committed)
+
+    def _reset_window(self):
+        self.client.clear_scratch_buffer()
+        self.client.increment_file_counter()
+        self.hypotheses.clear()
+        self.committed_in_window = 0
+        self.committed_until = (
+            self.client.scratch_end / self.client.sampling_rate
+        )
+
+    async def _send(
+        self,
+        websocket,
+        message_type,
+        words,
+        transcription,
+        start,
+        sessionId,
+        callId,
+    ):
+        message = {
+            "type": message_type,
+            "text": " ".join(word["word"] for word in words),
+            "words": words,
+        }
+        for key in ("language", "language_probability", "language_locked"):
+            if key in transcription:
+                message[key] = transcription[key]
+        message["callId"] = callId
+        message["sessionId"] = sessionId
+        message["processing_time"] = time.time() - start
+        message["inference_timings"] = dict(self.client.inference_timings)
+        sent_at = time.time()
+        await websocket.send(json.dumps(message))
+        metrics.send_seconds.observe(time.time() - sent_at)
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
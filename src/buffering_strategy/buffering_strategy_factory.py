@@ -1,4 +1,21 @@
-from .buffering_strategies import SilenceAtEndOfChunk
+from src.backend_registry import BackendRegistry
+
+# Strategies are only imported when selected, see BackendRegistry
+BUFFERING_STRATEGIES = BackendRegistry(
+    "buffering strategy",
+    "voicestreamai.buffering_strategies",
+    {
+        "silence_at_end_of_chunk": (
+            "src.buffering_strategy.buffering_strategies:SilenceAtEndOfChunk"
+        ),
+        "local_agreement": (
+            "src.buffering_strategy.buffering_strategies:LocalAgreement"
+        ),
+        "adaptive_chunk_length": (
+            "src.buffering_strategy.buffering_strategies:AdaptiveChunkLength"
+        ),
+    },
+)
 
 
 class BufferingStrategyFactory:
@@ -12,8 +29,17 @@ class BufferingStrategyFactory:
     Methods:
         create_buffering_strategy: Creates and returns an instance of a
                                    specified buffering strategy.
+        register_buffering_strategy: Registers a new buffering strategy.
     """
 
+    @staticmethod
+    def register_buffering_strategy(type, target):
+        """
+        Registers a buffering strategy, either a class or a "module:Class"
+        string imported when the strategy is first used.
+        """
+        BUFFERING_STRATEGIES.register(type, target)
+
     @staticmethod
     def create_buffering_strategy(type, client, **kwargs):
         """
@@ -26,7 +52,11 @@ class BufferingStrategyFactory:
 
         Args:
             type (str): The type of buffering strategy to create. Currently
-                        supports 'silence_at_end_of_chunk'.
+                        supports 'silence_at_end_of_chunk', 'local_agreement',
+                        'adaptive_chunk_length' and the strategies
+                        registered with `register_buffering_strategy` or
+                        declared in the "voicestreamai.buffering_strategies"
+                        entry points.
             client (Client): The client instance to be associated with the
                              buffering strategy.
             **kwargs: Additional keyword arguments specific to the buffering
@@ -43,7 +73,4 @@ class BufferingStrategyFactory:
                        "silence_at_end_of_chunk", client
                        )
         """
-        if type == "silence_at_end_of_chunk":
-            return SilenceAtEndOfChunk(client, **kwargs)
-        else:
-            raise ValueError(f"Unknown buffering strategy type: {type}")
+        return BUFFERING_STRATEGIES.load(type)(client, **kwargs)
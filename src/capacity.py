@@ -0,0 +1,194 @@
+"""
+Transcription capacity of the server, used to refuse new sessions when the
+inference backlog is more than the hardware can absorb.
+
+The buffering strategies report every processed chunk to
+`real_time_factor`, the AdmissionController combines it with the audio
+waiting for inference in the connected sessions.
+"""
+
+import collections
+import json
+import threading
+import time
+
+from src import metrics
+
+# Close code of refused sessions, 1013 is "Try Again Later" (RFC 6455)
+OVERLOADED_CLOSE_CODE = 1013
+# Real-time factor the spare sessions are extrapolated to without a max_rtf
+# budget, beyond which the server can no longer keep up with the audio
+DEFAULT_MAX_RTF = 1.0
+
+
+class RecentRealTimeFactor:
+    """
+    Real-time factor of the chunks processed in the last `window_seconds`.
+
+    The real-time factor of a chunk is the wall time from the start of its
+    VAD to the end of its ASR, queueing included, divided by its audio
+    duration. It grows toward 1 as the inference backlog builds up.
+
+    Attributes:
+        window_seconds (float): How long processed chunks are remembered.
+    """
+
+    def __init__(self, window_seconds=60.0):
+        self.window_seconds = window_seconds
+        self._chunks = collections.deque()
+        self._lock = threading.Lock()
+
+    def observe(self, audio_seconds, processing_seconds, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._chunks.append((now, audio_seconds, processing_seconds))
+            self._expire(now)
+
+    def value(self, now=None):
+        """
+        Returns the real-time factor of the recent chunks, weighted by their
+        duration, or None when no chunk was processed recently.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            audio_seconds = sum(chunk[1] for chunk in self._chunks)
+            processing_seconds = sum(chunk[2] for chunk in self._chunks)
+        if audio_seconds <= 0:
+            return None
+        return processing_seconds / audio_seconds
+
+    def _expire(self, now):
+        while self._chunks and self._chunks[0][0] < now - self.window_seconds:
+            self._chunks.popleft()
+
+
+real_time_factor = RecentRealTimeFactor()
+
+
+def pending_seconds(clients):
+    """
+    Returns the seconds of audio submitted to or waiting for inference in
+    the given sessions: the chunks being processed and the pending ones.
+    """
+    total = 0.0
+    for client in clients:
+        samples = client.pending_samples
+        if getattr(client.buffering_strategy, "processing_flag", False):
+            samples += client.scratch_samples
+        total += samples / client.sampling_rate
+    return total
+
+
+class AdmissionController:
+    """
+    Decides whether a new session can be accepted.
+
+    A session is refused when any configured budget is exceeded: the number
+    of sessions (`max_sessions`), the recent real-time factor (`max_rtf`)
+    or the seconds of audio submitted to or waiting for inference
+    (`max_pending_seconds`). Refused clients are told to retry after
+    `retry_after_seconds`, so a load balancer can send them to another node
+    while the calls in progress keep their latency.
+
+    Attributes:
+        max_sessions (int): Maximum number of sessions, None for no limit.
+        max_rtf (float): Recent real-time factor above which sessions are
+                         refused, None for no limit.
+        max_pending_seconds (float): Audio waiting for inference above which
+                                     sessions are refused, None for no
+                                     limit.
+        retry_after_seconds (float): Retry hint given to refused clients.
+    """
+
+    def __init__(
+        self,
+        max_sessions=None,
+        max_rtf=None,
+        max_pending_seconds=None,
+        retry_after_seconds=5,
+        rtf=None,
+    ):
+        self.max_sessions = max_sessions
+        self.max_rtf = max_rtf
+        self.max_pending_seconds = max_pending_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.rtf = rtf if rtf is not None else real_time_factor
+
+    def capacity(self, clients):
+        """
+        Returns the current load of the server.
+
+        The spare sessions are a linear extrapolation of the recent
+        real-time factor up to `max_rtf`, or to DEFAULT_MAX_RTF without
+        that budget, capped by `max_sessions`. It is a rough estimate, None
+        when no chunk was processed recently and `max_sessions` is unset.
+
+        Returns:
+            dict: The "sessions", "pending_seconds", "real_time_factor" and
+                  "spare_sessions".
+        """
+        clients = list(clients)
+        sessions = len(clients)
+        rtf = self.rtf.value()
+        max_rtf = self.max_rtf if self.max_rtf is not None else DEFAULT_MAX_RTF
+        spare_sessions = None
+        if rtf is not None and rtf > 0 and sessions:
+            spare_sessions = int(sessions * max_rtf / rtf) - sessions
+        if self.max_sessions is not None:
+            remaining = self.max_sessions - sessions
+            if spare_sessions is None or remaining < spare_sessions:
+                spare_sessions = remaining
+        if spare_sessions is not None:
+            spare_sessions = max(spare_sessions, 0)
+        return {
+            "sessions": sessions,
+            "pending_seconds": pending_seconds(clients),
+            "real_time_factor": rtf,
+            "spare_sessions": spare_sessions,
+        }
+
+    def admit(self, clients):
+        """
+        Checks the budgets for a new session.
+
+        Returns:
+            str: Why the session is refused, or None to accept it.
+        """
+        reason = self.refusal_reason(self.capacity(clients))
+        metrics.admissions.inc("refused" if reason else "accepted")
+        return reason
+
+    def refusal_reason(self, load):
+        """
+        Returns the budget a new session would exceed with the given load,
+        as returned by `capacity`, or None.
+        """
+        reason = None
+        if (
+            self.max_sessions is not None
+            and load["sessions"] >= self.max_sessions
+        ):
+            reason = "sessions"
+        elif (
+            self.max_rtf is not None
+            and load["real_time_factor"] is not None
+            and load["real_time_factor"] > self.max_rtf
+        ):
+            reason = "real_time_factor"
+        elif (
+            self.max_pending_seconds is not None
+            and load["pending_seconds"] > self.max_pending_seconds
+        ):
+            reason = "pending_seconds"
+        return reason
+
+    def close_reason(self, reason):
+        """Returns the close reason of a refused session, as JSON."""
+        return json.dumps(
+            {
+                "error": "overloaded",
+                "budget": reason,
+                "retry_after": self.retry_after_seconds,
+            }
+        )
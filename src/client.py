@@ -1,8 +1,21 @@
 # isort: skip_file
 
+import asyncio
+import collections
+import logging
+
+import numpy as np
+
+from src import metrics
+from src.audio_codecs import create_audio_decoder
+from src.audio_ring_buffer import AudioRingBuffer
+from src.audio_utils import pcm_to_float32
 from src.buffering_strategy.buffering_strategy_factory import (
     BufferingStrategyFactory,
 )
+from src.language_lock import LanguageLock
+
+SAMPLE_DTYPES = {2: np.int16, 4: np.int32}
 
 
 class Client:
@@ -13,9 +26,25 @@ class Client:
     unique identifier, audio buffer, configuration, and a counter for processed
     audio files.
 
+    The audio received from the client is kept in a fixed-capacity
+    AudioRingBuffer addressed by sample position in the stream. It is split
+    into three consecutive regions: the scratch buffer (audio of the chunk
+    being processed, [scratch_start, scratch_end)), the pending chunks
+    waiting for it, and the buffer of newly received audio ([buffer_start,
+    audio.end)). Moving audio between regions only moves these positions,
+    and the `get_*_samples` methods return views without copying.
+
     Attributes:
         client_id (str): A unique identifier for the client.
-        buffer (bytearray): A buffer to store incoming audio data.
+        audio (AudioRingBuffer): The most recent `max_buffer_seconds` of
+                                 audio received from the client.
+        buffer (bytearray): A copy of the newly received audio, kept for
+                            compatibility, use `get_buffer_samples`.
+        scratch_buffer (bytearray): A copy of the audio accumulated for the
+                                    chunk that is currently being processed,
+                                    kept for compatibility, use
+                                    `get_scratch_samples`. Assigning it
+                                    replaces the audio of the client.
         config (dict): Configuration settings for the client, like chunk length
                        and offset.
         file_counter (int): Counter for the number of audio files processed.
@@ -23,12 +52,48 @@ class Client:
                              client.
         sampling_rate (int): The sampling rate of the audio data in Hz.
         samples_width (int): The width of each audio sample in bits.
+        inference_timings (dict): Queueing and compute times of the last VAD
+                                  and ASR calls, keyed by "vad" and "asr".
+        vad_state (dict): Per-session state of streaming VAD backends.
+        pending_chunks (collections.deque): [start, end) sample ranges of the
+                                            chunks waiting for the previous
+                                            one to be processed, see the
+                                            buffering strategy's overload
+                                            policy.
+        overflowed_samples (int): Samples overwritten in the ring buffer
+                                  before they were processed.
+        language_lock (LanguageLock): Locks the language detected in the
+                                      first chunks of the session, see the
+                                      "language_lock" config.
+        audio_decoder (AudioDecoder): Decoder of the audio format
+                                      negotiated in the config ("encoding",
+                                      "sampleRate" and "channels"), None
+                                      for mono linear16 audio at the server
+                                      rate.
+        speech_trim (SpeechTrim): Speech regions of the scratch buffer the
+                                  ASR transcribes, set by the buffering
+                                  strategy while the chunk is transcribed,
+                                  None to transcribe the whole scratch
+                                  buffer.
+        tasks (set): Running tasks of the session, see `create_task`.
     """
 
-    def __init__(self, client_id, sampling_rate, samples_width):
+    def __init__(
+        self, client_id, sampling_rate, samples_width, max_buffer_seconds=60
+    ):
         self.client_id = client_id
-        self.buffer = bytearray()
-        self.scratch_buffer = bytearray()
+        self.audio = AudioRingBuffer(
+            int(max_buffer_seconds * sampling_rate),
+            dtype=SAMPLE_DTYPES[samples_width],
+        )
+        self.buffer_start = 0
+        self.scratch_start = 0
+        self.scratch_end = 0
+        self.pending_chunks = collections.deque()
+        self.overflowed_samples = 0
+        self._partial_sample = b""
+        self._scratch_waveform = None
+        self._scratch_waveform_range = None
         self.config = {
             "language": None,
             "processing_strategy": "silence_at_end_of_chunk",
@@ -43,6 +108,12 @@ class Client:
         self.session_id = ""
         self.sampling_rate = sampling_rate
         self.samples_width = samples_width
+        self.inference_timings = {}
+        self.vad_state = {}
+        self.audio_decoder = None
+        self.speech_trim = None
+        self.tasks = set()
+        self.language_lock = LanguageLock()
         self.buffering_strategy = (
             BufferingStrategyFactory.create_buffering_strategy(
                 self.config["processing_strategy"],
@@ -59,6 +130,14 @@ class Client:
                 self.session_id = config_data["CallSessionId"]
             except Exception as e:
                 print("callcli and callsessionId not there")
+            self.audio_decoder = create_audio_decoder(
+                self.config, self.sampling_rate
+            )
+            lock_args = self.config.get("language_lock", {})
+            if not isinstance(lock_args, dict):
+                # "language_lock": false disables locking
+                lock_args = {} if lock_args else {"confirmations": 0}
+            self.language_lock = LanguageLock(**lock_args)
             self.buffering_strategy = (
                 BufferingStrategyFactory.create_buffering_strategy(
                     self.config["processing_strategy"],
@@ -67,12 +146,237 @@ class Client:
                 )
             )
 
+    def get_language(self):
+        """
+        Returns the language to transcribe the next chunk with: the
+        configured language, or the locked one when the client asked for
+        detection.
+        """
+        return self.language_lock.language(self.config["language"])
+
+    def observe_transcription(self, transcription):
+        """
+        Updates the language lock with the transcription of the last chunk
+        and reports the lock in the transcription.
+        """
+        self.language_lock.observe(transcription, self.get_language())
+        transcription["language_locked"] = (
+            self.language_lock.locked_language is not None
+        )
+
+    def create_task(self, coroutine):
+        """
+        Runs a coroutine of the session, like the processing of a chunk, in
+        a task cancelled by `cancel_tasks` when the session ends.
+        """
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def cancel_tasks(self):
+        """
+        Drops the work of a session that ended: the pending chunks are
+        forgotten and the running tasks cancelled, which takes their
+        inference requests out of the shared queues. Returns once the tasks
+        are done.
+        """
+        if self.pending_chunks:
+            metrics.cancelled_chunks.inc(
+                "pending", amount=len(self.pending_chunks)
+            )
+            self.pending_chunks.clear()
+        if getattr(self.buffering_strategy, "processing_flag", False):
+            metrics.cancelled_chunks.inc("processing")
+
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            logging.info(
+                f"Cancelled {len(tasks)} tasks of client {self.client_id}"
+            )
+
+    @property
+    def buffered_samples(self):
+        """Number of received samples not yet handed to the strategy."""
+        return self.audio.end - self.buffer_start
+
+    @property
+    def scratch_samples(self):
+        return self.scratch_end - self.scratch_start
+
+    @property
+    def pending_samples(self):
+        return sum(end - start for start, end in self.pending_chunks)
+
+    def get_samples(self, start, end):
+        """
+        Returns a view of the samples in [start, end) of the stream.
+
+        The view shares memory with the ring buffer, copy it if it has to
+        outlive `max_buffer_seconds` of incoming audio.
+        """
+        return self.audio.view(start, end)
+
+    def get_buffer_samples(self):
+        return self.audio.view(self.buffer_start, self.audio.end)
+
+    def get_scratch_samples(self):
+        return self.audio.view(self.scratch_start, self.scratch_end)
+
+    # The byte buffers are copies, changing them leaves the client audio
+    # untouched: use clear_buffer / clear_scratch_buffer or the setter.
+    @property
+    def buffer(self):
+        return bytearray(self.get_buffer_samples().tobytes())
+
+    @property
+    def scratch_buffer(self):
+        return bytearray(self.get_scratch_samples().tobytes())
+
+    @scratch_buffer.setter
+    def scratch_buffer(self, audio_data):
+        # Feeds a pipeline directly with the given audio, everything the
+        # client had buffered is forgotten.
+        self.pending_chunks.clear()
+        self._partial_sample = b""
+        self.audio.reset(self.audio.end)
+        self.buffer_start = self.audio.end
+        self.append_audio_data(audio_data)
+        self.scratch_start = self.audio.start
+        self.scratch_end = self.buffer_start = self.audio.end
+
+    def clear_scratch_buffer(self):
+        self.scratch_start = self.scratch_end
+
+    def trim_scratch_buffer(self, position):
+        """
+        Drops the scratch samples before stream position `position`, the
+        rest of the scratch buffer stays in place.
+        """
+        self.scratch_start = min(
+            max(self.scratch_start, position), self.scratch_end
+        )
+
+    def get_scratch_waveform(self):
+        """
+        Returns the scratch buffer as a float32 numpy waveform.
+
+        The conversion is done once per chunk and shared by the VAD and ASR
+        pipelines, so no audio has to be written to disk. The waveform is a
+        copy, it stays valid while the ring buffer moves on.
+        """
+        scratch_range = (self.scratch_start, self.scratch_end)
+        if self._scratch_waveform_range != scratch_range:
+            self._scratch_waveform = pcm_to_float32(
+                self.get_scratch_samples(), self.samples_width
+            )
+            self._scratch_waveform_range = scratch_range
+        return self._scratch_waveform
+
+    def get_asr_waveform(self):
+        """
+        Returns the waveform the ASR pipelines transcribe: the scratch
+        waveform, cut down to its speech regions while `speech_trim` is set.
+        """
+        waveform = self.get_scratch_waveform()
+        if self.speech_trim is None:
+            return waveform
+        return self.speech_trim.apply(waveform)
+
+    def get_scratch_start_sample(self):
+        """
+        Returns the position of the first scratch buffer sample in the stream
+        of samples received from this client.
+        """
+        return self.scratch_start
+
     def append_audio_data(self, audio_data):
-        self.buffer.extend(audio_data)
-        self.total_samples += len(audio_data) / self.samples_width
+        if self.audio_decoder is not None:
+            samples = self.audio_decoder.decode(audio_data)
+            if self.samples_width != 2:
+                samples = samples.astype(self.audio.dtype) << 16
+        else:
+            audio_data = self._partial_sample + bytes(audio_data)
+            usable = len(audio_data) - len(audio_data) % self.samples_width
+            self._partial_sample = audio_data[usable:]
+
+            samples = np.frombuffer(
+                audio_data,
+                dtype=self.audio.dtype,
+                count=usable // self.samples_width,
+            )
+        self._make_room(len(samples))
+        self.audio.write(samples)
+        self.total_samples += len(samples)
+
+    def _make_room(self, count):
+        """
+        Gives up the oldest unprocessed audio if writing `count` samples
+        would overwrite it. The buffering strategies are expected to process
+        the audio long before this happens.
+        """
+        oldest_kept = self.audio.end + count - self.audio.capacity
+        lost = max(
+            0,
+            min(self.scratch_end, oldest_kept)
+            - min(self.scratch_start, oldest_kept),
+        )
+        self.scratch_start = max(self.scratch_start, oldest_kept)
+        self.scratch_end = max(self.scratch_end, self.scratch_start)
+
+        for chunk in list(self.pending_chunks):
+            lost += max(0, min(chunk[1], oldest_kept) - chunk[0])
+            chunk[0] = max(chunk[0], oldest_kept)
+            if chunk[0] >= chunk[1]:
+                self.pending_chunks.remove(chunk)
+
+        lost += max(0, oldest_kept - self.buffer_start)
+        self.buffer_start = max(self.buffer_start, oldest_kept)
+
+        if lost > 0:
+            self.overflowed_samples += lost
+            logging.warning(
+                f"Client {self.client_id}: {lost} unprocessed samples "
+                "overwritten in the audio ring buffer"
+            )
+
+    def _extend_scratch(self, start, end):
+        if self.scratch_end != start and self.scratch_samples > 0:
+            # The audio in between was dropped, the scratch buffer cannot
+            # continue across the gap.
+            logging.warning(
+                f"Client {self.client_id}: discarding "
+                f"{self.scratch_samples} scratch samples before a gap"
+            )
+        if self.scratch_end != start or self.scratch_samples == 0:
+            self.scratch_start = start
+        self.scratch_end = end
+
+    def move_buffer_to_scratch(self):
+        self._extend_scratch(self.buffer_start, self.audio.end)
+        self.buffer_start = self.audio.end
+
+    def move_buffer_to_pending(self):
+        self.pending_chunks.append([self.buffer_start, self.audio.end])
+        self.buffer_start = self.audio.end
+
+    def merge_buffer_into_pending(self):
+        """Appends the buffer to the last pending chunk."""
+        self.pending_chunks[-1][1] = self.audio.end
+        self.buffer_start = self.audio.end
+
+    def move_pending_to_scratch(self):
+        start, end = self.pending_chunks.popleft()
+        self._extend_scratch(start, end)
+
+    def drop_oldest_pending(self):
+        self.pending_chunks.popleft()
 
     def clear_buffer(self):
-        self.buffer.clear()
+        self.buffer_start = self.audio.end
 
     def increment_file_counter(self):
         self.file_counter += 1
@@ -80,7 +384,18 @@ class Client:
     def get_file_name(self):
         return f"{self.client_id}_{self.file_counter}.wav"
 
-    def process_audio(self, websocket, vad_pipeline, asr_pipeline):
+    def process_audio(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        fallback_asr_pipeline=None,
+    ):
         self.buffering_strategy.process_audio(
-            websocket, vad_pipeline, asr_pipeline , sessionId=self.session_id,callId=self.call_id
+            websocket,
+            vad_pipeline,
+            asr_pipeline,
+            sessionId=self.session_id,
+            callId=self.call_id,
+            fallback_asr_pipeline=fallback_asr_pipeline,
         )
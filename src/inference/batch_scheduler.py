@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import logging
+import time
+
+from src import metrics
+from src.asr.asr_interface import ASRInterface
+
+_Request = collections.namedtuple(
+    "_Request",
+    [
+        "waveform",
+        "sampling_rate",
+        "language",
+        "future",
+        "queued_at",
+        "on_segment",
+    ],
+)
+
+
+class ASRBatchScheduler(ASRInterface):
+    """
+    Collects ready chunks from many clients into batched ASR calls.
+
+    Every `transcribe` call enqueues the client's scratch waveform and waits
+    on its own future. A dispatcher task starts a batch as soon as
+    `max_batch_size` requests are waiting or the oldest request has waited
+    `max_wait_seconds`, and runs it with `transcribe_batch_sync` on the
+    InferenceExecutor. Up to `executor.max_workers` batches run at the same
+    time. Results are resolved back to each caller, so every transcription
+    goes out on the websocket of the session it came from.
+
+    Batches holding a `transcribe_streaming` request run with
+    `transcribe_batch_streaming_sync`, and every segment is handed to the
+    request it belongs to as soon as it is decoded.
+
+    A cancelled `transcribe` call leaves the queue at once, a running batch
+    still computes its transcription, counted as wasted work.
+
+    The queueing time of a request covers both the wait for its batch to
+    be formed and the wait for a free worker. It is stored with the compute
+    time and the batch size in `client.inference_timings["asr"]`.
+
+    Attributes:
+        executor (InferenceExecutor): Runs the batched ASR calls.
+        max_batch_size (int): Maximum number of chunks in one batch.
+        max_wait_seconds (float): Maximum time a chunk waits for its batch
+                                  to fill up.
+    """
+
+    def __init__(self, executor, max_batch_size=8, max_wait_seconds=0.05):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue = collections.deque()
+        self._queue_changed = None
+        self._dispatcher = None
+        self._workers = None
+        self._running_batches = set()
+
+    @property
+    def pending(self):
+        """Number of chunks waiting for a batch or being transcribed."""
+        return len(self._queue) + self.executor.pending
+
+    async def transcribe(self, client):
+        transcription, timings = await self.submit(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+    async def transcribe_streaming(self, client, on_segment):
+        transcription, timings = await self.submit_streaming(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+            on_segment,
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+    async def submit(self, waveform, sampling_rate, language):
+        """
+        Queues a waveform that does not come from a Client for the next
+        batch.
+
+        Returns:
+            tuple: The transcription and the timings of the request.
+        """
+        return await self.submit_streaming(
+            waveform, sampling_rate, language, None
+        )
+
+    async def submit_streaming(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        """
+        Queues a waveform that does not come from a Client for the next
+        batch, `on_segment` is called on the event loop with every segment
+        decoded for it (None to only wait for the transcription).
+
+        Returns:
+            tuple: The transcription and the timings of the request.
+        """
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        request = _Request(
+            waveform, sampling_rate, language, future, time.time(), on_segment
+        )
+        self._queue.append(request)
+        self._queue_changed.set()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Cancelled callers leave the queue before reaching the model
+            for index, queued in enumerate(self._queue):
+                if queued is request:
+                    del self._queue[index]
+                    metrics.cancelled_inference.inc(
+                        self.executor.role, "queued"
+                    )
+                    break
+            raise
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue_changed = asyncio.Event()
+            self._workers = asyncio.Semaphore(self.executor.max_workers)
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            if not self._queue:
+                self._queue_changed.clear()
+                await self._queue_changed.wait()
+                continue
+
+            deadline = self._queue[0].queued_at + self.max_wait_seconds
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._queue_changed.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._queue_changed.wait(), remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            await self._workers.acquire()
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                request = self._queue.popleft()
+                # Callers that went away do not need a transcription
+                if not request.future.done():
+                    batch.append(request)
+            if batch:
+                task = asyncio.create_task(self._run_batch(batch))
+                self._running_batches.add(task)
+                task.add_done_callback(self._running_batches.discard)
+            else:
+                self._workers.release()
+
+    async def _run_batch(self, batch):
+        arguments = (
+            [request.waveform for request in batch],
+            [request.sampling_rate for request in batch],
+            [request.language for request in batch],
+        )
+        try:
+            submitted_at = time.time()
+            if any(request.on_segment is not None for request in batch):
+
+                def on_segment(index, segment):
+                    request = batch[index]
+                    if (
+                        request.on_segment is not None
+                        and not request.future.done()
+                    ):
+                        request.on_segment(segment)
+
+                transcriptions, timings = await self.executor.run(
+                    "transcribe_batch_streaming_sync",
+                    *arguments,
+                    on_segment=on_segment,
+                )
+            else:
+                transcriptions, timings = await self.executor.run(
+                    "transcribe_batch_sync", *arguments
+                )
+        except Exception as e:
+            logging.exception("Batched transcription failed")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self._workers.release()
+
+        logging.debug(
+            f"Transcribed a batch of {len(batch)} chunks in "
+            f"{timings['compute_time']:.3f}s"
+        )
+        for request, transcription in zip(batch, transcriptions):
+            if request.future.done():
+                # The caller went away while its batch was running
+                metrics.cancelled_inference.inc(self.executor.role, "running")
+                metrics.wasted_inference_seconds.inc(
+                    self.executor.role,
+                    amount=timings["compute_time"] / len(batch),
+                )
+                continue
+            request.future.set_result(
+                (
+                    transcription,
+                    {
+                        "queue_time": submitted_at
+                        - request.queued_at
+                        + timings["queue_time"],
+                        "compute_time": timings["compute_time"],
+                        "batch_size": len(batch),
+                    },
+                )
+            )
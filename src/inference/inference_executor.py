@@ -0,0 +1,377 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src import metrics
+from src.asr.asr_interface import ASRInterface
+from src.vad.vad_interface import VADInterface
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+# Pipeline owned by a process pool worker, built once by _init_worker.
+_worker_pipeline = None
+# Queue of the segments streamed back to the parent process.
+_worker_segments = None
+
+
+def _init_worker(role, pipeline_type, pipeline_args, segments=None):
+    global _worker_pipeline, _worker_segments
+
+    _worker_segments = segments
+
+    if role == "vad":
+        from src.vad.vad_factory import VADFactory
+
+        _worker_pipeline = VADFactory.create_vad_pipeline(
+            pipeline_type, **pipeline_args
+        )
+    else:
+        from src.asr.asr_factory import ASRFactory
+
+        _worker_pipeline = ASRFactory.create_asr_pipeline(
+            pipeline_type, **pipeline_args
+        )
+
+
+def _timed_call(pipeline, method, args, submitted_at):
+    started_at = time.time()
+    result = getattr(pipeline, method)(*args)
+    finished_at = time.time()
+    return result, {
+        "queue_time": started_at - submitted_at,
+        "compute_time": finished_at - started_at,
+    }
+
+
+def _process_worker_call(method, args, submitted_at, stream_id=None):
+    if stream_id is None:
+        return _timed_call(_worker_pipeline, method, args, submitted_at)
+
+    def on_segment(*values):
+        _worker_segments.put((stream_id, values))
+
+    try:
+        return _timed_call(
+            _worker_pipeline, method, args + (on_segment,), submitted_at
+        )
+    finally:
+        # Every segment of the call is queued before this marker
+        _worker_segments.put((stream_id, None))
+
+
+class InferenceExecutor:
+    """
+    Runs the blocking calls of a VAD or ASR pipeline away from the event loop.
+
+    Three kinds of execution are supported:
+
+    - "inline": the call runs directly on the event loop thread (the
+      historical behaviour, mostly useful for debugging).
+    - "thread": the call runs in a thread pool sharing the `pipeline`
+      instance. pyannote, CTranslate2 and torch release the GIL while
+      computing, so the event loop keeps serving websockets.
+    - "process": every worker process builds its own pipeline from
+      `pipeline_type` and `pipeline_args` through the factories.
+
+    Every call reports how long it waited for a free worker ("queue_time")
+    separately from how long the model actually ran ("compute_time").
+
+    Calls given an `on_segment` callback stream partial results back to the
+    event loop while they run. Process workers send them over a queue,
+    read by a thread of the parent process.
+
+    Cancelling a call that still waits for a worker removes it from the
+    pool queue, a call already running completes and its compute time is
+    counted as wasted.
+
+    Attributes:
+        role (str): Either "vad" or "asr".
+        kind (str): One of "inline", "thread" or "process".
+        max_workers (int): Number of threads or processes in the pool.
+        pending (int): Number of calls submitted and not yet finished.
+    """
+
+    def __init__(
+        self,
+        role,
+        kind="thread",
+        max_workers=1,
+        pipeline=None,
+        pipeline_type=None,
+        pipeline_args=None,
+    ):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown inference executor kind: {kind}")
+        if kind == "process" and pipeline_type is None:
+            raise ValueError(
+                "A process executor needs 'pipeline_type' to build the "
+                "pipeline inside its workers"
+            )
+        if kind != "process" and pipeline is None:
+            raise ValueError(f"A {kind} executor needs a 'pipeline' instance")
+
+        self.role = role
+        self.kind = kind
+        self.max_workers = max_workers
+        self.pipeline = pipeline
+        self.pending = 0
+
+        if kind == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"{role}-infer"
+            )
+        elif kind == "process":
+            # CUDA cannot be re-initialised in a forked child, always spawn.
+            context = multiprocessing.get_context("spawn")
+            self._segments = context.Queue()
+            self._streams = {}
+            self._stream_ids = itertools.count()
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    role,
+                    pipeline_type,
+                    pipeline_args or {},
+                    self._segments,
+                ),
+            )
+            threading.Thread(
+                target=self._read_segments,
+                name=f"{role}-segments",
+                daemon=True,
+            ).start()
+        else:
+            self._pool = None
+
+    async def run(self, method, *args, on_segment=None):
+        """
+        Calls `method` of the pipeline with `args` on the configured workers.
+
+        Args:
+            method (str): Name of the blocking pipeline method to call.
+            *args: Positional arguments, they must be picklable for the
+                   "process" kind.
+            on_segment: Called on the event loop with the arguments of
+                        every call the pipeline method makes to the
+                        callback given as its last argument, all before the
+                        call returns. None for methods without callback.
+
+        Returns:
+            tuple: The result of the call and a dict with the "queue_time"
+                   and "compute_time" in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        stream_id = None
+        self.pending += 1
+        try:
+            if self.kind == "inline":
+                if on_segment is not None:
+                    args += (on_segment,)
+                result, timings = _timed_call(
+                    self.pipeline, method, args, submitted_at
+                )
+            else:
+                if self.kind == "thread":
+                    if on_segment is not None:
+                        args += (
+                            lambda *values: loop.call_soon_threadsafe(
+                                on_segment, *values
+                            ),
+                        )
+                    call = self._pool.submit(
+                        _timed_call, self.pipeline, method, args, submitted_at
+                    )
+                else:
+                    if on_segment is not None:
+                        stream_id = next(self._stream_ids)
+                        stream_done = loop.create_future()
+                        self._streams[stream_id] = (
+                            loop,
+                            on_segment,
+                            stream_done,
+                        )
+                    call = self._pool.submit(
+                        _process_worker_call,
+                        method,
+                        args,
+                        submitted_at,
+                        stream_id,
+                    )
+                try:
+                    result, timings = await asyncio.wrap_future(call)
+                    if stream_id is not None:
+                        await stream_done
+                except asyncio.CancelledError:
+                    self._abandon(call)
+                    raise
+        finally:
+            self.pending -= 1
+            if stream_id is not None:
+                self._streams.pop(stream_id, None)
+
+        logging.debug(
+            f"{self.role} {method}: queued {timings['queue_time']:.3f}s, "
+            f"computed {timings['compute_time']:.3f}s"
+        )
+        return result, timings
+
+    def _abandon(self, call):
+        """
+        Accounts for a call its caller gave up on. Cancelling the caller
+        also cancels the call while it waits for a worker, a running call
+        cannot be stopped and its compute time is wasted.
+        """
+        if call.cancelled():
+            metrics.cancelled_inference.inc(self.role, "queued")
+            return
+        metrics.cancelled_inference.inc(self.role, "running")
+
+        def count_wasted(call):
+            if not call.cancelled() and call.exception() is None:
+                metrics.wasted_inference_seconds.inc(
+                    self.role, amount=call.result()[1]["compute_time"]
+                )
+
+        call.add_done_callback(count_wasted)
+
+    def _read_segments(self):
+        while True:
+            stream_id, values = self._segments.get()
+            if stream_id is None:
+                return
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                # The caller went away
+                continue
+            loop, on_segment, stream_done = stream
+            if values is None:
+                loop.call_soon_threadsafe(_set_done, stream_done)
+            else:
+                loop.call_soon_threadsafe(on_segment, *values)
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+        if self.kind == "process":
+            self._segments.put((None, None))
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ExecutorVAD(VADInterface):
+    """
+    VADInterface that runs `detect_activity_incremental_sync` on an
+    InferenceExecutor.
+
+    The per-session VAD state travels with the call, so streaming VAD also
+    works with a process pool.
+
+    The queueing and compute times of the last call are stored in
+    `client.inference_timings["vad"]`.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def detect_activity(self, client):
+        (vad_segments, client.vad_state), timings = await self.submit(
+            client.get_scratch_waveform(),
+            client.sampling_rate,
+            client.get_scratch_start_sample(),
+            client.vad_state,
+        )
+        client.inference_timings["vad"] = timings
+        return vad_segments
+
+    async def submit(self, waveform, sampling_rate, stream_offset, state):
+        """
+        Runs VAD on a waveform that does not come from a Client.
+
+        Returns:
+            tuple: The VAD segments and state, and the timings of the call.
+        """
+        return await self.executor.run(
+            "detect_activity_incremental_sync",
+            waveform,
+            sampling_rate,
+            stream_offset,
+            state,
+        )
+
+
+class ExecutorASR(ASRInterface):
+    """
+    ASRInterface that runs `transcribe_sync` on an InferenceExecutor.
+
+    `transcribe_streaming` runs `transcribe_streaming_sync` and hands every
+    segment over to the event loop as soon as the worker decodes it, with
+    every kind of executor.
+
+    The queueing and compute times of the last call are stored in
+    `client.inference_timings["asr"]`.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    @property
+    def pending(self):
+        return self.executor.pending
+
+    async def transcribe(self, client):
+        transcription, timings = await self.submit(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+    async def transcribe_streaming(self, client, on_segment):
+        transcription, timings = await self.submit_streaming(
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+            on_segment,
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+    async def submit(self, waveform, sampling_rate, language):
+        """
+        Transcribes a waveform that does not come from a Client.
+
+        Returns:
+            tuple: The transcription and the timings of the call.
+        """
+        return await self.executor.run(
+            "transcribe_sync", waveform, sampling_rate, language
+        )
+
+    async def submit_streaming(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        """
+        Transcribes a waveform that does not come from a Client, calling
+        `on_segment` on the event loop with every decoded segment.
+
+        Returns:
+            tuple: The transcription and the timings of the call.
+        """
+        return await self.executor.run(
+            "transcribe_streaming_sync",
+            waveform,
+            sampling_rate,
+            language,
+            on_segment=on_segment,
+        )
@@ -0,0 +1,465 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.asr.asr_interface import ASRInterface
+from src.vad.vad_interface import VADInterface
+
+# Audio slots of a front-end worker, 16 s of 16 kHz audio each by default.
+# Longer chunks, or chunks sent while every slot is busy, go through the
+# pipe instead.
+DEFAULT_SLOTS = 64
+DEFAULT_SLOT_SAMPLES = 16 * 16000
+
+
+class SharedAudioArena:
+    """
+    Fixed-size float32 audio slots in a multiprocessing.shared_memory block.
+
+    The inference process creates one arena per front-end worker and owns
+    it, the worker attaches to it by name. The worker writes the waveform of
+    a request into a free slot and only sends the slot number over the
+    pipe, the inference process reads the audio in place.
+
+    Attributes:
+        name (str): Name of the shared memory block.
+        slots (int): Number of slots.
+        slot_samples (int): Capacity of a slot in samples.
+    """
+
+    def __init__(
+        self,
+        name=None,
+        slots=DEFAULT_SLOTS,
+        slot_samples=DEFAULT_SLOT_SAMPLES,
+    ):
+        self.slots = slots
+        self.slot_samples = slot_samples
+        self._shm = shared_memory.SharedMemory(
+            name=name,
+            create=name is None,
+            size=slots * slot_samples * 4,
+        )
+        self.name = self._shm.name
+        self._owner = name is None
+        self._array = np.ndarray(
+            slots * slot_samples, dtype=np.float32, buffer=self._shm.buf
+        )
+        self._free = list(range(slots - 1, -1, -1))
+
+    def put(self, waveform):
+        """
+        Copies a waveform into a free slot.
+
+        Returns:
+            tuple: The reference to send to the inference process, and the
+                   slot to `free` once it answered (None when the waveform
+                   did not fit and is sent inline).
+        """
+        if len(waveform) > self.slot_samples or not self._free:
+            return ("inline", np.ascontiguousarray(waveform)), None
+        slot = self._free.pop()
+        start = slot * self.slot_samples
+        self._array[start : start + len(waveform)] = waveform  # noqa: E203
+        return ("shm", slot, len(waveform)), slot
+
+    def get(self, reference):
+        """Returns the waveform of a reference, without copying it."""
+        if reference[0] == "inline":
+            return reference[1]
+        _, slot, length = reference
+        start = slot * self.slot_samples
+        return self._array[start : start + length]  # noqa: E203
+
+    def free(self, slot):
+        if slot is not None:
+            self._free.append(slot)
+
+    def close(self):
+        self._array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class InferenceService:
+    """
+    Serves the VAD and ASR pipelines of this process to front-end workers.
+
+    Every front-end worker is connected by a multiprocessing pipe, and has
+    its own SharedAudioArena for the audio. Requests are run concurrently
+    with the `submit` coroutine of the pipelines (ExecutorVAD, ExecutorASR
+    or ASRBatchScheduler), so requests of all the workers share the
+    inference workers and the ASR batches.
+
+    Requests are (request id, method, audio reference, args) tuples, with
+    the method "vad", "asr" or "fallback_asr", and answers are (request id,
+    ok, result, timings) tuples. The methods "asr_streaming" and
+    "fallback_asr_streaming" also send a (request id, None, segment, None)
+    message for every segment decoded before the answer. A request with the
+    method "cancel" cancels
+    the request with the same id, which is then answered as failed so the
+    worker can free its audio slot.
+    """
+
+    def __init__(self, vad_pipeline, asr_pipeline, fallback_asr_pipeline=None):
+        self.pipelines = {
+            "vad": vad_pipeline,
+            "asr": asr_pipeline,
+            "fallback_asr": fallback_asr_pipeline,
+        }
+        self._connections = {}
+        # (connection fileno, request id) -> task of the request
+        self._tasks = {}
+
+    def add_worker(self, connection, arena):
+        """Starts serving the requests of a front-end worker."""
+        loop = asyncio.get_running_loop()
+        self._connections[connection.fileno()] = (connection, arena)
+        loop.add_reader(connection.fileno(), self._on_readable, connection)
+
+    def _on_readable(self, connection):
+        try:
+            while connection.poll():
+                request = connection.recv()
+                key = (connection.fileno(), request[0])
+                if request[1] == "cancel":
+                    task = self._tasks.get(key)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self._handle(connection, request))
+                self._tasks[key] = task
+                task.add_done_callback(
+                    lambda _, key=key: self._tasks.pop(key, None)
+                )
+        except (EOFError, OSError):
+            logging.warning("A front-end worker disconnected")
+            asyncio.get_running_loop().remove_reader(connection.fileno())
+            self._connections.pop(connection.fileno(), None)
+
+    async def _handle(self, connection, request):
+        request_id, method, reference, args = request
+        _, arena = self._connections[connection.fileno()]
+        streaming = method.endswith("_streaming")
+
+        def on_segment(segment):
+            try:
+                connection.send((request_id, None, segment, None))
+            except (BrokenPipeError, OSError):
+                logging.warning("Could not stream to a front-end worker")
+
+        try:
+            pipeline = self.pipelines[method.removesuffix("_streaming")]
+            if pipeline is None:
+                raise ValueError(f"No {method} pipeline in this process")
+            if streaming:
+                result, timings = await pipeline.submit_streaming(
+                    arena.get(reference), *args, on_segment
+                )
+            else:
+                result, timings = await pipeline.submit(
+                    arena.get(reference), *args
+                )
+            answer = (request_id, True, result, timings)
+        except asyncio.CancelledError:
+            answer = (request_id, False, "cancelled", None)
+        except Exception as e:
+            logging.exception(f"Remote {method} request failed")
+            answer = (request_id, False, repr(e), None)
+        try:
+            connection.send(answer)
+        except (BrokenPipeError, OSError):
+            logging.warning("Could not answer a front-end worker")
+
+
+class InferenceClient:
+    """
+    Sends the inference requests of a front-end worker to the
+    InferenceService, see RemoteVAD and RemoteASR.
+
+    A slot of the arena stays reserved until the service answered, even if
+    the caller gave up on the request, so the audio is never overwritten
+    while it is being processed. Cancelled callers tell the service to drop
+    their request, or free its slot themselves when the request was still
+    waiting to be sent.
+
+    Requests are written to the pipe by a single sender thread, in order:
+    audio that does not fit in a slot goes through the pipe and would block
+    the event loop while the service drains it.
+    """
+
+    def __init__(self, connection, arena):
+        self.connection = connection
+        self.arena = arena
+        self._ids = itertools.count()
+        self._pending = {}
+        self._sender = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="inference-send"
+        )
+
+    @property
+    def pending(self):
+        """Number of requests waiting for an answer."""
+        return len(self._pending)
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(
+            self.connection.fileno(), self._on_readable
+        )
+
+    def _on_readable(self):
+        try:
+            while self.connection.poll():
+                request_id, ok, result, timings = self.connection.recv()
+                if ok is None:
+                    # A segment streamed before the answer
+                    on_segment = self._pending[request_id][2]
+                    if on_segment is not None:
+                        on_segment(result)
+                    continue
+                future, slot, _ = self._pending.pop(request_id)
+                self.arena.free(slot)
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result((result, timings))
+                else:
+                    future.set_exception(
+                        RuntimeError(f"Remote inference failed: {result}")
+                    )
+        except (EOFError, OSError):
+            logging.error("Lost the connection to the inference process")
+            asyncio.get_running_loop().remove_reader(self.connection.fileno())
+            for future, _, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("The inference process is gone")
+                    )
+            self._pending.clear()
+
+    async def call(self, method, waveform, *args, on_segment=None):
+        """
+        Runs `method` on the waveform in the inference process.
+
+        Args:
+            on_segment: Called on the event loop with every segment the
+                        "_streaming" methods send before the answer.
+
+        Returns:
+            tuple: The result and the timings of the call.
+        """
+        reference, slot = self.arena.put(waveform)
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, slot, on_segment)
+        send = self._sender.submit(
+            self.connection.send, (request_id, method, reference, args)
+        )
+        try:
+            await asyncio.wrap_future(send)
+            return await future
+        except asyncio.CancelledError:
+            if send.cancel():
+                # Still queued, the service will never see the request
+                self._release(request_id)
+            elif request_id in self._pending:
+                # Queued after the request, so the service knows its id
+                self._sender.submit(
+                    self._send_cancel, (request_id, "cancel", None, ())
+                )
+            raise
+        except Exception:
+            # The send failed, or the answer did (already released then)
+            self._release(request_id)
+            raise
+
+    def _release(self, request_id):
+        entry = self._pending.pop(request_id, None)
+        if entry is not None:
+            self.arena.free(entry[1])
+
+    def _send_cancel(self, message):
+        try:
+            self.connection.send(message)
+        except (BrokenPipeError, OSError):
+            pass
+
+
+class RemoteVAD(VADInterface):
+    """VADInterface running the VAD of the inference process."""
+
+    def __init__(self, inference_client):
+        self.inference_client = inference_client
+
+    async def detect_activity(self, client):
+        (vad_segments, client.vad_state), timings = (
+            await self.inference_client.call(
+                "vad",
+                client.get_scratch_waveform(),
+                client.sampling_rate,
+                client.get_scratch_start_sample(),
+                client.vad_state,
+            )
+        )
+        client.inference_timings["vad"] = timings
+        return vad_segments
+
+
+class RemoteASR(ASRInterface):
+    """
+    ASRInterface running the ASR (or, with `method="fallback_asr"`, the
+    fallback ASR) of the inference process.
+    """
+
+    def __init__(self, inference_client, method="asr"):
+        self.inference_client = inference_client
+        self.method = method
+
+    @property
+    def pending(self):
+        return self.inference_client.pending
+
+    async def transcribe(self, client):
+        transcription, timings = await self.inference_client.call(
+            self.method,
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+    async def transcribe_streaming(self, client, on_segment):
+        transcription, timings = await self.inference_client.call(
+            f"{self.method}_streaming",
+            client.get_asr_waveform(),
+            client.sampling_rate,
+            client.get_language(),
+            on_segment=on_segment,
+        )
+        client.inference_timings["asr"] = timings
+        return transcription
+
+
+def run_front_end(
+    index,
+    connection,
+    arena_name,
+    arena_slots,
+    slot_samples,
+    server_args,
+    has_fallback=False,
+    asr_cache_args=None,
+    log_level="error",
+):
+    """
+    Entry point of a front-end worker process: serves websockets on the
+    shared port and sends all inference to the inference process.
+    """
+    from src.asr.cached_asr import CachedASR
+    from src.server import Server
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(log_level.upper())
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    arena = SharedAudioArena(arena_name, arena_slots, slot_samples)
+    inference_client = InferenceClient(connection, arena)
+    asr_pipeline = RemoteASR(inference_client)
+    if asr_cache_args is not None:
+        asr_cache_args = dict(asr_cache_args)
+        if asr_cache_args.get("path"):
+            # Every worker keeps its own cache file
+            asr_cache_args["path"] = f"{asr_cache_args['path']}.{index}"
+        asr_pipeline = CachedASR(asr_pipeline, **asr_cache_args)
+
+    server = Server(
+        RemoteVAD(inference_client),
+        asr_pipeline,
+        fallback_asr_pipeline=(
+            RemoteASR(inference_client, "fallback_asr")
+            if has_fallback
+            else None
+        ),
+        reuse_port=True,
+        **server_args,
+    )
+    # The inference process warmed the models up before starting us
+    server.ready = True
+
+    async def serve():
+        inference_client.start()
+        await server.start()
+
+    # The inference process terminates us on shutdown, stop the loop so
+    # the cache gets saved.
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    try:
+        loop.run_until_complete(serve())
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if isinstance(asr_pipeline, CachedASR):
+            asr_pipeline.close()
+        arena.close()
+
+
+def start_front_ends(
+    service,
+    workers,
+    server_args,
+    has_fallback=False,
+    asr_cache_args=None,
+    log_level="error",
+    arena_slots=DEFAULT_SLOTS,
+    slot_samples=DEFAULT_SLOT_SAMPLES,
+):
+    """
+    Spawns `workers` front-end processes connected to `service`. Must be
+    called from the event loop serving the requests.
+
+    Worker `i` exposes its metrics on `metrics_port + i`.
+
+    Returns:
+        list: The (process, arena) of every worker.
+    """
+    context = multiprocessing.get_context("spawn")
+    front_ends = []
+    for index in range(workers):
+        arena = SharedAudioArena(None, arena_slots, slot_samples)
+        service_end, worker_end = context.Pipe()
+        worker_args = dict(server_args)
+        if worker_args.get("metrics_port"):
+            worker_args["metrics_port"] += index
+
+        process = context.Process(
+            target=run_front_end,
+            name=f"front-end-{index}",
+            args=(
+                index,
+                worker_end,
+                arena.name,
+                arena_slots,
+                slot_samples,
+                worker_args,
+                has_fallback,
+                asr_cache_args,
+                log_level,
+            ),
+            daemon=True,
+        )
+        process.start()
+        worker_end.close()
+        service.add_worker(service_end, arena)
+        front_ends.append((process, arena))
+    return front_ends
@@ -0,0 +1,134 @@
+import contextlib
+import threading
+import time
+
+from src.asr.asr_interface import ASRInterface
+
+
+class ReplicaPool:
+    """
+    Holds N interchangeable model replicas and routes work between them.
+
+    Each call acquires the least-loaded replica that still has a free slot
+    (ties go to the replica that has been busy the least), and blocks until
+    one is free otherwise. The pool is thread-safe, so it is meant to be
+    driven from an InferenceExecutor with at least as many workers as there
+    are replicas.
+
+    Attributes:
+        replicas (list): The model instances.
+        max_inflight_per_replica (int): Number of concurrent calls a single
+                                        replica accepts.
+    """
+
+    def __init__(self, replicas, max_inflight_per_replica=1):
+        if not replicas:
+            raise ValueError("A replica pool needs at least one replica")
+        self.replicas = list(replicas)
+        self.max_inflight_per_replica = max_inflight_per_replica
+        self._condition = threading.Condition()
+        self._in_flight = [0] * len(self.replicas)
+        self._calls = [0] * len(self.replicas)
+        self._busy_seconds = [0.0] * len(self.replicas)
+        self._created_at = time.time()
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def _pick_replica(self):
+        candidates = [
+            index
+            for index, in_flight in enumerate(self._in_flight)
+            if in_flight < self.max_inflight_per_replica
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda index: (
+                self._in_flight[index],
+                self._busy_seconds[index],
+            ),
+        )
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """
+        Context manager lending the least-loaded idle replica to the caller.
+        """
+        with self._condition:
+            index = self._pick_replica()
+            while index is None:
+                self._condition.wait()
+                index = self._pick_replica()
+            self._in_flight[index] += 1
+            self._calls[index] += 1
+
+        started_at = time.time()
+        try:
+            yield self.replicas[index]
+        finally:
+            with self._condition:
+                self._in_flight[index] -= 1
+                self._busy_seconds[index] += time.time() - started_at
+                self._condition.notify()
+
+    def utilization(self):
+        """
+        Returns the load of every replica.
+
+        Returns:
+            list: One dict per replica with the calls "in_flight", the total
+                  number of "calls", the "busy_seconds" and the fraction of
+                  time the replica was busy since the pool was created.
+        """
+        with self._condition:
+            elapsed = max(time.time() - self._created_at, 1e-9)
+            return [
+                {
+                    "replica": index,
+                    "in_flight": self._in_flight[index],
+                    "calls": self._calls[index],
+                    "busy_seconds": self._busy_seconds[index],
+                    "utilization": self._busy_seconds[index] / elapsed,
+                }
+                for index in range(len(self.replicas))
+            ]
+
+
+class ReplicaPoolASR(ASRInterface):
+    """
+    ASRInterface that spreads transcriptions over a ReplicaPool of backends.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        with self.pool.acquire() as replica:
+            return replica.transcribe_sync(waveform, sampling_rate, language)
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        with self.pool.acquire() as replica:
+            return replica.transcribe_streaming_sync(
+                waveform, sampling_rate, language, on_segment
+            )
+
+    def transcribe_batch_sync(self, waveforms, sampling_rates, languages):
+        with self.pool.acquire() as replica:
+            return replica.transcribe_batch_sync(
+                waveforms, sampling_rates, languages
+            )
+
+    def transcribe_batch_streaming_sync(
+        self, waveforms, sampling_rates, languages, on_segment
+    ):
+        with self.pool.acquire() as replica:
+            return replica.transcribe_batch_streaming_sync(
+                waveforms, sampling_rates, languages, on_segment
+            )
+
+    def utilization(self):
+        return self.pool.utilization()
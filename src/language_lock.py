@@ -0,0 +1,102 @@
+from src import metrics
+
+# Configured languages asking for detection on every chunk
+DETECT_LANGUAGES = (None, "multilanguage")
+
+
+class LanguageLock:
+    """
+    Locks the language of a session once it was detected with confidence.
+
+    Without a configured language, Whisper runs language detection on every
+    chunk, an extra encoder pass, although a caller essentially never
+    switches language during a call. Once `confirmations` consecutive chunks
+    are detected as the same language with a probability of at least
+    `min_probability`, the following chunks are transcribed with that
+    language.
+
+    With `reverify_every`, every `reverify_every`-th chunk after locking is
+    detected again, and a confident detection of another language unlocks
+    the session. Only backends reporting "language" and
+    "language_probability" (faster-whisper) can lock a session.
+
+    Attributes:
+        min_probability (float): Detection probability counted as confident.
+        confirmations (int): Consecutive confident detections needed to lock,
+                             0 disables locking.
+        reverify_every (int): Chunks between two detections once locked, 0
+                              never detects again.
+        locked_language (str): The locked language, None until locked.
+        locked_chunks (int): Chunks transcribed since the language was
+                             locked.
+    """
+
+    def __init__(self, min_probability=0.8, confirmations=3, reverify_every=0):
+        self.min_probability = float(min_probability)
+        self.confirmations = int(confirmations)
+        self.reverify_every = int(reverify_every)
+        self.locked_language = None
+        self.locked_chunks = 0
+        self._candidate = None
+        self._streak = 0
+
+    def language(self, configured):
+        """
+        Returns the language to transcribe the next chunk with.
+
+        Args:
+            configured (str): The language configured by the client.
+        """
+        if configured not in DETECT_LANGUAGES or self.locked_language is None:
+            return configured
+        if (
+            self.reverify_every
+            and (self.locked_chunks + 1) % self.reverify_every == 0
+        ):
+            return configured
+        return self.locked_language
+
+    def observe(self, transcription, language):
+        """
+        Updates the lock with the transcription of a chunk.
+
+        Args:
+            transcription (dict): The transcription of the chunk.
+            language (str): The language the chunk was transcribed with, as
+                            returned by `language`.
+        """
+        if self.locked_language is not None:
+            self.locked_chunks += 1
+            if language == self.locked_language:
+                metrics.language_detections_skipped.inc()
+                return
+
+        detected = transcription.get("language")
+        probability = transcription.get("language_probability")
+        if language not in DETECT_LANGUAGES or detected is None:
+            return
+        confident = (
+            probability is not None and probability >= self.min_probability
+        )
+
+        if self.locked_language is not None:
+            if confident and detected != self.locked_language:
+                metrics.language_lock_events.inc("unlocked")
+                self.locked_language = None
+                self.locked_chunks = 0
+                self._candidate, self._streak = detected, 1
+            else:
+                metrics.language_lock_events.inc("verified")
+            return
+
+        if not confident:
+            self._candidate, self._streak = None, 0
+            return
+        if detected == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate, self._streak = detected, 1
+        if self.confirmations and self._streak >= self.confirmations:
+            self.locked_language = detected
+            self.locked_chunks = 0
+            metrics.language_lock_events.inc("locked")
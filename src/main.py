@@ -2,9 +2,17 @@ import argparse
 import asyncio
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from src.asr.asr_factory import ASRFactory
-from src.vad.vad_factory import VADFactory
+from src.asr.cached_asr import CachedASR
+from src.inference.inference_executor import (
+    EXECUTOR_KINDS,
+    ExecutorASR,
+    ExecutorVAD,
+)
+from src.inference.inference_service import InferenceService, start_front_ends
+from src.pipelines import create_asr_pipeline, create_executor
 
 from .server import Server
 
@@ -18,7 +26,8 @@ def parse_args():
         "--vad-type",
         type=str,
         default="pyannote",
-        help="Type of VAD pipeline to use (e.g., 'pyannote')",
+        help="Type of VAD pipeline to use (e.g., 'pyannote', 'energy' or "
+        "'cascade')",
     )
     parser.add_argument(
         "--vad-args",
@@ -30,7 +39,8 @@ def parse_args():
         "--asr-type",
         type=str,
         default="faster_whisper",
-        help="Type of ASR pipeline to use (e.g., 'whisper')",
+        help="Type of ASR pipeline to use (e.g., 'faster_whisper', "
+        "'whisper' or 'wav2vec2_hindi')",
     )
     parser.add_argument(
         "--asr-args",
@@ -38,6 +48,104 @@ def parse_args():
         default='{"model_size": "large-v3"}',
         help="JSON string of additional arguments for ASR pipeline",
     )
+    parser.add_argument(
+        "--fallback-asr-type",
+        type=str,
+        default=None,
+        help="Type of a cheaper ASR pipeline that sessions are downgraded "
+        "to when they use the 'downgrade' overload policy",
+    )
+    parser.add_argument(
+        "--fallback-asr-args",
+        type=str,
+        default="{}",
+        help="JSON string of additional arguments for the fallback ASR "
+        "pipeline",
+    )
+    parser.add_argument(
+        "--asr-cache-args",
+        type=str,
+        default=None,
+        help="JSON string of arguments of a cache reusing the "
+        'transcriptions of repeated audio (e.g. \'{"max_entries": 10000, '
+        '"path": "asr_cache.json"}\'), disabled by default',
+    )
+    parser.add_argument(
+        "--admission-args",
+        type=str,
+        default=None,
+        help="JSON string of the budgets over which new sessions are "
+        'refused with close code 1013 (e.g. \'{"max_sessions": 50, '
+        '"max_rtf": 0.8, "max_pending_seconds": 60, '
+        '"retry_after_seconds": 5}\'), disabled by default. With --workers, '
+        "every front-end applies the budgets to its own sessions",
+    )
+    parser.add_argument(
+        "--inference-executor",
+        type=str,
+        default="thread",
+        choices=EXECUTOR_KINDS,
+        help="Where VAD and ASR inference runs: 'inline' on the event loop, "
+        "a 'thread' pool or a 'process' pool. default: thread",
+    )
+    parser.add_argument(
+        "--vad-workers",
+        type=int,
+        default=1,
+        help="Number of inference workers for the VAD pipeline",
+    )
+    parser.add_argument(
+        "--asr-workers",
+        type=int,
+        default=1,
+        help="Number of inference workers for the ASR pipeline",
+    )
+    parser.add_argument(
+        "--asr-max-batch-size",
+        type=int,
+        default=1,
+        help="Maximum number of chunks from different clients transcribed "
+        "in one batched ASR call, 1 disables batching, ignored for backends "
+        "without batched inference. default: 1",
+    )
+    parser.add_argument(
+        "--asr-max-batch-wait-ms",
+        type=float,
+        default=50,
+        help="Maximum time in milliseconds a chunk waits for its ASR batch "
+        "to fill up. default: 50",
+    )
+    parser.add_argument(
+        "--max-buffer-seconds",
+        type=float,
+        default=60,
+        help="Seconds of audio kept in each client's preallocated ring "
+        "buffer, utterances are transcribed before they reach half of it. "
+        "default: 60",
+    )
+    parser.add_argument(
+        "--warmup-seconds",
+        type=float,
+        default=2,
+        help="Seconds of synthetic audio run through the VAD and ASR "
+        "pipelines before the port is opened, 0 disables the warm-up. "
+        "default: 2",
+    )
+    parser.add_argument(
+        "--warmup-passes",
+        type=int,
+        default=None,
+        help="Concurrent warm-up calls per pipeline. default: the number of "
+        "workers of the pipeline",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of websocket front-end processes sharing the port "
+        "(SO_REUSEPORT). With more than 1, this process only runs the "
+        "models and serves their inference to the front-ends. default: 1",
+    )
     parser.add_argument(
         "--host",
         type=str,
@@ -47,6 +155,13 @@ def parse_args():
     parser.add_argument(
         "--port", type=int, default=8765, help="Port for the WebSocket server"
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=8766,
+        help="Port of the Prometheus metrics endpoint (GET /metrics), 0 "
+        "disables it. default: 8766",
+    )
     parser.add_argument(
         "--certfile",
         type=str,
@@ -70,6 +185,15 @@ def parse_args():
     return parser.parse_args()
 
 
+def _timed(name, function, *args):
+    started_at = time.time()
+    result = function(*args)
+    logging.info(
+        f"Loaded the {name} pipeline in {time.time() - started_at:.2f}s"
+    )
+    return result
+
+
 def main():
     args = parse_args()
 
@@ -79,26 +203,140 @@ def main():
     try:
         vad_args = json.loads(args.vad_args)
         asr_args = json.loads(args.asr_args)
+        fallback_asr_args = json.loads(args.fallback_asr_args)
+        asr_cache_args = json.loads(args.asr_cache_args or "null")
+        admission_args = json.loads(args.admission_args or "null")
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON arguments: {e}")
         return
 
-    vad_pipeline = VADFactory.create_vad_pipeline(args.vad_type, **vad_args)
-    asr_pipeline = ASRFactory.create_asr_pipeline(args.asr_type, **asr_args)
+    if args.asr_workers < int(asr_args.get("replicas", 1)):
+        logging.warning(
+            "--asr-workers is lower than the number of ASR replicas, some "
+            "replicas will stay idle"
+        )
 
+    # Model loading is mostly I/O and native code, the pipelines load
+    # concurrently.
+    started_at = time.time()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        vad_future = pool.submit(
+            _timed,
+            "vad",
+            create_executor,
+            "vad",
+            args.inference_executor,
+            args.vad_workers,
+            args.vad_type,
+            vad_args,
+        )
+        asr_future = pool.submit(
+            _timed,
+            "asr",
+            create_executor,
+            "asr",
+            args.inference_executor,
+            args.asr_workers,
+            args.asr_type,
+            asr_args,
+        )
+        fallback_future = None
+        if args.fallback_asr_type:
+            fallback_future = pool.submit(
+                _timed,
+                "fallback asr",
+                create_executor,
+                "asr",
+                args.inference_executor,
+                1,
+                args.fallback_asr_type,
+                fallback_asr_args,
+            )
+        vad_executor = vad_future.result()
+        asr_executor = asr_future.result()
+        fallback_executor = fallback_future and fallback_future.result()
+    logging.info(f"Loaded the pipelines in {time.time() - started_at:.2f}s")
+
+    vad_pipeline = ExecutorVAD(vad_executor)
+    asr_pipeline = create_asr_pipeline(
+        asr_executor,
+        args.asr_type,
+        args.asr_max_batch_size,
+        args.asr_max_batch_wait_ms / 1000,
+    )
+    if asr_cache_args is not None and args.workers <= 1:
+        # Hits skip the executor queue and batching altogether
+        asr_pipeline = CachedASR(asr_pipeline, **asr_cache_args)
+
+    fallback_asr_pipeline = None
+    if fallback_executor is not None:
+        fallback_asr_pipeline = ExecutorASR(fallback_executor)
+
+    server_args = {
+        "host": args.host,
+        "port": args.port,
+        "sampling_rate": 16000,
+        "samples_width": 2,
+        "certfile": args.certfile,
+        "keyfile": args.keyfile,
+        "max_buffer_seconds": args.max_buffer_seconds,
+        "metrics_port": args.metrics_port,
+        "admission_args": admission_args,
+    }
     server = Server(
         vad_pipeline,
         asr_pipeline,
-        host=args.host,
-        port=args.port,
-        sampling_rate=16000,
-        samples_width=2,
-        certfile=args.certfile,
-        keyfile=args.keyfile,
+        fallback_asr_pipeline=fallback_asr_pipeline,
+        **server_args,
+    )
+
+    if args.workers <= 1:
+        # Load balancers see the server warming up on /ready
+        asyncio.get_event_loop().run_until_complete(server.start_metrics())
+
+    # The port only opens once the models are warm
+    started_at = time.time()
+    asyncio.get_event_loop().run_until_complete(
+        server.warm_up(
+            args.warmup_seconds,
+            args.warmup_passes or max(args.vad_workers, args.asr_workers),
+        )
     )
+    logging.info(f"Warmed up in {time.time() - started_at:.2f}s")
 
-    asyncio.get_event_loop().run_until_complete(server.start())
-    asyncio.get_event_loop().run_forever()
+    if args.workers <= 1:
+        asyncio.get_event_loop().run_until_complete(server.start())
+        try:
+            asyncio.get_event_loop().run_forever()
+        finally:
+            if isinstance(asr_pipeline, CachedASR):
+                asr_pipeline.close()
+        return
+
+    # This process keeps the models and runs the inference of the
+    # front-end processes, which handle the websockets.
+    service = InferenceService(
+        vad_pipeline, asr_pipeline, fallback_asr_pipeline
+    )
+
+    async def start_workers():
+        return start_front_ends(
+            service,
+            args.workers,
+            server_args,
+            has_fallback=fallback_asr_pipeline is not None,
+            asr_cache_args=asr_cache_args,
+            log_level=args.log_level,
+        )
+
+    front_ends = asyncio.get_event_loop().run_until_complete(start_workers())
+    try:
+        asyncio.get_event_loop().run_forever()
+    finally:
+        for process, arena in front_ends:
+            process.terminate()
+            process.join()
+            arena.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,451 @@
+"""
+Process-wide metrics of the server, exposed in the Prometheus text format.
+
+The metrics are module-level objects updated from the buffering strategies
+and the server. `start_metrics_server` serves them over HTTP on
+`GET /metrics`, next to other routes like the readiness endpoint of the
+server.
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + escaped + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class of the metrics.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The HELP text of the metric.
+        label_names (tuple): Names of the labels, values are passed in the
+                             same order.
+    """
+
+    type = None
+    # Suffix of the name in the HELP and TYPE lines, matching the samples
+    metadata_suffix = ""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Yields (suffix, label values, extra labels, value) tuples."""
+        raise NotImplementedError(
+            "This method should be implemented by subclasses."
+        )
+
+    def render(self):
+        metadata_name = f"{self.name}{self.metadata_suffix}"
+        lines = [
+            f"# HELP {metadata_name} {self.documentation}",
+            f"# TYPE {metadata_name} {self.type}",
+        ]
+        for suffix, label_values, extra, value in self.samples():
+            labels = _format_labels(self.label_names, label_values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+
+    type = "counter"
+    metadata_suffix = "_total"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield "_total", label_values, (), value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down.
+
+    Gauges of live objects are computed at scrape time by the function given
+    to `set_function`, it returns a dict mapping label value tuples to
+    values.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            values = self._function()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield "", label_values, (), value
+
+
+class Histogram(Metric):
+    """A distribution of observed values in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._series.get(
+                label_values, ([0] * len(self.buckets), 0.0)
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {
+                label_values: (list(counts), total)
+                for label_values, (counts, total) in self._series.items()
+            }
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", label_values, (
+                    ("le", _format_value(bound)),
+                ), cumulative
+            yield "_sum", label_values, (), total
+            yield "_count", label_values, (), cumulative
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+receive_to_vad_seconds = REGISTRY.register(
+    Histogram(
+        "voicestreamai_receive_to_vad_seconds",
+        "Time from a chunk being ready to its VAD starting.",
+    )
+)
+vad_compute_seconds = REGISTRY.register(
+    Histogram(
+        "voicestreamai_vad_compute_seconds",
+        "Time spent computing VAD on a chunk.",
+    )
+)
+asr_queue_seconds = REGISTRY.register(
+    Histogram(
+        "voicestreamai_asr_queue_seconds",
+        "Time a chunk waited for an ASR worker or batch.",
+    )
+)
+asr_compute_seconds = REGISTRY.register(
+    Histogram(
+        "voicestreamai_asr_compute_seconds",
+        "Time spent transcribing a chunk.",
+    )
+)
+send_seconds = REGISTRY.register(
+    Histogram(
+        "voicestreamai_send_seconds",
+        "Time spent sending a result on the websocket.",
+    )
+)
+connected_clients = REGISTRY.register(
+    Gauge(
+        "voicestreamai_connected_clients",
+        "Number of connected websocket sessions.",
+    )
+)
+buffered_bytes = REGISTRY.register(
+    Gauge(
+        "voicestreamai_session_buffered_bytes",
+        "Audio bytes received and not yet processed, per session.",
+        ("client_id",),
+    )
+)
+pending_chunks = REGISTRY.register(
+    Gauge(
+        "voicestreamai_session_pending_chunks",
+        "Chunks waiting for the previous one to be processed, per session.",
+        ("client_id",),
+    )
+)
+replica_calls = REGISTRY.register(
+    Gauge(
+        "voicestreamai_replica_calls",
+        "Calls served by every model replica of a ReplicaPool.",
+        ("pipeline", "replica"),
+    )
+)
+replica_in_flight = REGISTRY.register(
+    Gauge(
+        "voicestreamai_replica_in_flight",
+        "Calls running on every model replica of a ReplicaPool.",
+        ("pipeline", "replica"),
+    )
+)
+replica_busy_seconds = REGISTRY.register(
+    Gauge(
+        "voicestreamai_replica_busy_seconds",
+        "Time every model replica of a ReplicaPool spent serving calls.",
+        ("pipeline", "replica"),
+    )
+)
+replica_utilization = REGISTRY.register(
+    Gauge(
+        "voicestreamai_replica_utilization",
+        "Fraction of the time every model replica of a ReplicaPool was busy "
+        "since it was loaded.",
+        ("pipeline", "replica"),
+    )
+)
+silent_chunks = REGISTRY.register(
+    Counter(
+        "voicestreamai_silent_chunks",
+        "Chunks skipped without transcription because the VAD found no "
+        "speech.",
+    )
+)
+cascade_vad_chunks = REGISTRY.register(
+    Counter(
+        "voicestreamai_cascade_vad_chunks",
+        "Chunks seen by the gate of the cascade VAD.",
+    )
+)
+cascade_vad_skipped_chunks = REGISTRY.register(
+    Counter(
+        "voicestreamai_cascade_vad_skipped_chunks",
+        "Chunks the gate of the cascade VAD answered without running the "
+        "heavy VAD.",
+    )
+)
+overload_outcomes = REGISTRY.register(
+    Counter(
+        "voicestreamai_overload_outcomes",
+        "Overload policy outcomes of chunks ready while the previous one "
+        "was still processed.",
+        ("outcome",),
+    )
+)
+
+asr_cache_lookups = REGISTRY.register(
+    Counter(
+        "voicestreamai_asr_cache_lookups",
+        "ASR cache lookups by result: exact or near-duplicate hit, miss, "
+        "and evictions.",
+        ("result",),
+    )
+)
+
+language_lock_events = REGISTRY.register(
+    Counter(
+        "voicestreamai_language_lock_events",
+        "Session language locks, successful re-verifications and unlocks.",
+        ("event",),
+    )
+)
+language_detections_skipped = REGISTRY.register(
+    Counter(
+        "voicestreamai_language_detections_skipped",
+        "Chunks transcribed with the locked language of their session "
+        "instead of detecting it.",
+    )
+)
+asr_trimmed_seconds = REGISTRY.register(
+    Counter(
+        "voicestreamai_asr_trimmed_seconds",
+        "Seconds of non-speech audio cut from the chunks before the ASR.",
+    )
+)
+cancelled_chunks = REGISTRY.register(
+    Counter(
+        "voicestreamai_cancelled_chunks",
+        "Chunks of disconnected sessions dropped while pending or being "
+        "processed.",
+        ("stage",),
+    )
+)
+cancelled_inference = REGISTRY.register(
+    Counter(
+        "voicestreamai_cancelled_inference",
+        "Inference calls whose caller went away, dropped while queued or "
+        "computed for nothing while running.",
+        ("role", "stage"),
+    )
+)
+wasted_inference_seconds = REGISTRY.register(
+    Counter(
+        "voicestreamai_wasted_inference_seconds",
+        "Compute time of the inference calls whose caller went away.",
+        ("role",),
+    )
+)
+admissions = REGISTRY.register(
+    Counter(
+        "voicestreamai_admissions",
+        "New sessions accepted or refused by the admission control.",
+        ("result",),
+    )
+)
+
+
+def observe_inference_timings(inference_timings, vad_wall_seconds=None):
+    """
+    Observes the VAD and ASR timings of a processed chunk.
+
+    Args:
+        inference_timings (dict): The client's `inference_timings`, the
+                                  "vad" and "asr" entries are set by the
+                                  inference executors.
+        vad_wall_seconds (float): Wall time of the VAD call, used when the
+                                  VAD pipeline does not report timings.
+    """
+    vad = inference_timings.get("vad")
+    if vad is not None:
+        vad_compute_seconds.observe(vad["compute_time"])
+    elif vad_wall_seconds is not None:
+        vad_compute_seconds.observe(vad_wall_seconds)
+
+    asr = inference_timings.get("asr")
+    if asr is not None:
+        asr_queue_seconds.observe(asr["queue_time"])
+        asr_compute_seconds.observe(asr["compute_time"])
+
+
+async def _handle_request(reader, writer, registry, routes):
+    try:
+        request_line = await reader.readline()
+        # Skip the headers
+        while (await reader.readline()).strip():
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+            status = "200 OK"
+            body = registry.render().encode()
+        elif len(parts) >= 2 and parts[0] == "GET" and parts[1] in routes:
+            status, content_type, body = routes[parts[1]]()
+        else:
+            status = "404 Not Found"
+            body = b"Not Found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logging.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host, port, registry=REGISTRY, routes=None):
+    """
+    Serves the metrics of `registry` on `GET /metrics`.
+
+    Args:
+        routes (dict): Other GET paths served, mapped to functions returning
+                       the (status, content type, body bytes) of the
+                       response.
+
+    Returns:
+        asyncio.Server: The running HTTP server.
+    """
+    routes = routes or {}
+    return await asyncio.start_server(
+        lambda reader, writer: _handle_request(
+            reader, writer, registry, routes
+        ),
+        host,
+        port,
+    )
@@ -0,0 +1,191 @@
+"""
+Construction of the VAD and ASR pipelines, shared by the server
+(`src.main`), the load test (`src.benchmark`) and the batch transcription
+(`src.batch`).
+
+The pipelines run in InferenceExecutors, the ASR one behind an
+ASRBatchScheduler when batching is enabled. The "stub" VAD and ASR need no
+model, the load test and the batch transcription accept them to size the
+plumbing alone.
+"""
+
+import json
+import logging
+import time
+
+import numpy as np
+
+from src.asr.asr_factory import ASRFactory
+from src.asr.asr_interface import ASRInterface
+from src.inference.batch_scheduler import ASRBatchScheduler
+from src.inference.inference_executor import (
+    ExecutorASR,
+    ExecutorVAD,
+    InferenceExecutor,
+)
+from src.vad.energy_vad import EnergyVAD
+from src.vad.vad_factory import VADFactory
+
+
+class StubVAD(EnergyVAD):
+    """
+    EnergyVAD taking at least `compute_seconds` per call, to mimic the cost
+    of a heavy VAD model.
+    """
+
+    def __init__(self, **kwargs):
+        self.compute_seconds = kwargs.pop("compute_seconds", 0.0)
+        super().__init__(**kwargs)
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        time.sleep(self.compute_seconds)
+        return super().detect_activity_sync(waveform, sampling_rate)
+
+
+class StubASR(ASRInterface):
+    """
+    ASR that sleeps `latency_seconds` plus `rtf` times the audio duration
+    and returns one word per half second of audio.
+
+    Batches are one call, like the batched inference of a model: the
+    waveforms are padded to the longest one, and the latency is paid once
+    per batch.
+    """
+
+    def __init__(self, **kwargs):
+        self.rtf = kwargs.get("rtf", 0.1)
+        self.latency_seconds = kwargs.get("latency_seconds", 0.0)
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return self.transcribe_batch_sync(
+            [waveform], [sampling_rate], [language]
+        )[0]
+
+    def transcribe_batch_sync(self, waveforms, sampling_rates, languages):
+        durations = [
+            len(waveform) / sampling_rate
+            for waveform, sampling_rate in zip(waveforms, sampling_rates)
+        ]
+        time.sleep(
+            self.latency_seconds
+            + self.rtf * max(durations, default=0.0) * len(durations)
+        )
+        return [
+            self._transcription(duration, language)
+            for duration, language in zip(durations, languages)
+        ]
+
+    @staticmethod
+    def _transcription(duration, language):
+        words = [
+            {"word": " speech", "start": start, "end": start + 0.4}
+            for start in np.arange(0, duration - 0.4, 0.5).tolist()
+        ]
+        return {
+            "language": language or "en",
+            "language_probability": 1.0,
+            "text": "speech " * len(words),
+            "words": words,
+        }
+
+
+def create_executor(role, kind, workers, pipeline_type, pipeline_args):
+    """
+    Builds the InferenceExecutor of a VAD (`role="vad"`) or ASR pipeline
+    created by the factories.
+    """
+    if kind == "process":
+        # Each worker process loads its own models
+        return InferenceExecutor(
+            role,
+            kind,
+            workers,
+            pipeline_type=pipeline_type,
+            pipeline_args=pipeline_args,
+        )
+
+    if role == "vad":
+        pipeline = VADFactory.create_vad_pipeline(
+            pipeline_type, **pipeline_args
+        )
+    else:
+        pipeline = ASRFactory.create_asr_pipeline(
+            pipeline_type, **pipeline_args
+        )
+    return InferenceExecutor(role, kind, workers, pipeline=pipeline)
+
+
+def create_asr_pipeline(
+    asr_executor, asr_type, max_batch_size=1, max_wait_seconds=0.05
+):
+    """
+    Wraps the ASR executor in an ASRBatchScheduler when `max_batch_size` is
+    over 1, or in an ExecutorASR.
+
+    Batching is skipped with a warning for backends without a batched
+    inference, the chunks would only wait for a batch transcribed one by
+    one.
+    """
+    if max_batch_size > 1 and not _supports_batching(asr_type):
+        logging.warning(
+            "The %s ASR backend has no batched inference, "
+            "--asr-max-batch-size is ignored",
+            asr_type,
+        )
+        max_batch_size = 1
+
+    if max_batch_size > 1:
+        return ASRBatchScheduler(
+            asr_executor,
+            max_batch_size=max_batch_size,
+            max_wait_seconds=max_wait_seconds,
+        )
+    return ExecutorASR(asr_executor)
+
+
+def _supports_batching(asr_type):
+    if asr_type == "stub":
+        batch_call = StubASR.transcribe_batch_sync
+        return batch_call is not ASRInterface.transcribe_batch_sync
+    return ASRFactory.supports_batching(asr_type)
+
+
+def create_pipelines(args):
+    """
+    Builds the VAD and ASR pipelines from the pipeline flags of the load
+    test and the batch transcription, accepting the "stub" types.
+
+    Returns:
+        tuple: The ExecutorVAD and the ASR pipeline.
+    """
+    executors = {}
+    for role, pipeline_type, pipeline_args, workers, stub in (
+        ("vad", args.vad_type, args.vad_args, args.vad_workers, StubVAD),
+        ("asr", args.asr_type, args.asr_args, args.asr_workers, StubASR),
+    ):
+        pipeline_args = json.loads(pipeline_args)
+        if pipeline_type != "stub":
+            executors[role] = create_executor(
+                role,
+                args.inference_executor,
+                workers,
+                pipeline_type,
+                pipeline_args,
+            )
+        elif args.inference_executor == "process":
+            raise ValueError("The stub pipelines cannot run in a process pool")
+        else:
+            executors[role] = InferenceExecutor(
+                role,
+                args.inference_executor,
+                workers,
+                pipeline=stub(**pipeline_args),
+            )
+
+    asr_pipeline = create_asr_pipeline(
+        executors["asr"],
+        args.asr_type,
+        args.asr_max_batch_size,
+        args.asr_max_batch_wait_ms / 1000,
+    )
+    return ExecutorVAD(executors["vad"]), asr_pipeline
@@ -1,10 +1,15 @@
+import asyncio
 import json
 import logging
 import ssl
+import time
 import uuid
 
+import numpy as np
 import websockets
 import base64
+from src import metrics
+from src.capacity import OVERLOADED_CLOSE_CODE, AdmissionController
 from src.client import Client
 
 class Server:
@@ -18,12 +23,25 @@ class Server:
     Attributes:
         vad_pipeline: An instance of a voice activity detection pipeline.
         asr_pipeline: An instance of an automatic speech recognition pipeline.
+        fallback_asr_pipeline: An optional cheaper ASR pipeline that
+                               overloaded sessions can be downgraded to.
         host (str): Host address of the server.
         port (int): Port on which the server listens.
         sampling_rate (int): The sampling rate of audio data in Hz.
         samples_width (int): The width of each audio sample in bits.
+        max_buffer_seconds (float): Seconds of audio kept in each client's
+                                    preallocated ring buffer.
+        metrics_port (int): Port of the Prometheus metrics HTTP endpoint,
+                            None to disable it.
+        reuse_port (bool): Whether several processes accept connections on
+                           the same port (SO_REUSEPORT), see `--workers`.
+        admission (AdmissionController): Refuses new sessions over the
+                                         capacity budgets, None to accept
+                                         every session.
         connected_clients (dict): A dictionary mapping client IDs to Client
                                   objects.
+        ready (bool): Whether the pipelines are loaded and warmed up, see
+                      `warm_up`.
     """
 
     def __init__(
@@ -36,16 +54,32 @@ class Server:
         samples_width=2,
         certfile=None,
         keyfile=None,
+        fallback_asr_pipeline=None,
+        max_buffer_seconds=60,
+        metrics_port=None,
+        reuse_port=False,
+        admission_args=None,
     ):
         self.vad_pipeline = vad_pipeline
         self.asr_pipeline = asr_pipeline
+        self.fallback_asr_pipeline = fallback_asr_pipeline
         self.host = host
         self.port = port
         self.sampling_rate = sampling_rate
         self.samples_width = samples_width
         self.certfile = certfile
         self.keyfile = keyfile
+        self.max_buffer_seconds = max_buffer_seconds
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.reuse_port = reuse_port
+        self.admission = (
+            AdmissionController(**admission_args)
+            if admission_args is not None
+            else None
+        )
         self.connected_clients = {}
+        self.ready = False
 
     async def handle_audio(self, client, websocket):
         while True:
@@ -78,7 +112,10 @@ class Server:
 
             # this is synchronous, any async operation is in BufferingStrategy
             client.process_audio(
-                websocket, self.vad_pipeline, self.asr_pipeline
+                websocket,
+                self.vad_pipeline,
+                self.asr_pipeline,
+                self.fallback_asr_pipeline,
             )
 
     async def handle_websocket(self, websocket, path):
@@ -92,9 +129,26 @@ class Server:
         if path != "/transcription/voice":
             await websocket.close()
             return
-        
+
+        if self.admission is not None:
+            refused_by = self.admission.admit(self.connected_clients.values())
+            if refused_by is not None:
+                logging.warning(
+                    f"Refusing a new session, over the {refused_by} budget"
+                )
+                await websocket.close(
+                    OVERLOADED_CLOSE_CODE,
+                    self.admission.close_reason(refused_by),
+                )
+                return
+
         client_id = str(uuid.uuid4())
-        client = Client(client_id, self.sampling_rate, self.samples_width)
+        client = Client(
+            client_id,
+            self.sampling_rate,
+            self.samples_width,
+            self.max_buffer_seconds,
+        )
         self.connected_clients[client_id] = client
 
         print(f"Client {client_id} connected")
@@ -105,6 +159,8 @@ class Server:
             print(f"Connection with {client_id} closed: {e}")
         finally:
             del self.connected_clients[client_id]
+            # Nobody is left to receive the transcriptions
+            await client.cancel_tasks()
 
     def GetClient(self,client_id):
         for i in self.connected_clients.keys():
@@ -112,28 +168,225 @@ class Server:
                 return self.connected_clients[i]
         
         return None
-    def start(self):
+
+    def _warmup_audio(self, seconds):
+        # A voiced-like signal: harmonics of a gliding pitch, modulated at a
+        # syllable rate, over a little noise.
+        rng = np.random.default_rng(0)
+        t = np.arange(int(seconds * self.sampling_rate)) / self.sampling_rate
+        phase = 2 * np.pi * np.cumsum(120 + 30 * np.sin(2 * np.pi * t))
+        phase /= self.sampling_rate
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+        waveform = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(
+            len(t)
+        )
+        return (
+            (np.clip(waveform, -1, 1) * 32767).astype("<i2").tobytes()
+        )
+
+    async def warm_up(self, seconds=2.0, passes=1):
+        """
+        Runs inference on synthetic audio through every pipeline, so the
+        first client does not pay for lazy model initialization, then marks
+        the server as ready.
+
+        Args:
+            seconds (float): Duration of the synthetic audio, 0 skips the
+                             warm-up.
+            passes (int): Concurrent calls per pipeline, set it to the
+                          number of inference workers to warm all of them.
+        """
+        if seconds > 0:
+            audio = self._warmup_audio(seconds)
+            pipelines = [
+                ("vad", self.vad_pipeline.detect_activity),
+                ("asr", self.asr_pipeline.transcribe),
+            ]
+            if self.fallback_asr_pipeline is not None:
+                pipelines.append(
+                    ("fallback asr", self.fallback_asr_pipeline.transcribe)
+                )
+
+            for name, run in pipelines:
+                clients = []
+                for index in range(passes):
+                    client = Client(
+                        f"warmup-{index}",
+                        self.sampling_rate,
+                        self.samples_width,
+                        seconds,
+                    )
+                    client.scratch_buffer = audio
+                    clients.append(client)
+
+                started_at = time.time()
+                await asyncio.gather(*(run(client) for client in clients))
+                logging.info(
+                    f"Warmed up the {name} pipeline in "
+                    f"{time.time() - started_at:.2f}s"
+                )
+        self.ready = True
+
+    def _register_metrics(self):
+        width = self.samples_width
+        metrics.connected_clients.set_function(
+            lambda: {(): len(self.connected_clients)}
+        )
+        metrics.buffered_bytes.set_function(
+            lambda: {
+                (client_id,): width
+                * (
+                    client.scratch_samples
+                    + client.pending_samples
+                    + client.buffered_samples
+                )
+                for client_id, client in list(self.connected_clients.items())
+            }
+        )
+        metrics.pending_chunks.set_function(
+            lambda: {
+                (client_id,): len(client.pending_chunks)
+                for client_id, client in list(self.connected_clients.items())
+            }
+        )
+        for gauge, key in (
+            (metrics.replica_calls, "calls"),
+            (metrics.replica_in_flight, "in_flight"),
+            (metrics.replica_busy_seconds, "busy_seconds"),
+            (metrics.replica_utilization, "utilization"),
+        ):
+            gauge.set_function(
+                lambda key=key: {
+                    (pipeline, str(replica["replica"])): replica[key]
+                    for pipeline, replicas in self.replica_utilization()
+                    for replica in replicas
+                }
+            )
+
+    def replica_utilization(self):
+        """
+        Returns the (pipeline name, utilization) of the ASR pipelines that
+        spread their calls over a ReplicaPool in this process. Replicas
+        loaded by process-pool workers or by the inference process of
+        other front-ends are not visible here.
+        """
+        utilization = []
+        for name, pipeline in (
+            ("asr", self.asr_pipeline),
+            ("fallback_asr", self.fallback_asr_pipeline),
+        ):
+            pipeline = _innermost_pipeline(pipeline)
+            if hasattr(pipeline, "utilization"):
+                utilization.append((name, pipeline.utilization()))
+        return utilization
+
+    def readiness(self):
+        """
+        Returns the readiness and the spare capacity of the server, served
+        on `GET /ready` next to the metrics.
+
+        Returns:
+            dict: Whether the pipelines are loaded and warm ("ready") and
+                  new sessions are accepted ("accepting"), the load
+                  computed by the AdmissionController ("sessions",
+                  "pending_seconds", "real_time_factor" and
+                  "spare_sessions") and the transcriptions pending on the
+                  ASR pipeline ("pending_requests").
+        """
+        admission = self.admission or AdmissionController()
+        readiness = admission.capacity(self.connected_clients.values())
+        readiness["ready"] = self.ready
+        readiness["accepting"] = (
+            self.ready and admission.refusal_reason(readiness) is None
+        )
+        readiness["pending_requests"] = self.asr_pipeline.pending
+        return readiness
+
+    def _ready_response(self):
+        readiness = self.readiness()
+        status = (
+            "200 OK" if readiness["accepting"] else "503 Service Unavailable"
+        )
+        return status, "application/json", json.dumps(readiness).encode()
+
+    async def start_metrics(self):
+        """
+        Starts the HTTP server of the metrics and of the readiness endpoint
+        on `metrics_port`, if not started yet. It can be started before
+        `warm_up`, `/ready` then answers 503 until the server is ready.
+        """
+        self._register_metrics()
+        if not self.metrics_port or self.metrics_server is not None:
+            return
+        self.metrics_server = await metrics.start_metrics_server(
+            self.host,
+            self.metrics_port,
+            routes={"/ready": self._ready_response},
+        )
+        print(
+            f"Metrics available on "
+            f"http://{self.host}:{self.metrics_port}/metrics, readiness on "
+            f"http://{self.host}:{self.metrics_port}/ready"
+        )
+
+    async def start(self):
+        if not self.ready:
+            logging.warning(
+                "Starting before the pipelines are warmed up, the first "
+                "clients will be slower"
+            )
+            self.ready = True
+        await self.start_metrics()
+
         if self.certfile:
             # Create an SSL context to enforce encrypted connections
             ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
 
             # Load your server's certificate and private key
-            ssl_context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
+            ssl_context.load_cert_chain(
+                certfile=self.certfile, keyfile=self.keyfile
+            )
 
             print(
                 f"WebSocket server ready to accept secure connections on "
                 f"{self.host}:{self.port}/transcription/voice here ssl true"
             )
 
-            # Pass the SSL context to the serve function along with the host and port
-            return websockets.serve(
-                self.handle_websocket, self.host, self.port, ssl=ssl_context
+            # Pass the SSL context to the serve function along with the host
+            # and port
+            return await websockets.serve(
+                self.handle_websocket,
+                self.host,
+                self.port,
+                ssl=ssl_context,
+                reuse_port=self.reuse_port,
             )
         else:
             print(
                 f"WebSocket server ready to accept connections on "
                 f"{self.host}:{self.port}/transcription/voice here ssl false"
             )
-            return websockets.serve(
-                self.handle_websocket, self.host, self.port
+            return await websockets.serve(
+                self.handle_websocket,
+                self.host,
+                self.port,
+                reuse_port=self.reuse_port,
             )
+
+
+def _innermost_pipeline(pipeline):
+    """
+    Unwraps the cache, batch scheduler and executor around a pipeline, and
+    returns the pipeline computing in this process, or None.
+    """
+    while pipeline is not None:
+        if hasattr(pipeline, "asr_pipeline"):
+            pipeline = pipeline.asr_pipeline
+        elif hasattr(pipeline, "executor"):
+            pipeline = pipeline.executor
+        elif hasattr(pipeline, "pipeline"):
+            return pipeline.pipeline
+        else:
+            return pipeline
+    return None
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class SpeechTrim:
+    """
+    The speech regions of a chunk, cut out for the ASR.
+
+    Every VAD segment is widened by `padding_seconds` on both sides, and
+    overlapping regions are merged. The ASR transcribes the concatenation of
+    the regions, and the timestamps of its transcription are mapped back to
+    the time of the untrimmed chunk.
+
+    Attributes:
+        sampling_rate (int): The sampling rate of the chunk in Hz.
+        regions (list): [start, end) sample ranges of the chunk kept for
+                        the ASR, in order.
+        kept_samples (int): Total length of the regions.
+        trimmed_samples (int): Samples of the chunk left out.
+    """
+
+    def __init__(
+        self, vad_segments, num_samples, sampling_rate, padding_seconds=0.2
+    ):
+        self.sampling_rate = sampling_rate
+        padding = int(padding_seconds * sampling_rate)
+        self.regions = []
+        for segment in vad_segments:
+            start = max(int(segment["start"] * sampling_rate) - padding, 0)
+            end = min(
+                int(segment["end"] * sampling_rate) + padding, num_samples
+            )
+            if end <= start:
+                continue
+            if self.regions and start <= self.regions[-1][1]:
+                self.regions[-1][1] = max(self.regions[-1][1], end)
+            else:
+                self.regions.append([start, end])
+        self.kept_samples = sum(end - start for start, end in self.regions)
+        self.trimmed_samples = num_samples - self.kept_samples
+
+        # Start of every region in the trimmed audio and in the chunk
+        self._trimmed_starts = np.cumsum(
+            [0] + [end - start for start, end in self.regions[:-1]]
+        )
+        self._starts = np.array([start for start, _ in self.regions])
+
+    def apply(self, waveform):
+        """Returns the speech regions of the chunk waveform, concatenated."""
+        if not self.regions:
+            return waveform[:0]
+        if len(self.regions) == 1:
+            start, end = self.regions[0]
+            return waveform[start:end]
+        return np.concatenate(
+            [waveform[start:end] for start, end in self.regions]
+        )
+
+    def to_chunk_time(self, seconds, is_end=False):
+        """
+        Maps a time of the trimmed audio to the time of the chunk. A time
+        exactly between two regions is the start of the next one, or with
+        `is_end` the end of the previous one.
+        """
+        if not self.regions:
+            return seconds
+        position = seconds * self.sampling_rate
+        side = "left" if is_end else "right"
+        index = max(
+            np.searchsorted(self._trimmed_starts, position, side=side) - 1,
+            0,
+        )
+        return (
+            float(self._starts[index] + position - self._trimmed_starts[index])
+            / self.sampling_rate
+        )
+
+    def map_transcription(self, transcription):
+        """
+        Maps the word timestamps of a transcription, and the start and end
+        of a segment, to the time of the chunk, in place.
+        """
+        for item in [transcription] + transcription.get("words", []):
+            for key in ("start", "end"):
+                if item.get(key) is not None:
+                    item[key] = self.to_chunk_time(
+                        item[key], is_end=key == "end"
+                    )
+        return transcription
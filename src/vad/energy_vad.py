@@ -0,0 +1,184 @@
+import numpy as np
+
+from src import metrics
+
+from .vad_interface import VADInterface
+
+
+class EnergyVAD(VADInterface):
+    """
+    Lightweight NumPy VAD on frame energy, zero-crossing rate and spectral
+    flatness.
+
+    The waveform is cut into non-overlapping frames and all features are
+    computed in a few vectorized passes. A frame is voiced when it is louder
+    than the energy threshold, its spectrum is peaky (low flatness, unlike
+    line noise or hiss) and its zero-crossing rate is below that of noise
+    and fricatives. Voiced frames are extended by a hangover so the short
+    gaps inside words stay speech, and speech regions shorter than
+    `min_speech_seconds` are dropped.
+
+    The energy threshold adapts to the chunk: it is the noise floor (a low
+    percentile of the frame energies) plus `snr_margin_db`, but never below
+    `min_energy_db`.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initializes the energy VAD.
+
+        Args:
+            frame_seconds (float): Length of the analysis frames.
+            min_energy_db (float): Frames quieter than this (in dBFS) are
+                                   never speech.
+            snr_margin_db (float): How far above the noise floor a frame has
+                                   to be to count as loud.
+            noise_floor_percentile (float): Percentile of the frame energies
+                                            used as the noise floor.
+            max_flatness (float): Maximum spectral flatness of speech
+                                  frames, white noise is around 0.5.
+            max_zero_crossing_rate (float): Maximum zero-crossing rate of
+                                            speech frames.
+            hangover_seconds (float): How long speech is held after the
+                                      last voiced frame.
+            min_speech_seconds (float): Shorter speech regions are dropped.
+            gate_margin_db (float): How much lower the energy threshold is
+                                    when deciding whether a chunk is
+                                    confidently silent, see `is_silence`.
+        """
+        self.frame_seconds = kwargs.get("frame_seconds", 0.02)
+        self.min_energy_db = kwargs.get("min_energy_db", -50.0)
+        self.snr_margin_db = kwargs.get("snr_margin_db", 10.0)
+        self.noise_floor_percentile = kwargs.get("noise_floor_percentile", 10)
+        self.max_flatness = kwargs.get("max_flatness", 0.3)
+        self.max_zero_crossing_rate = kwargs.get(
+            "max_zero_crossing_rate", 0.35
+        )
+        self.hangover_seconds = kwargs.get("hangover_seconds", 0.2)
+        self.min_speech_seconds = kwargs.get("min_speech_seconds", 0.1)
+        self.gate_margin_db = kwargs.get("gate_margin_db", 6.0)
+
+    def frame_features(self, waveform, sampling_rate):
+        """
+        Computes the per-frame features of a waveform.
+
+        Returns:
+            tuple: The frame length in samples, and arrays with the energy in
+                   dBFS, the zero-crossing rate and the spectral flatness of
+                   every frame.
+        """
+        frame_length = max(int(self.frame_seconds * sampling_rate), 2)
+        num_frames = len(waveform) // frame_length
+        frames = waveform[: num_frames * frame_length].reshape(
+            num_frames, frame_length
+        )
+
+        energy_db = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+
+        signs = np.signbit(frames)
+        zero_crossing_rate = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        power = (
+            np.abs(np.fft.rfft(frames * np.hanning(frame_length), axis=1)) ** 2
+            + 1e-12
+        )
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(
+            power, axis=1
+        )
+
+        return frame_length, energy_db, zero_crossing_rate, flatness
+
+    def _voiced_frames(self, features, margin_db=0.0):
+        _, energy_db, zero_crossing_rate, flatness = features
+        if len(energy_db) == 0:
+            return np.zeros(0, dtype=bool)
+
+        noise_floor = np.percentile(energy_db, self.noise_floor_percentile)
+        threshold = (
+            max(self.min_energy_db, noise_floor + self.snr_margin_db)
+            - margin_db
+        )
+        return (
+            (energy_db > threshold)
+            & (flatness < self.max_flatness)
+            & (zero_crossing_rate < self.max_zero_crossing_rate)
+        )
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        features = self.frame_features(waveform, sampling_rate)
+        frame_length = features[0]
+        voiced = self._voiced_frames(features)
+        if not voiced.any():
+            return []
+
+        frame_seconds = frame_length / sampling_rate
+        hangover = int(round(self.hangover_seconds / frame_seconds))
+        held = np.convolve(voiced, np.ones(hangover + 1, dtype=int))
+        speech = held[: len(voiced)] > 0
+
+        edges = np.diff(np.concatenate([[0], speech.astype(np.int8), [0]]))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        min_frames = self.min_speech_seconds / frame_seconds
+
+        return [
+            {
+                "start": start * frame_seconds,
+                "end": end * frame_seconds,
+                "confidence": float(np.mean(voiced[start:end])),
+            }
+            for start, end in zip(starts, ends)
+            if end - start >= min_frames
+        ]
+
+    def is_silence(self, waveform, sampling_rate):
+        """
+        Tells whether a chunk is confidently free of speech.
+
+        The check is deliberately conservative: the energy threshold is
+        lowered by `gate_margin_db` and a single voiced frame is enough to
+        consider the chunk ambiguous.
+        """
+        features = self.frame_features(waveform, sampling_rate)
+        return not self._voiced_frames(features, self.gate_margin_db).any()
+
+
+class CascadeVAD(VADInterface):
+    """
+    Uses a cheap VAD as a gate in front of a heavy one.
+
+    Chunks the gate marks as confidently non-speech are answered with no
+    segments right away, only the ambiguous ones reach the heavy VAD.
+
+    Attributes:
+        gate (EnergyVAD): The cheap VAD.
+        vad (VADInterface): The heavy VAD.
+
+    The chunks seen and the ones that skipped the heavy VAD are counted by
+    `metrics.cascade_vad_chunks` and `metrics.cascade_vad_skipped_chunks`.
+    """
+
+    def __init__(self, gate, vad):
+        self.gate = gate
+        self.vad = vad
+
+    def _skip(self, waveform, sampling_rate):
+        skip = self.gate.is_silence(waveform, sampling_rate)
+        metrics.cascade_vad_chunks.inc()
+        if skip:
+            metrics.cascade_vad_skipped_chunks.inc()
+        return skip
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        if self._skip(waveform, sampling_rate):
+            return []
+        return self.vad.detect_activity_sync(waveform, sampling_rate)
+
+    def detect_activity_incremental_sync(
+        self, waveform, sampling_rate, stream_offset, state
+    ):
+        if self._skip(waveform, sampling_rate):
+            return [], state
+        return self.vad.detect_activity_incremental_sync(
+            waveform, sampling_rate, stream_offset, state
+        )
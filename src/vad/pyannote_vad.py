@@ -1,10 +1,10 @@
 import os
-from os import remove
 
+import numpy as np
+import torch
 from pyannote.audio import Model
 from pyannote.audio.pipelines import VoiceActivityDetection
-
-from src.audio_utils import save_audio_to_file
+from pyannote.core import SlidingWindowFeature
 
 from .vad_interface import VADInterface
 
@@ -21,6 +21,9 @@ class PyannoteVAD(VADInterface):
         Args:
             model_name (str): The model name for Pyannote.
             auth_token (str, optional): Authentication token for Hugging Face.
+            streaming (bool, optional): Keep the segmentation scores of the
+                audio already seen by a session and only run the model on
+                new audio, see `detect_activity_incremental_sync`.
         """
 
         model_name = kwargs.get("model_name", "pyannote/segmentation")
@@ -50,12 +53,19 @@ class PyannoteVAD(VADInterface):
         self.vad_pipeline = VoiceActivityDetection(segmentation=self.model)
         self.vad_pipeline.instantiate(pyannote_args)
 
-    async def detect_activity(self, client):
-        audio_file_path = await save_audio_to_file(
-            client.scratch_buffer, client.get_file_name()
+        self.streaming = kwargs.get("streaming", False)
+        # Scores computed without enough context on either side of the new
+        # audio are recomputed, one model window back from the end of the
+        # scored audio.
+        self.context_seconds = self.vad_pipeline._segmentation.duration
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        vad_results = self.vad_pipeline(
+            {
+                "waveform": torch.from_numpy(waveform).unsqueeze(0),
+                "sample_rate": sampling_rate,
+            }
         )
-        vad_results = self.vad_pipeline(audio_file_path)
-        remove(audio_file_path)
         vad_segments = []
         if len(vad_results) > 0:
             vad_segments = [
@@ -63,3 +73,88 @@ class PyannoteVAD(VADInterface):
                 for segment in vad_results.itersegments()
             ]
         return vad_segments
+
+    def detect_activity_incremental_sync(
+        self, waveform, sampling_rate, stream_offset, state
+    ):
+        """
+        Streaming voice activity detection over a growing scratch buffer.
+
+        When the scratch buffer is kept across chunks, the frame-level speech
+        scores of the audio already processed are kept in `state` and the
+        segmentation model only runs on the new audio plus one model window
+        of overlap, so the total VAD cost of an utterance grows linearly
+        with its length. In the overlap, the old scores are kept up to half
+        a window before the end of the previously scored audio and the new
+        ones are used after that point.
+
+        The returned segments are relative to the start of `waveform`, like
+        `detect_activity_sync`, and also carry their "stream_start" and
+        "stream_end" in seconds of the client's audio stream.
+        """
+        if not self.streaming:
+            return super().detect_activity_incremental_sync(
+                waveform, sampling_rate, stream_offset, state
+            )
+
+        if state.get("stream_offset") != stream_offset:
+            # The scratch buffer was cleared since the previous call
+            state = {"stream_offset": stream_offset}
+
+        scores = state.get("scores")
+        frames = state.get("frames")
+        scored_seconds = state.get("scored_seconds", 0.0)
+
+        crop_frame = 0
+        crop_sample = 0
+        if scores is not None:
+            # Align the recomputed region on the frame grid
+            crop_frame = int(
+                max(scored_seconds - self.context_seconds, 0.0) // frames.step
+            )
+            crop_sample = int(round(crop_frame * frames.step * sampling_rate))
+
+        new_scores = self.vad_pipeline._segmentation(
+            {
+                "waveform": torch.from_numpy(waveform[crop_sample:]).unsqueeze(
+                    0
+                ),
+                "sample_rate": sampling_rate,
+            }
+        )
+        frames = new_scores.sliding_window
+
+        if scores is None:
+            scores = new_scores.data
+        else:
+            keep_seconds = max(
+                scored_seconds - self.context_seconds / 2,
+                crop_frame * frames.step,
+            )
+            keep_frame = min(int(keep_seconds // frames.step), len(scores))
+            scores = np.concatenate(
+                [
+                    scores[:keep_frame],
+                    new_scores.data[keep_frame - crop_frame :],  # noqa: E203
+                ]
+            )
+
+        state["scores"] = scores
+        state["frames"] = frames
+        state["scored_seconds"] = len(waveform) / sampling_rate
+
+        vad_results = self.vad_pipeline._binarize(
+            SlidingWindowFeature(scores, frames)
+        )
+        stream_start = stream_offset / sampling_rate
+        vad_segments = [
+            {
+                "start": segment.start,
+                "end": segment.end,
+                "confidence": 1.0,
+                "stream_start": stream_start + segment.start,
+                "stream_end": stream_start + segment.end,
+            }
+            for segment in vad_results.itersegments()
+        ]
+        return vad_segments, state
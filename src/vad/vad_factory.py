@@ -1,4 +1,14 @@
-from .pyannote_vad import PyannoteVAD
+from src.backend_registry import BackendRegistry
+
+# Backends are only imported when selected, see BackendRegistry
+VAD_BACKENDS = BackendRegistry(
+    "VAD pipeline",
+    "voicestreamai.vad",
+    {
+        "pyannote": "src.vad.pyannote_vad:PyannoteVAD",
+        "energy": "src.vad.energy_vad:EnergyVAD",
+    },
+)
 
 
 class VADFactory:
@@ -6,19 +16,37 @@ class VADFactory:
     Factory for creating instances of VAD systems.
     """
 
+    @staticmethod
+    def register_vad_pipeline(type, target):
+        """
+        Registers a VAD backend, either a class or a "module:Class" string
+        imported when the backend is first used.
+        """
+        VAD_BACKENDS.register(type, target)
+
     @staticmethod
     def create_vad_pipeline(type, **kwargs):
         """
         Creates a VAD pipeline based on the specified type.
 
         Args:
-            type (str): The type of VAD pipeline to create (e.g., 'pyannote').
-            kwargs: Additional arguments for the VAD pipeline creation.
+            type (str): The type of VAD pipeline to create (e.g., 'pyannote',
+                        'energy' or 'cascade').
+            kwargs: Additional arguments for the VAD pipeline creation. For
+                    'cascade', "gate_args" configures the EnergyVAD gate,
+                    "vad_type" selects the heavy VAD (default 'pyannote')
+                    and the remaining arguments are passed to it.
 
         Returns:
             VADInterface: An instance of a class that implements VADInterface.
         """
-        if type == "pyannote":
-            return PyannoteVAD(**kwargs)
-        else:
-            raise ValueError(f"Unknown VAD pipeline type: {type}")
+        if type == "cascade":
+            from .energy_vad import CascadeVAD, EnergyVAD
+
+            gate = EnergyVAD(**kwargs.pop("gate_args", {}))
+            vad_type = kwargs.pop("vad_type", "pyannote")
+            return CascadeVAD(
+                gate, VADFactory.create_vad_pipeline(vad_type, **kwargs)
+            )
+
+        return VAD_BACKENDS.load(type)(**kwargs)
@@ -7,6 +7,11 @@ class VADInterface:
         """
         Detects voice activity in the given audio data.
 
+        By default this runs `detect_activity_sync` on the client's scratch
+        waveform in the calling thread. Wrap the pipeline in an
+        `src.inference.inference_executor.ExecutorVAD` to keep the model
+        off the event loop.
+
         Args:
             client (src.Client): The client to detect on
 
@@ -14,6 +19,50 @@ class VADInterface:
             List: VAD result, a list of objects containing "start", "end",
                   "confidence".
         """
+        vad_segments, client.vad_state = self.detect_activity_incremental_sync(
+            client.get_scratch_waveform(),
+            client.sampling_rate,
+            client.get_scratch_start_sample(),
+            client.vad_state,
+        )
+        return vad_segments
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        """
+        Blocking voice activity detection on an in-memory waveform.
+
+        Args:
+            waveform (numpy.ndarray): Mono float32 audio in [-1, 1].
+            sampling_rate (int): The sampling rate of the waveform in Hz.
+
+        Returns:
+            List: VAD result, a list of objects containing "start", "end",
+                  "confidence", in seconds from the start of the waveform.
+        """
         raise NotImplementedError(
             "This method should be implemented by subclasses."
         )
+
+    def detect_activity_incremental_sync(
+        self, waveform, sampling_rate, stream_offset, state
+    ):
+        """
+        Blocking voice activity detection that may reuse per-session state.
+
+        Streaming backends keep whatever they computed on the audio they
+        have already seen in `state` and only process the new audio. The
+        default implementation ignores the state.
+
+        Args:
+            waveform (numpy.ndarray): Mono float32 audio in [-1, 1].
+            sampling_rate (int): The sampling rate of the waveform in Hz.
+            stream_offset (int): Position of the first sample of the
+                                 waveform in the client's audio stream.
+            state (dict): The state returned by the previous call for the
+                          same client, empty on the first call.
+
+        Returns:
+            tuple: The VAD result as returned by `detect_activity_sync` and
+                   the state to pass to the next call.
+        """
+        return self.detect_activity_sync(waveform, sampling_rate), state
@@ -76,7 +76,7 @@ class TestWhisperASR(unittest.TestCase):
                 print(f"Actual: {transcription}")
                 print(f"Similarity: {similarity}")
 
-                self.client.scratch_buffer.clear()
+                self.client.clear_scratch_buffer()
 
             # Calculate average similarity for the file
             avg_similarity = sum(similarities) / len(similarities)
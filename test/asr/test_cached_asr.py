@@ -0,0 +1,144 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from src.asr.asr_interface import ASRInterface
+from src.asr.cached_asr import CachedASR
+from src.client import Client
+
+
+class CountingASR(ASRInterface):
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.calls += 1
+        return {
+            "language": language,
+            "text": f"call {self.calls}",
+            "words": [{"word": "call", "start": 1.0, "end": 1.5}],
+        }
+
+
+class StreamingCountingASR(CountingASR):
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        transcription = self.transcribe_sync(waveform, sampling_rate, language)
+        on_segment(
+            {
+                "text": transcription["text"],
+                "start": 1.0,
+                "end": 1.5,
+                "words": transcription["words"],
+            }
+        )
+        return transcription
+
+
+def prompt(seconds=2.0, seed=0):
+    """Noise shaped by a few tones, like a recorded prompt."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * 16000)) / 16000
+    tones = sum(
+        np.sin(2 * np.pi * f * t) * (1 + np.sin(2 * np.pi * r * t))
+        for f, r in ((400, 3), (900, 5), (1800, 2), (3000, 7))
+    )
+    return (0.1 * tones + 0.05 * rng.standard_normal(len(t))).astype(
+        np.float32
+    )
+
+
+def padded(waveform, leading_seconds):
+    silence = np.zeros(int(leading_seconds * 16000), dtype=np.float32)
+    return np.concatenate([silence, waveform, silence])
+
+
+class TestCachedASR(unittest.TestCase):
+    def setUp(self):
+        self.asr = CountingASR()
+        self.cache = CachedASR(self.asr)
+
+    def test_exact_hit_ignores_padding_and_shifts_words(self):
+        first = self.cache.transcribe_sync(padded(prompt(), 0.5), 16000)
+        second = self.cache.transcribe_sync(padded(prompt(), 1.0), 16000)
+
+        self.assertEqual(self.asr.calls, 1)
+        self.assertEqual(second["text"], first["text"])
+        self.assertAlmostEqual(second["words"][0]["start"], 1.5)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_near_duplicate_hit(self):
+        self.cache.transcribe_sync(prompt(), 16000)
+        noisy = prompt() + 0.005 * np.random.default_rng(1).standard_normal(
+            32000
+        ).astype(np.float32)
+        self.cache.transcribe_sync(noisy, 16000)
+        self.cache.transcribe_sync(prompt(3.0, seed=2)[::-1].copy(), 16000)
+
+        self.assertEqual(self.asr.calls, 2)
+
+    def test_language_is_part_of_the_key(self):
+        self.cache.transcribe_sync(prompt(), 16000, "en")
+        result = self.cache.transcribe_sync(prompt(), 16000, "fr")
+
+        self.assertEqual(self.asr.calls, 2)
+        self.assertEqual(result["language"], "fr")
+
+    def test_lru_eviction(self):
+        cache = CachedASR(self.asr, max_entries=2, max_bit_error_rate=0)
+        waveforms = [prompt(seed=seed) for seed in range(3)]
+        for waveform in waveforms + waveforms[2:]:
+            cache.transcribe_sync(waveform, 16000)
+        cache.transcribe_sync(waveforms[0], 16000)
+
+        self.assertEqual(self.asr.calls, 4)
+
+    def test_async_transcribe_and_persistence(self):
+        client = Client("test_client", 16000, 2)
+        client.scratch_buffer = (prompt() * 32767).astype("<i2").tobytes()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = CachedASR(self.asr, path=path, save_interval_seconds=0.01)
+            asyncio.run(cache.transcribe(client))
+            # Saved by the background thread, without blocking the call
+            for _ in range(500):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.01)
+            self.assertTrue(os.path.exists(path))
+            cache.close()
+
+            restored = CachedASR(self.asr, path=path)
+            transcription = asyncio.run(restored.transcribe(client))
+
+        self.assertEqual(self.asr.calls, 1)
+        self.assertEqual(transcription["text"], "call 1")
+        self.assertEqual(client.inference_timings["asr"]["cache_hit"], "exact")
+
+    def test_hit_replays_the_streamed_segments(self):
+        asr = StreamingCountingASR()
+        cache = CachedASR(asr)
+        segments = []
+        for leading_seconds in (0.5, 1.0):
+            client = Client("test_client", 16000, 2)
+            client.scratch_buffer = (
+                (padded(prompt(), leading_seconds) * 32767)
+                .astype("<i2")
+                .tobytes()
+            )
+            asyncio.run(cache.transcribe_streaming(client, segments.append))
+
+        self.assertEqual(asr.calls, 1)
+        self.assertEqual([s["text"] for s in segments], ["call 1"] * 2)
+        self.assertAlmostEqual(segments[1]["start"], 1.5)
+        self.assertAlmostEqual(segments[1]["words"][0]["end"], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from src.client import Client
+
+
+class TestAdaptiveChunkLength(unittest.TestCase):
+    def setUp(self):
+        self.client = Client("test_client", 16000, 2)
+        self.client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_strategy": "adaptive_chunk_length",
+                    "processing_args": {
+                        "chunk_length_seconds": 2,
+                        "chunk_offset_seconds": 0.1,
+                        "min_chunk_length_seconds": 1,
+                        "max_chunk_length_seconds": 4,
+                        "step_factor": 2,
+                    },
+                },
+            }
+        )
+        self.strategy = self.client.buffering_strategy
+
+    def test_shrinks_to_the_floor_when_idle(self):
+        with self.assertLogs(level="INFO") as logs:
+            for _ in range(3):
+                self.strategy.adapt(0.1, 2.0, pending_requests=0)
+
+        self.assertEqual(self.strategy.chunk_length_seconds, 1)
+        # Only the effective adjustment is logged
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("2.00s -> 1.00s", logs.output[0])
+
+    def test_grows_to_the_ceiling_under_pending_work(self):
+        for _ in range(3):
+            self.strategy.adapt(0.1, 2.0, pending_requests=10)
+
+        self.assertEqual(self.strategy.chunk_length_seconds, 4)
+
+    def test_grows_when_slower_than_the_target_rtf(self):
+        self.strategy.adapt(1.8, 2.0, pending_requests=0)
+
+        self.assertEqual(self.strategy.chunk_length_seconds, 4)
+
+    def test_keeps_the_length_between_the_thresholds(self):
+        self.strategy.adapt(0.6, 2.0, pending_requests=0)
+
+        self.assertEqual(self.strategy.chunk_length_seconds, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import unittest
+
+from src.asr.asr_interface import ASRInterface
+from src.client import Client
+from src.vad.vad_interface import VADInterface
+
+STEP_BYTES = 8000 * 2
+
+
+class SpeechVAD(VADInterface):
+    """Speech until the end of the window, then silence after `passes`."""
+
+    def __init__(self, passes=None):
+        self.passes = passes
+
+    async def detect_activity(self, client):
+        if self.passes is not None:
+            if self.passes == 0:
+                return []
+            self.passes -= 1
+        end = client.scratch_samples / client.sampling_rate
+        return [{"start": 0.0, "end": end, "confidence": 1.0}]
+
+
+class ScriptedASR(ASRInterface):
+    """
+    Returns the given hypotheses in turn, with one word every 0.2 s from the
+    start of the window.
+    """
+
+    def __init__(self, hypotheses, with_words=True):
+        self.hypotheses = list(hypotheses)
+        self.with_words = with_words
+        self.window_starts = []
+
+    async def transcribe(self, client):
+        self.window_starts.append(client.get_scratch_start_sample())
+        text = self.hypotheses.pop(0)
+        transcription = {"text": text, "language": "en"}
+        if self.with_words:
+            transcription["words"] = [
+                {"word": " " + word, "start": 0.2 * i, "end": 0.2 * i + 0.15}
+                for i, word in enumerate(text.split())
+            ]
+        return transcription
+
+
+class RecordingWebsocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(json.loads(message))
+
+
+class TestLocalAgreement(unittest.TestCase):
+    def run_passes(self, asr, passes, vad=None, **processing_args):
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_strategy": "local_agreement",
+                    "processing_args": {
+                        "step_seconds": 0.5,
+                        **processing_args,
+                    },
+                },
+            }
+        )
+        vad = vad or SpeechVAD()
+        websocket = RecordingWebsocket()
+
+        async def run():
+            for _ in range(passes):
+                client.append_audio_data(bytes(STEP_BYTES))
+                client.process_audio(websocket, vad, asr)
+                while client.buffering_strategy.processing_flag:
+                    await asyncio.sleep(0)
+
+        asyncio.run(run())
+        return client, websocket.messages
+
+    def test_agreed_prefix_is_committed_once(self):
+        asr = ScriptedASR(
+            ["hello", "hello word", "world how", "world how are", "are you"]
+        )
+        _, messages = self.run_passes(asr, 5)
+
+        self.assertEqual(
+            [(message["type"], message["text"]) for message in messages],
+            [
+                ("partial", "hello"),
+                ("final", "hello"),
+                ("partial", "word"),
+                ("partial", "world how"),
+                ("final", "world how"),
+                ("partial", "are"),
+                ("final", "are"),
+                ("partial", "you"),
+            ],
+        )
+        # The window is trimmed past the end of the committed words
+        self.assertEqual(asr.window_starts, [0, 0, 2400, 2400, 8000])
+        self.assertEqual(messages[4]["words"][-1]["end"], 0.5)
+
+    def test_silence_commits_the_last_hypothesis(self):
+        asr = ScriptedASR(["good", "good bye"], with_words=False)
+        client, messages = self.run_passes(asr, 3, SpeechVAD(passes=2))
+
+        self.assertEqual(
+            [(message["type"], message["text"]) for message in messages],
+            [
+                ("partial", "good"),
+                ("final", "good"),
+                ("partial", "bye"),
+                ("final", "bye"),
+            ],
+        )
+        self.assertEqual(client.scratch_samples, 0)
+
+    def test_text_only_backend(self):
+        asr = ScriptedASR(
+            ["good", "good bye", "good bye now"], with_words=False
+        )
+        _, messages = self.run_passes(asr, 3)
+
+        self.assertEqual(
+            [(message["type"], message["text"]) for message in messages],
+            [
+                ("partial", "good"),
+                ("final", "good"),
+                ("partial", "bye"),
+                ("final", "bye"),
+                ("partial", "now"),
+            ],
+        )
+
+    def test_single_pass_commits_every_hypothesis(self):
+        asr = ScriptedASR(["hello", "world", "again"])
+        _, messages = self.run_passes(asr, 3, agreement_passes=1)
+
+        self.assertEqual(
+            [(message["type"], message["text"]) for message in messages],
+            [("final", "hello"), ("final", "world"), ("final", "again")],
+        )
+        self.assertEqual(asr.window_starts, [0, 2400, 4800])
+
+
+if __name__ == "__main__":
+    unittest.main()
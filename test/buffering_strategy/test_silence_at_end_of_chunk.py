@@ -0,0 +1,312 @@
+import asyncio
+import json
+import threading
+import unittest
+
+from src import metrics
+from src.asr.asr_interface import ASRInterface
+from src.client import Client
+from src.inference.inference_executor import ExecutorASR, InferenceExecutor
+from src.vad.vad_interface import VADInterface
+
+CHUNK_BYTES = 16000 * 2
+
+
+class BlockingVAD(VADInterface):
+    """Speech that ends early in every chunk, released on demand."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def detect_activity(self, client):
+        await self.release.wait()
+        return [{"start": 0.0, "end": 0.1, "confidence": 1.0}]
+
+
+class NamedASR(ASRInterface):
+    def __init__(self, name):
+        self.name = name
+        self.chunk_sizes = []
+
+    async def transcribe(self, client):
+        self.chunk_sizes.append(len(client.scratch_buffer))
+        return {"text": self.name}
+
+
+class SegmentedASR(ASRInterface):
+    """Decodes two segments, the second one long after the first."""
+
+    def __init__(self):
+        self.segment_sent = threading.Event()
+        self.sent_while_decoding = []
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return self.transcribe_streaming_sync(
+            waveform, sampling_rate, language, None
+        )
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        segments = [
+            {"text": "hello", "start": 0.0, "end": 0.5, "words": []},
+            {"text": "world", "start": 0.5, "end": 1.0, "words": []},
+        ]
+        for segment in segments:
+            if on_segment is not None:
+                self.segment_sent.clear()
+                on_segment(segment)
+                # The event loop sends the segment while we keep decoding
+                self.sent_while_decoding.append(self.segment_sent.wait(5))
+        return {"text": "hello world", "words": []}
+
+
+class RecordingWebsocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(json.loads(message))
+
+
+class TestOverloadPolicy(unittest.TestCase):
+    def run_overload(self, policy, chunks=4, fallback=None):
+        """
+        Sends `chunks` chunks while the first one is stuck in VAD, then lets
+        the processing catch up.
+        """
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_args": {
+                        "chunk_length_seconds": 1,
+                        "chunk_offset_seconds": 0.1,
+                        "overload_policy": policy,
+                        "max_pending_chunks": 2,
+                    }
+                },
+            }
+        )
+        vad = BlockingVAD()
+        asr = NamedASR("primary")
+        websocket = RecordingWebsocket()
+
+        async def run():
+            for _ in range(chunks):
+                client.append_audio_data(bytes(CHUNK_BYTES + 2))
+                client.process_audio(websocket, vad, asr, fallback)
+                await asyncio.sleep(0)
+            vad.release.set()
+            while client.buffering_strategy.processing_flag:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        return client, asr, websocket
+
+    def test_queue_then_merge(self):
+        client, asr, websocket = self.run_overload("queue")
+
+        counters = client.buffering_strategy.overload_counters
+        self.assertEqual(counters, {"queued": 2, "merged": 1})
+        # No audio is lost: the last pending chunk holds two chunks
+        self.assertEqual(
+            asr.chunk_sizes,
+            [CHUNK_BYTES + 2, CHUNK_BYTES + 2, 2 * (CHUNK_BYTES + 2)],
+        )
+        self.assertEqual(len(websocket.messages), 3)
+
+    def test_merge(self):
+        client, asr, _ = self.run_overload("merge")
+
+        counters = client.buffering_strategy.overload_counters
+        self.assertEqual(counters, {"queued": 1, "merged": 2})
+        self.assertEqual(
+            asr.chunk_sizes, [CHUNK_BYTES + 2, 3 * (CHUNK_BYTES + 2)]
+        )
+
+    def test_drop_oldest(self):
+        client, asr, _ = self.run_overload("drop_oldest", chunks=5)
+
+        counters = client.buffering_strategy.overload_counters
+        self.assertEqual(counters, {"queued": 4, "dropped": 2})
+        self.assertEqual(len(asr.chunk_sizes), 3)
+
+    def test_disconnect_cancels_the_session_work(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_args": {
+                        "chunk_length_seconds": 1,
+                        "chunk_offset_seconds": 0.1,
+                    }
+                },
+            }
+        )
+        vad = BlockingVAD()
+        asr = NamedASR("primary")
+        websocket = RecordingWebsocket()
+        pending_before = metrics.cancelled_chunks.value("pending")
+
+        async def run():
+            for _ in range(3):
+                client.append_audio_data(bytes(CHUNK_BYTES + 2))
+                client.process_audio(websocket, vad, asr)
+                await asyncio.sleep(0)
+            await client.cancel_tasks()
+            # Released too late, nothing is processed anymore
+            vad.release.set()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        self.assertEqual(asr.chunk_sizes, [])
+        self.assertEqual(websocket.messages, [])
+        self.assertEqual(client.tasks, set())
+        self.assertFalse(client.buffering_strategy.processing_flag)
+        self.assertEqual(
+            metrics.cancelled_chunks.value("pending"), pending_before + 2
+        )
+
+    def test_downgrade(self):
+        fallback = NamedASR("fallback")
+        client, asr, websocket = self.run_overload(
+            "downgrade", chunks=2, fallback=fallback
+        )
+
+        counters = client.buffering_strategy.overload_counters
+        self.assertEqual(counters, {"downgraded": 1, "queued": 1})
+        self.assertEqual(
+            [message["text"] for message in websocket.messages],
+            ["primary", "fallback"],
+        )
+        self.assertFalse(client.buffering_strategy.downgraded)
+
+        # Caught up, the next chunk goes to the primary pipeline again
+        async def run():
+            vad = BlockingVAD()
+            vad.release.set()
+            client.append_audio_data(bytes(CHUNK_BYTES + 2))
+            client.process_audio(websocket, vad, asr, fallback)
+            while client.buffering_strategy.processing_flag:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        self.assertEqual(websocket.messages[-1]["text"], "primary")
+
+
+class TestStreamSegments(unittest.TestCase):
+    def test_segments_are_sent_before_the_chunk_is_decoded(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_args": {
+                        "chunk_length_seconds": 1,
+                        "chunk_offset_seconds": 0.1,
+                        "stream_segments": True,
+                    }
+                },
+            }
+        )
+        vad = BlockingVAD()
+        vad.release.set()
+        asr = SegmentedASR()
+        executor = InferenceExecutor("asr", "thread", pipeline=asr)
+
+        class SignallingWebsocket(RecordingWebsocket):
+            async def send(self, message):
+                await super().send(message)
+                asr.segment_sent.set()
+
+        websocket = SignallingWebsocket()
+
+        async def run():
+            client.append_audio_data(bytes(CHUNK_BYTES + 2))
+            client.process_audio(websocket, vad, ExecutorASR(executor))
+            while client.buffering_strategy.processing_flag:
+                await asyncio.sleep(0.01)
+
+        try:
+            asyncio.run(run())
+        finally:
+            executor.shutdown()
+
+        self.assertEqual(asr.sent_while_decoding, [True, True])
+        self.assertEqual(
+            [(m["type"], m["text"]) for m in websocket.messages],
+            [
+                ("segment", "hello"),
+                ("segment", "world"),
+                ("final", "hello world"),
+            ],
+        )
+
+
+class SpeechVAD(VADInterface):
+    async def detect_activity(self, client):
+        return [
+            {"start": 0.5, "end": 0.8, "confidence": 1.0},
+            {"start": 2.0, "end": 2.2, "confidence": 1.0},
+        ]
+
+
+class WaveformASR(ASRInterface):
+    def __init__(self):
+        self.waveform_seconds = []
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.waveform_seconds.append(len(waveform) / sampling_rate)
+        return {
+            "text": "hello world",
+            "words": [
+                {"word": "hello", "start": 0.1, "end": 0.4},
+                {"word": "world", "start": 0.6, "end": 0.8},
+            ],
+        }
+
+
+class TestTrimNonSpeech(unittest.TestCase):
+    def test_only_speech_is_transcribed(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {
+                "type": "config",
+                "data": {
+                    "processing_args": {
+                        "chunk_length_seconds": 3,
+                        "chunk_offset_seconds": 0.1,
+                        "trim_non_speech": True,
+                        "speech_padding_seconds": 0.1,
+                    }
+                },
+            }
+        )
+        asr = WaveformASR()
+        websocket = RecordingWebsocket()
+
+        async def run():
+            client.append_audio_data(bytes(3 * CHUNK_BYTES + 2))
+            client.process_audio(websocket, SpeechVAD(), asr)
+            while client.buffering_strategy.processing_flag:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        # [0.4, 0.9) and [1.9, 2.3) of the chunk
+        self.assertEqual(len(asr.waveform_seconds), 1)
+        self.assertAlmostEqual(asr.waveform_seconds[0], 0.9)
+        words = websocket.messages[0]["words"]
+        self.assertAlmostEqual(words[0]["start"], 0.5)
+        self.assertAlmostEqual(words[0]["end"], 0.8)
+        self.assertAlmostEqual(words[1]["start"], 2.0)
+        self.assertAlmostEqual(words[1]["end"], 2.2)
+        self.assertIsNone(client.speech_trim)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import asyncio
+import time
+import unittest
+
+from src.asr.asr_interface import ASRInterface
+from src.client import Client
+from src.inference.batch_scheduler import ASRBatchScheduler
+from src.inference.inference_executor import InferenceExecutor
+
+
+class BatchRecordingPipeline:
+    """Stand-in ASR model that records the size of every batch."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def transcribe_batch_sync(self, waveforms, sampling_rates, languages):
+        self.batch_sizes.append(len(waveforms))
+        time.sleep(0.05)
+        return [
+            {"text": f"{len(waveform)} samples", "language": language}
+            for waveform, language in zip(waveforms, languages)
+        ]
+
+
+class SegmentingPipeline(ASRInterface):
+    """Decodes every waveform as two segments named after its length."""
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return self.transcribe_streaming_sync(
+            waveform, sampling_rate, language, lambda segment: None
+        )
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        for index in range(2):
+            on_segment({"text": f"{len(waveform)}/{index}"})
+        return {"text": f"{len(waveform)}"}
+
+
+class TestASRBatchScheduler(unittest.TestCase):
+    def make_client(self, index):
+        client = Client(f"client_{index}", 16000, 2)
+        client.scratch_buffer = bytearray(2 * 1000 * (index + 1))
+        client.config["language"] = f"lang_{index}"
+        return client
+
+    def test_concurrent_chunks_are_batched(self):
+        pipeline = BatchRecordingPipeline()
+        scheduler = ASRBatchScheduler(
+            InferenceExecutor("asr", "thread", 1, pipeline),
+            max_batch_size=4,
+            max_wait_seconds=0.2,
+        )
+        clients = [self.make_client(i) for i in range(6)]
+
+        async def run():
+            return await asyncio.gather(
+                *[scheduler.transcribe(client) for client in clients]
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(pipeline.batch_sizes, [4, 2])
+        # Every result goes back to the client it came from
+        for index, (client, result) in enumerate(zip(clients, results)):
+            self.assertEqual(result["text"], f"{1000 * (index + 1)} samples")
+            self.assertEqual(result["language"], f"lang_{index}")
+        self.assertEqual(clients[0].inference_timings["asr"]["batch_size"], 4)
+        self.assertEqual(clients[5].inference_timings["asr"]["batch_size"], 2)
+
+    def test_lone_chunk_waits_at_most_the_deadline(self):
+        pipeline = BatchRecordingPipeline()
+        scheduler = ASRBatchScheduler(
+            InferenceExecutor("asr", "thread", 1, pipeline),
+            max_batch_size=8,
+            max_wait_seconds=0.05,
+        )
+        client = self.make_client(0)
+
+        start = time.time()
+        asyncio.run(scheduler.transcribe(client))
+
+        self.assertEqual(pipeline.batch_sizes, [1])
+        self.assertLess(time.time() - start, 0.5)
+        self.assertGreaterEqual(
+            client.inference_timings["asr"]["queue_time"], 0.04
+        )
+
+    def test_cancelled_chunk_leaves_the_queue(self):
+        pipeline = BatchRecordingPipeline()
+        scheduler = ASRBatchScheduler(
+            InferenceExecutor("asr", "thread", 1, pipeline),
+            max_batch_size=8,
+            max_wait_seconds=0.2,
+        )
+        clients = [self.make_client(i) for i in range(2)]
+
+        async def run():
+            tasks = [
+                asyncio.create_task(scheduler.transcribe(client))
+                for client in clients
+            ]
+            await asyncio.sleep(0.05)
+            tasks[0].cancel()
+            await asyncio.sleep(0)
+            pending = scheduler.pending
+            return pending, await tasks[1]
+
+        pending, result = asyncio.run(run())
+
+        self.assertEqual(pending, 1)
+        self.assertEqual(pipeline.batch_sizes, [1])
+        self.assertEqual(result["text"], "2000 samples")
+
+    def test_streamed_segments_go_to_their_request(self):
+        scheduler = ASRBatchScheduler(
+            InferenceExecutor("asr", "thread", 1, SegmentingPipeline()),
+            max_batch_size=3,
+            max_wait_seconds=0.1,
+        )
+        clients = [self.make_client(i) for i in range(3)]
+        segments = {0: [], 1: []}
+
+        async def run():
+            return await asyncio.gather(
+                scheduler.transcribe_streaming(clients[0], segments[0].append),
+                scheduler.transcribe_streaming(clients[1], segments[1].append),
+                scheduler.transcribe(clients[2]),
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(
+            [r["text"] for r in results], ["1000", "2000", "3000"]
+        )
+        self.assertEqual(
+            [s["text"] for s in segments[0]], ["1000/0", "1000/1"]
+        )
+        self.assertEqual(
+            [s["text"] for s in segments[1]], ["2000/0", "2000/1"]
+        )
+        self.assertEqual(clients[2].inference_timings["asr"]["batch_size"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import queue
+import threading
+import time
+import unittest
+
+from src import metrics
+from src.asr.asr_interface import ASRInterface
+from src.client import Client
+from src.inference import inference_executor
+from src.inference.inference_executor import (
+    ExecutorASR,
+    ExecutorVAD,
+    InferenceExecutor,
+)
+from src.vad.vad_interface import VADInterface
+
+
+class SlowPipeline(VADInterface, ASRInterface):
+    """Blocking stand-in for a model, records the thread it ran on."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.threads = []
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        return [{"start": 0.0, "end": len(waveform) / sampling_rate}]
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        return {"text": "hello", "language": language}
+
+
+class TestInferenceExecutor(unittest.TestCase):
+    def setUp(self):
+        self.client = Client("test_client", 16000, 2)
+        self.client.scratch_buffer = bytearray(16000 * 2)
+
+    def test_thread_executor_keeps_event_loop_free(self):
+        pipeline = SlowPipeline(0.2)
+        vad = ExecutorVAD(InferenceExecutor("vad", "thread", 1, pipeline))
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker_task = asyncio.create_task(ticker())
+            segments = await vad.detect_activity(self.client)
+            ticker_task.cancel()
+            return segments, ticks
+
+        segments, ticks = asyncio.run(run())
+
+        self.assertEqual(segments, [{"start": 0.0, "end": 1.0}])
+        self.assertGreater(ticks, 5)
+        self.assertTrue(pipeline.threads[0].startswith("vad-infer"))
+
+    def test_queue_time_is_reported_separately(self):
+        pipeline = SlowPipeline(0.1)
+        asr = ExecutorASR(InferenceExecutor("asr", "thread", 1, pipeline))
+        other_client = Client("other_client", 16000, 2)
+        other_client.scratch_buffer = bytearray(16000 * 2)
+        self.client.config["language"] = "english"
+
+        async def run():
+            return await asyncio.gather(
+                asr.transcribe(self.client), asr.transcribe(other_client)
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(results[0], {"text": "hello", "language": "english"})
+        timings = sorted(
+            [
+                self.client.inference_timings["asr"],
+                other_client.inference_timings["asr"],
+            ],
+            key=lambda t: t["queue_time"],
+        )
+        # The second call waited for the single worker to finish the first.
+        self.assertGreaterEqual(timings[1]["queue_time"], 0.09)
+        for t in timings:
+            self.assertGreaterEqual(t["compute_time"], 0.09)
+
+    def test_cancelled_calls_are_dropped_or_counted_as_wasted(self):
+        pipeline = SlowPipeline(0.1)
+        executor = InferenceExecutor("test", "thread", 1, pipeline)
+        waveform = self.client.get_scratch_waveform()
+        queued_before = metrics.cancelled_inference.value("test", "queued")
+        wasted_before = metrics.wasted_inference_seconds.value("test")
+
+        async def run():
+            running = asyncio.create_task(
+                executor.run("transcribe_sync", waveform, 16000, None)
+            )
+            queued = asyncio.create_task(
+                executor.run("transcribe_sync", waveform, 16000, None)
+            )
+            await asyncio.sleep(0.05)
+            running.cancel()
+            queued.cancel()
+            await asyncio.sleep(0.2)
+            return executor.pending
+
+        pending = asyncio.run(run())
+        executor.shutdown()
+
+        # Only the call already running reached the model
+        self.assertEqual(len(pipeline.threads), 1)
+        self.assertEqual(pending, 0)
+        self.assertEqual(
+            metrics.cancelled_inference.value("test", "queued"),
+            queued_before + 1,
+        )
+        self.assertGreaterEqual(
+            metrics.wasted_inference_seconds.value("test"),
+            wasted_before + 0.09,
+        )
+
+    def test_process_worker_streams_segments_before_its_end(self):
+        class Streaming:
+            def transcribe_streaming_sync(
+                self, waveform, sampling_rate, language, on_segment
+            ):
+                on_segment({"text": "hello"})
+                on_segment({"text": "world"})
+                return {"text": "hello world"}
+
+        segments = queue.Queue()
+        inference_executor._worker_segments = segments
+        inference_executor._worker_pipeline = Streaming()
+        try:
+            result, _ = inference_executor._process_worker_call(
+                "transcribe_streaming_sync", (None, 16000, None), 0, 7
+            )
+        finally:
+            inference_executor._worker_pipeline = None
+            inference_executor._worker_segments = None
+
+        self.assertEqual(result, {"text": "hello world"})
+        self.assertEqual(
+            [segments.get_nowait() for _ in range(3)],
+            [(7, ({"text": "hello"},)), (7, ({"text": "world"},)), (7, None)],
+        )
+
+    def test_unknown_kind_raises(self):
+        with self.assertRaises(ValueError):
+            InferenceExecutor("vad", "gpu", 1, SlowPipeline(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import unittest
+
+import numpy as np
+import websockets
+
+from src.asr.asr_interface import ASRInterface
+from src.inference.inference_executor import (
+    ExecutorASR,
+    ExecutorVAD,
+    InferenceExecutor,
+)
+from src.inference.inference_service import (
+    InferenceClient,
+    InferenceService,
+    SharedAudioArena,
+    start_front_ends,
+)
+from src.vad.vad_interface import VADInterface
+
+
+class RecordingPipeline(VADInterface, ASRInterface):
+    """Speech everywhere, transcribed as the process id and length."""
+
+    def __init__(self):
+        self.lengths = []
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        return [{"start": 0.0, "end": 0.1, "confidence": 1.0}]
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.lengths.append(len(waveform))
+        return {"text": f"{os.getpid()} {len(waveform)}"}
+
+
+class GatedPipeline(RecordingPipeline):
+    """Transcribes once `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.release.wait(5)
+        return super().transcribe_sync(waveform, sampling_rate, language)
+
+
+class StreamingPipeline(RecordingPipeline):
+    """Streams the transcription as one segment per half second."""
+
+    def transcribe_streaming_sync(
+        self, waveform, sampling_rate, language, on_segment
+    ):
+        for start in range(0, len(waveform), sampling_rate // 2):
+            on_segment({"text": "half", "start": start / sampling_rate})
+        return self.transcribe_sync(waveform, sampling_rate, language)
+
+
+class StalledConnection:
+    """Pipe end whose first send blocks until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.sent = []
+
+    def send(self, message):
+        if not self.sent:
+            self.release.wait(5)
+        self.sent.append(message)
+
+
+class TestSharedAudioArena(unittest.TestCase):
+    def test_slots_and_inline_fallback(self):
+        arena = SharedAudioArena(None, slots=1, slot_samples=4)
+        attached = SharedAudioArena(arena.name, slots=1, slot_samples=4)
+        try:
+            waveform = np.arange(3, dtype=np.float32)
+            reference, slot = attached.put(waveform)
+            self.assertEqual(reference, ("shm", 0, 3))
+            np.testing.assert_array_equal(arena.get(reference), waveform)
+
+            # Every slot is busy
+            reference, busy = attached.put(waveform)
+            self.assertEqual((reference[0], busy), ("inline", None))
+
+            attached.free(slot)
+            reference, _ = attached.put(np.zeros(5, dtype=np.float32))
+            self.assertEqual(reference[0], "inline")
+        finally:
+            attached.close()
+            arena.close()
+
+
+class TestInferenceService(unittest.TestCase):
+    def test_front_ends_share_the_inference_process(self):
+        pipeline = RecordingPipeline()
+        service = InferenceService(
+            ExecutorVAD(InferenceExecutor("vad", pipeline=pipeline)),
+            ExecutorASR(InferenceExecutor("asr", pipeline=pipeline)),
+        )
+        server_args = {"host": "127.0.0.1", "port": 8797}
+
+        async def session():
+            for _ in range(100):
+                try:
+                    websocket = await websockets.connect(
+                        "ws://127.0.0.1:8797/transcription/voice"
+                    )
+                    break
+                except OSError:
+                    # The front-ends are still starting
+                    await asyncio.sleep(0.1)
+            try:
+                await websocket.recv()
+                await websocket.send(bytes(4 * 16000 * 2))
+                return json.loads(await websocket.recv())
+            finally:
+                await websocket.close()
+
+        async def run():
+            front_ends = start_front_ends(service, 2, server_args)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.gather(session(), session()), 60
+                )
+            finally:
+                for process, arena in front_ends:
+                    process.terminate()
+                    process.join()
+                    arena.close()
+
+        results = asyncio.run(run())
+
+        # Transcribed in this process, with the audio of the front-ends
+        for result in results:
+            self.assertEqual(result["text"], f"{os.getpid()} 64000")
+            self.assertEqual(result["type"], "final")
+        self.assertEqual(pipeline.lengths, [64000, 64000])
+
+    def test_cancelled_request_is_dropped_and_its_slot_freed(self):
+        pipeline = GatedPipeline()
+        service = InferenceService(
+            ExecutorVAD(InferenceExecutor("vad", pipeline=pipeline)),
+            ExecutorASR(InferenceExecutor("asr", "thread", 1, pipeline)),
+        )
+        arena = SharedAudioArena(slots=2, slot_samples=16000)
+        service_end, client_end = multiprocessing.Pipe()
+        inference_client = InferenceClient(client_end, arena)
+        waveform = np.zeros(16000, dtype=np.float32)
+
+        async def run():
+            service.add_worker(service_end, arena)
+            inference_client.start()
+            first = asyncio.create_task(
+                inference_client.call("asr", waveform, 16000, None)
+            )
+            second = asyncio.create_task(
+                inference_client.call("asr", waveform, 16000, None)
+            )
+            await asyncio.sleep(0.1)
+            second.cancel()
+            # The service answers the cancelled request
+            while inference_client.pending > 1:
+                await asyncio.sleep(0.01)
+            pipeline.release.set()
+            return await first
+
+        try:
+            (result, _) = asyncio.run(run())
+        finally:
+            service_end.close()
+            client_end.close()
+            arena.close()
+
+        self.assertEqual(pipeline.lengths, [16000])
+        self.assertEqual(result["text"], f"{os.getpid()} 16000")
+        self.assertEqual(len(arena._free), 2)
+
+    def test_segments_are_streamed_before_the_result(self):
+        pipeline = StreamingPipeline()
+        service = InferenceService(
+            ExecutorVAD(InferenceExecutor("vad", pipeline=pipeline)),
+            ExecutorASR(InferenceExecutor("asr", "thread", 1, pipeline)),
+        )
+        arena = SharedAudioArena(slots=1, slot_samples=16000)
+        service_end, client_end = multiprocessing.Pipe()
+        inference_client = InferenceClient(client_end, arena)
+        waveform = np.zeros(16000, dtype=np.float32)
+        segments = []
+
+        async def run():
+            service.add_worker(service_end, arena)
+            inference_client.start()
+            return await inference_client.call(
+                "asr_streaming",
+                waveform,
+                16000,
+                None,
+                on_segment=segments.append,
+            )
+
+        try:
+            (result, _) = asyncio.run(run())
+        finally:
+            service_end.close()
+            client_end.close()
+            arena.close()
+
+        self.assertEqual(result["text"], f"{os.getpid()} 16000")
+        self.assertEqual([s["start"] for s in segments], [0.0, 0.5])
+
+    def test_request_cancelled_before_it_is_sent_is_released(self):
+        connection = StalledConnection()
+        arena = SharedAudioArena(slots=2, slot_samples=16000)
+        inference_client = InferenceClient(connection, arena)
+        waveform = np.zeros(16000, dtype=np.float32)
+
+        async def run():
+            first = asyncio.create_task(
+                inference_client.call("asr", waveform, 16000, None)
+            )
+            second = asyncio.create_task(
+                inference_client.call("asr", waveform, 16000, None)
+            )
+            await asyncio.sleep(0.05)
+            # The second request is queued behind the stalled first send
+            second.cancel()
+            await asyncio.gather(second, return_exceptions=True)
+            connection.release.set()
+            await asyncio.sleep(0.05)
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            await asyncio.get_running_loop().run_in_executor(
+                inference_client._sender, lambda: None
+            )
+
+        try:
+            asyncio.run(run())
+        finally:
+            arena.close()
+
+        # Only the first request went out, followed by its cancel
+        self.assertEqual(
+            [(message[0], message[1]) for message in connection.sent],
+            [(0, "asr"), (0, "cancel")],
+        )
+        # The first one keeps its slot until the service answers
+        self.assertEqual(inference_client.pending, 1)
+        self.assertEqual(len(arena._free), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.inference.replica_pool import ReplicaPool, ReplicaPoolASR
+
+
+class NamedReplica:
+    """Stand-in ASR replica that reports which replica did the work."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        # A replica must never be used by two calls at the same time
+        acquired = self.lock.acquire(blocking=False)
+        assert acquired, f"{self.name} used concurrently"
+        try:
+            time.sleep(0.05)
+            return {"text": self.name}
+        finally:
+            self.lock.release()
+
+
+class TestReplicaPool(unittest.TestCase):
+    def test_calls_are_spread_over_idle_replicas(self):
+        asr = ReplicaPoolASR(
+            ReplicaPool([NamedReplica("a"), NamedReplica("b")])
+        )
+        waveform = np.zeros(1600, dtype=np.float32)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(
+                pool.map(
+                    lambda _: asr.transcribe_sync(waveform, 16000)["text"],
+                    range(8),
+                )
+            )
+
+        self.assertEqual(len(results), 8)
+        self.assertGreaterEqual(results.count("a"), 2)
+        self.assertGreaterEqual(results.count("b"), 2)
+        utilization = asr.utilization()
+        self.assertEqual(sum(u["calls"] for u in utilization), 8)
+        self.assertEqual([u["in_flight"] for u in utilization], [0, 0])
+        for u in utilization:
+            self.assertGreater(u["busy_seconds"], 0.15)
+
+    def test_least_loaded_replica_is_picked(self):
+        pool = ReplicaPool(["a", "b"], max_inflight_per_replica=2)
+
+        with pool.acquire() as first:
+            with pool.acquire() as second:
+                self.assertNotEqual(first, second)
+
+    def test_empty_pool_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ReplicaPool([])
+
+
+if __name__ == "__main__":
+    unittest.main()
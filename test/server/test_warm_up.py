@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from src.asr.asr_interface import ASRInterface
+from src.server import Server
+from src.vad.energy_vad import EnergyVAD
+
+
+class RecordingASR(ASRInterface):
+    def __init__(self):
+        self.durations = []
+
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        self.durations.append(len(waveform) / sampling_rate)
+        return {"text": ""}
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_warm_up_runs_every_pipeline(self):
+        asr = RecordingASR()
+        fallback = RecordingASR()
+        server = Server(EnergyVAD(), asr, fallback_asr_pipeline=fallback)
+        self.assertFalse(server.ready)
+
+        asyncio.run(server.warm_up(seconds=1.5, passes=2))
+
+        self.assertTrue(server.ready)
+        self.assertEqual(asr.durations, [1.5, 1.5])
+        self.assertEqual(fallback.durations, [1.5, 1.5])
+
+    def test_synthetic_audio_is_speech_like(self):
+        server = Server(EnergyVAD(), RecordingASR())
+        audio = server._warmup_audio(2)
+
+        self.assertEqual(len(audio), 2 * 16000 * 2)
+        segments = EnergyVAD().detect_activity_sync(
+            np.frombuffer(audio, "<i2") / 32768.0, 16000
+        )
+        self.assertTrue(segments)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+import numpy as np
+
+from src.audio_codecs import (
+    StreamingResampler,
+    create_audio_decoder,
+    decode_alaw,
+    decode_mulaw,
+)
+from src.client import Client
+
+
+def encode_mulaw(samples):
+    # Reference G.711 encoder, one sample at a time
+    codes = []
+    for sample in samples:
+        sign = 0x80 if sample < 0 else 0
+        magnitude = min(abs(int(sample)), 32635) + 0x84
+        exponent = max(magnitude.bit_length() - 8, 0)
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        codes.append(~(sign | (exponent << 4) | mantissa) & 0xFF)
+    return bytes(codes)
+
+
+class TestG711(unittest.TestCase):
+    def test_mulaw_reference_values(self):
+        np.testing.assert_array_equal(
+            decode_mulaw(bytes([0xFF, 0x7F, 0x00, 0x80, 0xEF])),
+            [0, 0, -32124, 32124, 132],
+        )
+
+    def test_alaw_reference_values(self):
+        np.testing.assert_array_equal(
+            decode_alaw(bytes([0xD5, 0x55, 0xAA, 0x2A, 0xC5])),
+            [8, -8, 32256, -32256, 264],
+        )
+
+    def test_mulaw_round_trip_error_is_within_a_quantization_step(self):
+        samples = np.linspace(-30000, 30000, 101).astype(np.int16)
+        decoded = decode_mulaw(encode_mulaw(samples)).astype(int)
+
+        error = np.abs(decoded - samples)
+        self.assertTrue(np.all(error <= np.abs(samples) / 16 + 8))
+
+
+class TestStreamingResampler(unittest.TestCase):
+    def assert_resamples_sine(self, input_rate, output_rate):
+        resampler = StreamingResampler(input_rate, output_rate)
+        sine = np.sin(2 * np.pi * 500 * np.arange(input_rate) / input_rate)
+
+        output = resampler.process(sine)
+
+        self.assertEqual(len(output), output_rate)
+        length = resampler.up * resampler.taps_per_phase
+        delay = (length - 1) / 2 / resampler.down
+        expected = np.sin(
+            2 * np.pi * 500 * (np.arange(output_rate) - delay) / output_rate
+        )
+        np.testing.assert_allclose(output[100:], expected[100:], atol=1e-3)
+
+    def test_upsampled_sine_matches_the_delayed_sine(self):
+        self.assert_resamples_sine(8000, 16000)
+
+    def test_downsampled_sine_matches_the_delayed_sine(self):
+        self.assert_resamples_sine(48000, 16000)
+        self.assert_resamples_sine(44100, 16000)
+
+    def test_frames_are_resampled_as_one_stream(self):
+        samples = np.random.default_rng(0).standard_normal(4410)
+        whole = StreamingResampler(44100, 16000).process(samples)
+
+        resampler = StreamingResampler(44100, 16000)
+        framed = np.concatenate(
+            [
+                resampler.process(samples[i : i + 37])  # noqa: E203
+                for i in range(0, 4410, 37)
+            ]
+        )
+        np.testing.assert_allclose(framed, whole, atol=1e-5)
+
+    def test_frequencies_above_the_output_nyquist_are_removed(self):
+        resampler = StreamingResampler(48000, 16000)
+        tone = np.sin(2 * np.pi * 12000 * np.arange(48000) / 48000)
+
+        output = resampler.process(tone)
+
+        self.assertLess(np.abs(output[100:]).max(), 0.01)
+
+
+class TestClientDecoding(unittest.TestCase):
+    def test_mono_linear16_at_the_server_rate_is_stored_as_is(self):
+        self.assertIsNone(
+            create_audio_decoder({"sampleRate": 16000, "channels": 1}, 16000)
+        )
+
+    def test_unknown_encoding_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_audio_decoder({"encoding": "opus"}, 16000)
+
+    def test_mulaw_8khz_is_stored_as_16khz_pcm(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config(
+            {"data": {"encoding": "mulaw", "sampleRate": 8000}}
+        )
+
+        client.append_audio_data(bytes([0x80] * 160))
+        client.append_audio_data(bytes([0x80] * 80))
+
+        self.assertEqual(client.total_samples, 480)
+        # Past the filter delay, the constant input comes out unchanged
+        np.testing.assert_allclose(
+            client.get_buffer_samples()[64:], 32124, atol=2
+        )
+
+    def test_stereo_48khz_is_downmixed_and_resampled(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config({"data": {"sampleRate": 48000, "channels": 2}})
+        left = np.full(4800, 1000, dtype="<i2")
+        right = np.full(4800, 3000, dtype="<i2")
+        audio = np.stack([left, right], axis=1).tobytes()
+
+        # Frames cut in the middle of samples and of channel pairs
+        for i in range(0, len(audio), 1001):
+            client.append_audio_data(audio[i : i + 1001])  # noqa: E203
+
+        self.assertEqual(client.total_samples, 1600)
+        np.testing.assert_allclose(
+            client.get_buffer_samples()[64:], 2000, atol=2
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from src.audio_ring_buffer import AudioRingBuffer
+from src.client import Client
+
+
+class TestAudioRingBuffer(unittest.TestCase):
+    def test_views_are_contiguous_across_the_wrap(self):
+        ring = AudioRingBuffer(10)
+        ring.write(np.arange(7, dtype=np.int16))
+        ring.write(np.arange(7, 14, dtype=np.int16))
+
+        self.assertEqual((ring.start, ring.end), (4, 14))
+        view = ring.view(6, 13)
+        np.testing.assert_array_equal(view, np.arange(6, 13))
+        # The view shares memory with the ring instead of copying
+        self.assertTrue(np.shares_memory(view, ring._data))
+
+    def test_oversized_write_keeps_the_most_recent_samples(self):
+        ring = AudioRingBuffer(4)
+        ring.write(np.arange(10, dtype=np.int16))
+
+        self.assertEqual((ring.start, ring.end), (6, 10))
+        np.testing.assert_array_equal(ring.view(6, 10), [6, 7, 8, 9])
+
+    def test_overwritten_samples_cannot_be_viewed(self):
+        ring = AudioRingBuffer(4)
+        ring.write(np.arange(6, dtype=np.int16))
+
+        with self.assertRaises(ValueError):
+            ring.view(1, 3)
+
+
+class TestClientAudio(unittest.TestCase):
+    def setUp(self):
+        self.client = Client("test_client", 10, 2, max_buffer_seconds=2)
+
+    def append(self, start, end):
+        self.client.append_audio_data(
+            np.arange(start, end, dtype="<i2").tobytes()
+        )
+
+    def test_regions_move_without_copying(self):
+        self.append(0, 5)
+        self.client.move_buffer_to_scratch()
+        self.append(5, 8)
+        self.client.move_buffer_to_pending()
+        self.append(8, 9)
+
+        np.testing.assert_array_equal(
+            self.client.get_scratch_samples(), np.arange(5)
+        )
+        self.assertEqual(self.client.pending_samples, 3)
+        self.assertEqual(self.client.buffered_samples, 1)
+
+        self.client.move_pending_to_scratch()
+        np.testing.assert_array_equal(
+            self.client.get_scratch_samples(), np.arange(8)
+        )
+        self.assertEqual(self.client.get_scratch_start_sample(), 0)
+
+    def test_odd_bytes_are_kept_for_the_next_message(self):
+        data = np.arange(3, dtype="<i2").tobytes()
+        self.client.append_audio_data(data[:3])
+        self.client.append_audio_data(data[3:])
+
+        np.testing.assert_array_equal(
+            self.client.get_buffer_samples(), np.arange(3)
+        )
+
+    def test_overflow_trims_the_oldest_unprocessed_audio(self):
+        self.append(0, 15)
+        self.client.move_buffer_to_scratch()
+        self.append(15, 25)
+
+        self.assertEqual(self.client.overflowed_samples, 5)
+        self.assertEqual(self.client.scratch_start, 5)
+        np.testing.assert_array_equal(
+            self.client.get_scratch_samples(), np.arange(5, 15)
+        )
+
+    def test_scratch_buffer_assignment(self):
+        self.append(0, 4)
+        self.client.scratch_buffer = np.arange(6, dtype="<i2").tobytes()
+
+        self.assertEqual(self.client.buffered_samples, 0)
+        self.assertEqual(len(self.client.scratch_buffer), 12)
+        np.testing.assert_allclose(
+            self.client.get_scratch_waveform(), np.arange(6) / 32768.0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from src.asr.asr_factory import ASRFactory
+from src.asr.asr_interface import ASRInterface
+from src.backend_registry import BackendRegistry
+from src.vad.vad_factory import VADFactory
+
+
+class FakeEntryPoint:
+    name = "plugin"
+
+    def load(self):
+        return dict
+
+
+class TestBackendRegistry(unittest.TestCase):
+    def test_backends_are_imported_when_selected(self):
+        # A fresh interpreter, so other tests cannot have imported them
+        code = (
+            "import sys\n"
+            "from src.asr.asr_factory import ASRFactory\n"
+            "from src.vad.vad_factory import VADFactory\n"
+            "assert 'src.asr.faster_whisper_asr' not in sys.modules\n"
+            "assert 'src.vad.pyannote_vad' not in sys.modules\n"
+            "VADFactory.create_vad_pipeline('energy')\n"
+            "assert 'src.vad.energy_vad' in sys.modules\n"
+            "assert 'src.vad.pyannote_vad' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            VADFactory.create_vad_pipeline("unknown")
+
+    def test_registered_and_entry_point_backends(self):
+        registry = BackendRegistry(
+            "test backend", "test.group", {"path": "collections:OrderedDict"}
+        )
+        registry.register("class", list)
+
+        with mock.patch(
+            "importlib.metadata.entry_points",
+            return_value=[FakeEntryPoint()],
+        ) as entry_points:
+            self.assertEqual(registry.names(), ["class", "path", "plugin"])
+            self.assertIs(registry.load("plugin"), dict)
+            entry_points.assert_called_once_with(group="test.group")
+
+        self.assertIs(registry.load("class"), list)
+        self.assertEqual(registry.load("path").__name__, "OrderedDict")
+
+    def test_batching_support_follows_the_backend(self):
+        class SequentialASR(ASRInterface):
+            pass
+
+        class BatchedASR(ASRInterface):
+            def transcribe_batch_sync(self, waveforms, rates, languages):
+                return []
+
+        ASRFactory.register_asr_pipeline("test_sequential", SequentialASR)
+        ASRFactory.register_asr_pipeline("test_batched", BatchedASR)
+
+        self.assertFalse(ASRFactory.supports_batching("test_sequential"))
+        self.assertTrue(ASRFactory.supports_batching("test_batched"))
+
+
+if __name__ == "__main__":
+    unittest.main()
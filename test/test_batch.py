@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+from unittest import mock
+
+import numpy as np
+
+from src.audio_codecs import AudioDecoder
+from src.batch import list_audio_files, load_waveform, main, plan_units
+from src.benchmark import AUDIO_DIR
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.output = os.path.join(self.directory, "out.jsonl")
+        self.audio_file = os.path.normpath(
+            os.path.join(AUDIO_DIR, "eng_speech.wav")
+        )
+
+    def run_batch(self, *inputs):
+        return main(
+            list(inputs)
+            + [
+                "--output",
+                self.output,
+                "--vad-type",
+                "energy",
+                "--vad-args",
+                "{}",
+                "--asr-type",
+                "stub",
+                "--asr-args",
+                '{"rtf": 0.001}',
+                "--asr-max-batch-size",
+                "4",
+                "--asr-max-batch-wait-ms",
+                "10",
+            ]
+        )
+
+    def read_output(self):
+        with open(self.output) as file:
+            return [json.loads(line) for line in file]
+
+    def test_units_are_transcribed_in_file_time(self):
+        summary = self.run_batch(self.audio_file)
+
+        self.assertEqual(summary["files"], 1)
+        (result,) = self.read_output()
+        self.assertEqual(result["path"], self.audio_file)
+        self.assertAlmostEqual(result["duration"], 31.858875, places=2)
+        self.assertLess(result["speech_seconds"], result["duration"])
+        self.assertTrue(result["text"])
+        for unit in result["units"]:
+            self.assertLessEqual(unit["end"] - unit["start"], 32)
+            for word in unit["words"]:
+                self.assertGreaterEqual(word["start"], unit["start"])
+                self.assertLessEqual(word["end"], unit["end"] + 0.01)
+
+    def test_resumes_after_a_crash(self):
+        manifest = os.path.join(self.directory, "manifest.txt")
+        with open(manifest, "w") as file:
+            file.write(os.path.relpath(self.audio_file, self.directory) + "\n")
+            file.write(json.dumps({"audio_filepath": "missing.wav"}) + "\n")
+        with open(self.output, "w") as file:
+            file.write(json.dumps({"path": self.audio_file}) + '\n{"pa')
+
+        summary = self.run_batch(manifest)
+
+        self.assertEqual(summary["skipped"], 1)
+        self.assertEqual(summary["failed"], 1)
+        results = self.read_output()
+        self.assertEqual(len(results), 2)
+        self.assertIn("error", results[1])
+
+        # The failed file is retried and keeps a single line
+        summary = self.run_batch(manifest)
+
+        self.assertEqual(summary["failed"], 1)
+        results = self.read_output()
+        self.assertEqual(len(results), 2)
+        self.assertIn("error", results[1])
+
+    def test_directories_are_searched(self):
+        self.assertEqual(
+            list_audio_files([AUDIO_DIR, self.audio_file]),
+            [
+                self.audio_file,
+                os.path.normpath(
+                    os.path.join(AUDIO_DIR, "eng_voice_commands.wav")
+                ),
+            ],
+        )
+
+    def test_long_speech_is_split_into_units(self):
+        units = plan_units(
+            [{"start": 1.0, "end": 50.0}, {"start": 52.0, "end": 53.0}],
+            60 * 16000,
+            max_unit_seconds=30,
+            padding_seconds=0.5,
+        )
+
+        self.assertEqual(len(units), 2)
+        for unit in units:
+            self.assertLessEqual(unit.kept_samples, 30 * 16000)
+        # The pieces of the long segment meet without overlapping
+        self.assertEqual(units[0].regions, [[8000, 480000]])
+        self.assertEqual(units[1].regions[0], [480000, 808000])
+
+    def test_waveform_is_decoded_in_blocks(self):
+        path = os.path.join(self.directory, "stereo.wav")
+        samples = np.random.default_rng(0).integers(
+            -3000, 3000, size=(3 * 44100, 2), dtype=np.int16
+        )
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(44100)
+            wav.writeframes(samples.tobytes())
+
+        with mock.patch("src.batch.DECODE_BLOCK_SECONDS", 0.25):
+            waveform = load_waveform(path)
+
+        expected = AudioDecoder("linear16", 44100, 16000, 2).decode(
+            samples.tobytes()
+        )
+        self.assertEqual(waveform.dtype, np.float32)
+        np.testing.assert_allclose(
+            waveform, expected / 32768.0, atol=1.5 / 32768
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import unittest
+
+from src import metrics
+from src.benchmark import (
+    AUDIO_DIR,
+    Session,
+    main_async,
+    overload_outcomes,
+    parse_args,
+)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_stub_sessions_report_latencies(self):
+        args = parse_args(
+            [
+                "--clients",
+                "2",
+                "--speed",
+                "40",
+                "--drain-seconds",
+                "1",
+                "--port",
+                "8798",
+                "--audio-files",
+                os.path.join(AUDIO_DIR, "eng_speech.wav"),
+                "--asr-args",
+                '{"rtf": 0.01}',
+            ]
+        )
+        report = asyncio.run(main_async(args))
+
+        self.assertEqual(report["summary"]["sessions"], 2)
+        for session in report["per_session"]:
+            self.assertGreater(session["finals"], 0)
+            self.assertIsNotNone(session["first_result_latency"])
+            self.assertTrue(session["final_latencies"])
+        self.assertIsNotNone(report["summary"]["final_latency"]["p50"])
+        self.assertIsInstance(report["summary"]["overload"], dict)
+
+    def test_compute_time_is_counted_once_per_chunk(self):
+        session = Session(0, "test.wav", bytes(32000), [], parse_args([]))
+        first = {
+            "vad": {"compute_time": 0.1},
+            "asr": {"queue_time": 0.5, "compute_time": 0.4},
+        }
+        second = {"asr": {"queue_time": 0.0, "compute_time": 0.2}}
+        session.results = [
+            (0.5, {"type": "final", "inference_timings": dict(first)}),
+            (0.5, {"type": "partial", "inference_timings": dict(first)}),
+            (0.9, {"type": "segment", "processing_time": 0.3}),
+            (1.0, {"type": "final", "inference_timings": second}),
+        ]
+
+        self.assertAlmostEqual(session.compute_seconds(), 0.7)
+        self.assertAlmostEqual(
+            session.report()["rtf"], 0.7 / session.audio_seconds
+        )
+
+    def test_overload_outcomes_are_read_from_the_metrics(self):
+        before = overload_outcomes()
+        metrics.overload_outcomes.inc("merged", amount=2)
+
+        self.assertEqual(dict(overload_outcomes() - before), {"merged": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import unittest
+
+import websockets
+
+from src.asr.asr_interface import ASRInterface
+from src.capacity import (
+    OVERLOADED_CLOSE_CODE,
+    AdmissionController,
+    RecentRealTimeFactor,
+)
+from src.client import Client
+from src.server import Server
+from src.vad.energy_vad import EnergyVAD
+
+
+class SilentASR(ASRInterface):
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return {"text": ""}
+
+
+class TestRecentRealTimeFactor(unittest.TestCase):
+    def test_weighted_by_duration_over_the_window(self):
+        rtf = RecentRealTimeFactor(window_seconds=10)
+        rtf.observe(1.0, 1.0, now=0)
+        rtf.observe(3.0, 0.6, now=5)
+
+        self.assertAlmostEqual(rtf.value(now=9), 1.6 / 4.0)
+        # The first chunk left the window
+        self.assertAlmostEqual(rtf.value(now=12), 0.2)
+        self.assertIsNone(rtf.value(now=20))
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.rtf = RecentRealTimeFactor()
+
+    def clients(self, count, pending_seconds=0):
+        clients = []
+        for index in range(count):
+            client = Client(f"client-{index}", 16000, 2)
+            client.append_audio_data(bytes(int(pending_seconds * 32000)))
+            client.move_buffer_to_pending()
+            clients.append(client)
+        return clients
+
+    def test_budgets(self):
+        admission = AdmissionController(
+            max_sessions=3, max_rtf=0.5, max_pending_seconds=4, rtf=self.rtf
+        )
+        self.assertIsNone(admission.admit(self.clients(2)))
+        self.assertEqual(admission.admit(self.clients(3)), "sessions")
+        self.assertEqual(
+            admission.admit(self.clients(2, pending_seconds=3)),
+            "pending_seconds",
+        )
+
+        self.rtf.observe(2.0, 1.5)
+        self.assertEqual(admission.admit(self.clients(1)), "real_time_factor")
+
+    def test_spare_sessions_extrapolate_the_real_time_factor(self):
+        admission = AdmissionController(max_rtf=0.8, rtf=self.rtf)
+        self.rtf.observe(10.0, 2.0)
+
+        load = admission.capacity(self.clients(2))
+
+        self.assertEqual(load["sessions"], 2)
+        self.assertAlmostEqual(load["real_time_factor"], 0.2)
+        self.assertEqual(load["spare_sessions"], 6)
+
+        admission.max_sessions = 5
+        self.assertEqual(
+            admission.capacity(self.clients(2))["spare_sessions"], 3
+        )
+
+        # Without budgets the extrapolation goes up to real time
+        admission = AdmissionController(rtf=self.rtf)
+        load = admission.capacity(self.clients(2))
+        self.assertEqual(load["spare_sessions"], 8)
+        self.assertIsNone(admission.refusal_reason(load))
+
+    def test_refused_session_is_closed_with_a_retry_hint(self):
+        server = Server(
+            EnergyVAD(),
+            SilentASR(),
+            port=0,
+            admission_args={"max_sessions": 0, "retry_after_seconds": 7},
+        )
+
+        async def run():
+            websocket_server = await server.start()
+            port = websocket_server.sockets[0].getsockname()[1]
+            websocket = await websockets.connect(
+                f"ws://localhost:{port}/transcription/voice"
+            )
+            try:
+                with self.assertRaises(websockets.ConnectionClosed):
+                    await websocket.recv()
+                return websocket.close_code, websocket.close_reason
+            finally:
+                await websocket.close()
+                websocket_server.close()
+                await websocket_server.wait_closed()
+
+        code, reason = asyncio.run(run())
+
+        self.assertEqual(code, OVERLOADED_CLOSE_CODE)
+        self.assertEqual(
+            json.loads(reason),
+            {"error": "overloaded", "budget": "sessions", "retry_after": 7},
+        )
+
+
+class TestReadiness(unittest.TestCase):
+    def test_not_ready_until_warm_then_over_budget(self):
+        server = Server(
+            EnergyVAD(), SilentASR(), admission_args={"max_sessions": 1}
+        )
+
+        status, content_type, body = server._ready_response()
+        self.assertEqual(status, "503 Service Unavailable")
+        self.assertEqual(content_type, "application/json")
+        self.assertFalse(json.loads(body)["ready"])
+
+        asyncio.run(server.warm_up(seconds=0.5))
+        status, _, body = server._ready_response()
+        self.assertEqual(status, "200 OK")
+        readiness = json.loads(body)
+        self.assertEqual(readiness["sessions"], 0)
+        self.assertEqual(readiness["spare_sessions"], 1)
+        self.assertEqual(readiness["pending_requests"], 0)
+
+        server.connected_clients["a"] = Client("a", 16000, 2)
+        status, _, body = server._ready_response()
+        self.assertEqual(status, "503 Service Unavailable")
+        self.assertTrue(json.loads(body)["ready"])
+        self.assertFalse(json.loads(body)["accepting"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from src.client import Client
+from src.language_lock import LanguageLock
+
+
+def detected(language, probability=0.95):
+    return {
+        "text": "...",
+        "language": language,
+        "language_probability": probability,
+    }
+
+
+class TestLanguageLock(unittest.TestCase):
+    def transcribe(self, lock, transcription, configured=None):
+        language = lock.language(configured)
+        lock.observe(transcription, language)
+        return language
+
+    def test_locks_after_consecutive_confident_detections(self):
+        lock = LanguageLock(confirmations=3)
+
+        used = [self.transcribe(lock, detected("fr")) for _ in range(4)]
+
+        self.assertEqual(used, [None, None, None, "fr"])
+        self.assertEqual(lock.locked_language, "fr")
+
+    def test_unconfident_detection_restarts_the_streak(self):
+        lock = LanguageLock(min_probability=0.8, confirmations=2)
+
+        self.transcribe(lock, detected("fr"))
+        self.transcribe(lock, detected("fr", 0.5))
+        self.transcribe(lock, detected("fr"))
+
+        self.assertIsNone(lock.locked_language)
+        self.transcribe(lock, detected("fr"))
+        self.assertEqual(lock.locked_language, "fr")
+
+    def test_configured_language_is_never_overridden(self):
+        lock = LanguageLock(confirmations=1)
+        self.transcribe(lock, detected("fr"))
+
+        self.assertEqual(lock.language("english"), "english")
+
+    def test_reverification_unlocks_on_another_language(self):
+        lock = LanguageLock(confirmations=1, reverify_every=3)
+        self.transcribe(lock, detected("fr"))
+
+        used = [self.transcribe(lock, detected("fr")) for _ in range(3)]
+        self.assertEqual(used, ["fr", "fr", None])
+        self.assertEqual(lock.locked_language, "fr")
+
+        used = [self.transcribe(lock, detected("de")) for _ in range(3)]
+        self.assertEqual(used, ["fr", "fr", None])
+        self.assertIsNone(lock.locked_language)
+
+    def test_client_config(self):
+        client = Client("test_client", 16000, 2)
+        client.update_config({"data": {"language_lock": {"confirmations": 1}}})
+
+        transcription = detected("fr")
+        client.observe_transcription(transcription)
+
+        self.assertTrue(transcription["language_locked"])
+        self.assertEqual(client.get_language(), "fr")
+
+        client.update_config({"data": {"language_lock": False}})
+        client.observe_transcription(detected("fr"))
+        self.assertIsNone(client.get_language())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+from src import metrics
+from src.asr.asr_interface import ASRInterface
+from src.asr.cached_asr import CachedASR
+from src.inference.inference_executor import ExecutorASR, InferenceExecutor
+from src.inference.replica_pool import ReplicaPool, ReplicaPoolASR
+from src.server import Server
+from src.vad.energy_vad import EnergyVAD
+
+
+class EmptyASR(ASRInterface):
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return {"text": ""}
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram(
+            "test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, "vad")
+
+        lines = histogram.render().splitlines()
+        self.assertEqual(lines[1], "# TYPE test_seconds histogram")
+        self.assertEqual(
+            lines[2:],
+            [
+                'test_seconds_bucket{stage="vad",le="0.1"} 1.0',
+                'test_seconds_bucket{stage="vad",le="1.0"} 3.0',
+                'test_seconds_bucket{stage="vad",le="+Inf"} 4.0',
+                'test_seconds_sum{stage="vad"} 6.05',
+                'test_seconds_count{stage="vad"} 4.0',
+            ],
+        )
+
+    def test_gauge_function_and_counter(self):
+        gauge = metrics.Gauge("test_bytes", "Test.", ("client_id",))
+        gauge.set_function(lambda: {("a",): 4, ("b",): 2})
+        counter = metrics.Counter("test_chunks", "Test.")
+        counter.inc()
+        counter.inc(amount=2)
+
+        self.assertIn('test_bytes{client_id="b"} 2.0', gauge.render())
+        self.assertEqual(
+            counter.render().splitlines(),
+            [
+                "# HELP test_chunks_total Test.",
+                "# TYPE test_chunks_total counter",
+                "test_chunks_total 3.0",
+            ],
+        )
+
+    def test_http_endpoint(self):
+        registry = metrics.MetricsRegistry()
+        registry.register(metrics.Counter("test_requests", "Test.")).inc()
+
+        routes = {"/ready": lambda: ("200 OK", "application/json", b"{}")}
+
+        async def scrape(path):
+            server = await metrics.start_metrics_server(
+                "127.0.0.1", 0, registry, routes
+            )
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response.decode()
+
+        response = asyncio.run(scrape("/metrics"))
+        self.assertTrue(response.startswith("HTTP/1.1 200 OK"))
+        self.assertIn("test_requests_total 1.0", response)
+        self.assertIn("404", asyncio.run(scrape("/other")).splitlines()[0])
+
+        response = asyncio.run(scrape("/ready"))
+        self.assertIn("Content-Type: application/json", response)
+        self.assertTrue(response.endswith("\r\n\r\n{}"))
+
+    def test_replica_gauges(self):
+        pool = ReplicaPool([EmptyASR(), EmptyASR()])
+        executor = InferenceExecutor("asr", "thread", 2, ReplicaPoolASR(pool))
+        server = Server(EnergyVAD(), CachedASR(ExecutorASR(executor)))
+        server._register_metrics()
+        with pool.acquire():
+            pass
+
+        rendered = metrics.REGISTRY.render()
+
+        self.assertIn(
+            'voicestreamai_replica_calls{pipeline="asr",replica="0"} 1.0',
+            rendered,
+        )
+        self.assertIn(
+            'voicestreamai_replica_in_flight{pipeline="asr",replica="1"} 0.0',
+            rendered,
+        )
+        self.assertIn(
+            'voicestreamai_replica_utilization{pipeline="asr",replica="1"}',
+            rendered,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
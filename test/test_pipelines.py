@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.asr.asr_factory import ASRFactory
+from src.asr.asr_interface import ASRInterface
+from src.inference.batch_scheduler import ASRBatchScheduler
+from src.inference.inference_executor import ExecutorASR, InferenceExecutor
+from src.pipelines import StubASR, create_asr_pipeline
+
+
+class SequentialASR(ASRInterface):
+    def transcribe_sync(self, waveform, sampling_rate, language=None):
+        return {"text": ""}
+
+
+class TestCreateASRPipeline(unittest.TestCase):
+    def test_batching_needs_a_batched_inference(self):
+        ASRFactory.register_asr_pipeline("test_pipelines", SequentialASR)
+        executor = InferenceExecutor("asr", pipeline=SequentialASR())
+
+        with self.assertLogs(level="WARNING"):
+            pipeline = create_asr_pipeline(executor, "test_pipelines", 8)
+        self.assertIsInstance(pipeline, ExecutorASR)
+
+        stub_executor = InferenceExecutor("asr", pipeline=StubASR())
+        self.assertIsInstance(
+            create_asr_pipeline(stub_executor, "stub", 8), ASRBatchScheduler
+        )
+
+    def test_stub_batch_is_one_call(self):
+        asr = StubASR(rtf=0.1, latency_seconds=0.5)
+        waveforms = [np.zeros(16000 * n, dtype=np.float32) for n in (1, 2, 1)]
+
+        with mock.patch("src.pipelines.time.sleep") as sleep:
+            results = asr.transcribe_batch_sync(
+                waveforms, [16000] * 3, [None, "fr", None]
+            )
+
+        # Padded to the longest waveform, the latency paid once
+        sleep.assert_called_once()
+        self.assertAlmostEqual(sleep.call_args.args[0], 0.5 + 0.1 * 2 * 3)
+
+        self.assertEqual([r["language"] for r in results], ["en", "fr", "en"])
+        self.assertEqual(len(results[1]["words"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from src.speech_trim import SpeechTrim
+
+
+class TestSpeechTrim(unittest.TestCase):
+    def setUp(self):
+        # 8 s chunk sampled at 100 Hz, the first two segments overlap once
+        # padded
+        self.trim = SpeechTrim(
+            [
+                {"start": 1.0, "end": 2.0},
+                {"start": 2.3, "end": 3.0},
+                {"start": 5.0, "end": 6.0},
+            ],
+            800,
+            100,
+            padding_seconds=0.2,
+        )
+
+    def test_padded_segments_are_merged(self):
+        self.assertEqual(self.trim.regions, [[80, 320], [480, 620]])
+        self.assertEqual(self.trim.kept_samples, 380)
+        self.assertEqual(self.trim.trimmed_samples, 420)
+
+    def test_regions_are_concatenated(self):
+        waveform = np.arange(800, dtype=np.float32)
+
+        trimmed = self.trim.apply(waveform)
+
+        np.testing.assert_array_equal(
+            trimmed, np.concatenate([waveform[80:320], waveform[480:620]])
+        )
+
+    def test_padding_is_clipped_to_the_chunk(self):
+        trim = SpeechTrim([{"start": 0.1, "end": 7.9}], 800, 100)
+
+        self.assertEqual(trim.regions, [[0, 800]])
+
+    def test_timestamps_are_mapped_back_to_the_chunk(self):
+        transcription = {
+            "text": "a b",
+            "words": [
+                {"word": "a", "start": 0.2, "end": 1.0},
+                {"word": "b", "start": 2.5, "end": 3.0},
+            ],
+        }
+
+        self.trim.map_transcription(transcription)
+
+        self.assertEqual(
+            [(w["start"], w["end"]) for w in transcription["words"]],
+            [(1.0, 1.8), (4.9, 5.4)],
+        )
+
+    def test_region_boundary_belongs_to_both_sides(self):
+        transcription = {
+            "text": "a b",
+            "words": [
+                {"word": "a", "start": 2.0, "end": 2.4},
+                {"word": "b", "start": 2.4, "end": 2.6},
+            ],
+        }
+
+        self.trim.map_transcription(transcription)
+
+        self.assertEqual(
+            [(w["start"], w["end"]) for w in transcription["words"]],
+            [(2.8, 3.2), (4.8, 5.0)],
+        )
+
+    def test_no_speech_keeps_nothing(self):
+        trim = SpeechTrim([], 800, 100)
+
+        trimmed = trim.apply(np.arange(800, dtype=np.float32))
+
+        self.assertEqual(len(trimmed), 0)
+        self.assertEqual(trimmed.dtype, np.float32)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from src import metrics
+from src.vad.energy_vad import CascadeVAD, EnergyVAD
+from src.vad.vad_interface import VADInterface
+
+SAMPLING_RATE = 16000
+
+
+def voiced_sound(seconds, amplitude=0.3):
+    """Harmonic signal with a 150 Hz pitch, a crude stand-in for a vowel."""
+    t = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    harmonics = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    return (amplitude * harmonics / 2).astype(np.float32)
+
+
+def background_noise(seconds, amplitude, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        amplitude * rng.standard_normal(int(seconds * SAMPLING_RATE))
+    ).astype(np.float32)
+
+
+class CountingVAD(VADInterface):
+    def __init__(self):
+        self.calls = 0
+
+    def detect_activity_sync(self, waveform, sampling_rate):
+        self.calls += 1
+        return [{"start": 0.0, "end": 1.0, "confidence": 1.0}]
+
+
+class TestEnergyVAD(unittest.TestCase):
+    def setUp(self):
+        self.vad = EnergyVAD()
+
+    def test_silence_has_no_speech(self):
+        waveform = background_noise(3, 0.0005)
+
+        self.assertEqual(
+            self.vad.detect_activity_sync(waveform, SAMPLING_RATE), []
+        )
+        self.assertTrue(self.vad.is_silence(waveform, SAMPLING_RATE))
+
+    def test_loud_line_noise_is_not_speech(self):
+        waveform = np.concatenate(
+            [background_noise(1.5, 0.001), background_noise(1.5, 0.2, 1)]
+        )
+
+        self.assertEqual(
+            self.vad.detect_activity_sync(waveform, SAMPLING_RATE), []
+        )
+
+    def test_voiced_region_is_detected_with_hangover(self):
+        waveform = np.concatenate(
+            [
+                background_noise(1, 0.001),
+                voiced_sound(1) + background_noise(1, 0.001, 1),
+                background_noise(1, 0.001, 2),
+            ]
+        )
+
+        segments = self.vad.detect_activity_sync(waveform, SAMPLING_RATE)
+
+        self.assertEqual(len(segments), 1)
+        self.assertAlmostEqual(segments[0]["start"], 1.0, delta=0.05)
+        self.assertAlmostEqual(
+            segments[0]["end"], 2.0 + self.vad.hangover_seconds, delta=0.05
+        )
+        self.assertFalse(self.vad.is_silence(waveform, SAMPLING_RATE))
+
+    def test_cascade_skips_heavy_vad_on_silence(self):
+        heavy = CountingVAD()
+        vad = CascadeVAD(EnergyVAD(), heavy)
+        chunks = metrics.cascade_vad_chunks.value()
+        skipped = metrics.cascade_vad_skipped_chunks.value()
+        speech = np.concatenate([background_noise(1, 0.001), voiced_sound(1)])
+
+        self.assertEqual(
+            vad.detect_activity_sync(
+                background_noise(3, 0.0005), SAMPLING_RATE
+            ),
+            [],
+        )
+        self.assertEqual(heavy.calls, 0)
+        self.assertEqual(
+            len(vad.detect_activity_sync(speech, SAMPLING_RATE)), 1
+        )
+        self.assertEqual(heavy.calls, 1)
+        self.assertEqual(metrics.cascade_vad_chunks.value() - chunks, 2)
+        self.assertEqual(
+            metrics.cascade_vad_skipped_chunks.value() - skipped, 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,10 @@ import asyncio
 import json
 import os
 import unittest
+import unittest.mock
 
+import numpy as np
+from pyannote.core import Segment, SlidingWindow, SlidingWindowFeature
 from pydub import AudioSegment
 
 from src.client import Client
@@ -83,5 +86,110 @@ class TestPyannoteVAD(unittest.TestCase):
         return audio[start * 1000 : end * 1000]  # noqa: E203
 
 
+class FrameEnergySegmentation:
+    """
+    Stands in for the segmentation model: the score of every 0.1 s frame is
+    its mean absolute amplitude, and the lengths of the scored waveforms are
+    recorded.
+    """
+
+    def __init__(self):
+        self.lengths = []
+
+    def __call__(self, file):
+        waveform = file["waveform"].numpy()[0]
+        samples = int(0.1 * file["sample_rate"])
+        self.lengths.append(len(waveform))
+        frames = len(waveform) // samples
+        scores = np.abs(waveform[: frames * samples]).reshape(frames, samples)
+        return SlidingWindowFeature(
+            scores.mean(axis=1, keepdims=True),
+            SlidingWindow(start=0.0, duration=0.1, step=0.1),
+        )
+
+
+class ThresholdBinarize:
+    """Stands in for the binarization: frames scoring over 0.5 are speech."""
+
+    def __call__(self, scores):
+        speech = [
+            Segment(frame.start, frame.end)
+            for frame, score in scores
+            if score[0] > 0.5
+        ]
+        merged = []
+        for segment in speech:
+            if merged and segment.start <= merged[-1].end + 1e-6:
+                merged[-1] = Segment(merged[-1].start, segment.end)
+            else:
+                merged.append(segment)
+        return SimpleTimeline(merged)
+
+
+class SimpleTimeline:
+    def __init__(self, segments):
+        self.segments = segments
+
+    def itersegments(self):
+        return iter(self.segments)
+
+
+class TestPyannoteVADIncremental(unittest.TestCase):
+    def setUp(self):
+        # The model itself is not needed to check the score bookkeeping
+        self.vad = PyannoteVAD.__new__(PyannoteVAD)
+        self.vad.streaming = True
+        self.vad.context_seconds = 0.5
+        self.vad.vad_pipeline = unittest.mock.Mock(
+            _segmentation=FrameEnergySegmentation(),
+            _binarize=ThresholdBinarize(),
+        )
+        self.waveform = np.zeros(4 * 16000, dtype=np.float32)
+        self.waveform[16000:32000] = 0.9
+        self.waveform[int(2.6 * 16000) : int(3.3 * 16000)] = 0.9  # noqa: E203
+
+    def test_chunk_by_chunk_equals_one_pass(self):
+        full_segments, full_state = self.vad.detect_activity_incremental_sync(
+            self.waveform, 16000, 0, {}
+        )
+        self.vad.vad_pipeline._segmentation.lengths.clear()
+
+        state = {}
+        for end in range(8000, len(self.waveform) + 1, 8000):
+            segments, state = self.vad.detect_activity_incremental_sync(
+                self.waveform[:end], 16000, 0, state
+            )
+
+        self.assertEqual(segments, full_segments)
+        np.testing.assert_allclose(state["scores"], full_state["scores"])
+        self.assertEqual(
+            [(round(s["start"], 6), round(s["end"], 6)) for s in segments],
+            [(1.0, 2.0), (2.6, 3.3)],
+        )
+        # Only the new audio and the context before it go to the model
+        self.assertLessEqual(
+            max(self.vad.vad_pipeline._segmentation.lengths[1:]),
+            8000 + 0.5 * 16000 + 1600,
+        )
+
+    def test_state_resets_when_the_stream_offset_jumps(self):
+        _, state = self.vad.detect_activity_incremental_sync(
+            self.waveform, 16000, 0, {}
+        )
+
+        waveform = self.waveform[16000:]
+        segments, state = self.vad.detect_activity_incremental_sync(
+            waveform, 16000, 16000, state
+        )
+        expected, _ = self.vad.detect_activity_incremental_sync(
+            waveform, 16000, 16000, {}
+        )
+
+        self.assertEqual(segments, expected)
+        self.assertEqual(state["stream_offset"], 16000)
+        self.assertEqual(len(state["scores"]), 30)
+        self.assertAlmostEqual(segments[0]["stream_start"], 1.0)
+
+
 if __name__ == "__main__":
     unittest.main()